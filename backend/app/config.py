@@ -7,7 +7,44 @@ load_dotenv()
 ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
 AGENT_MODEL: str = os.getenv("AGENT_MODEL", "claude-sonnet-4-20250514")
 AGGREGATION_MODEL: str = os.getenv("AGGREGATION_MODEL", "claude-opus-4-20250514")
-MAX_CONCURRENT_AGENTS: int = int(os.getenv("MAX_CONCURRENT_AGENTS", "50"))
+# Parallel calls per executive summary, and the size of each map chunk
+AGGREGATION_MAX_CONCURRENT: int = int(os.getenv("AGGREGATION_MAX_CONCURRENT", "32"))
+AGGREGATION_CHUNK_TOKENS: int = int(os.getenv("AGGREGATION_CHUNK_TOKENS", "8000"))
+# Most response tokens the summary reads in all, after near-duplicates are
+# collapsed (0 = read every response)
+AGGREGATION_INPUT_TOKENS: int = int(os.getenv("AGGREGATION_INPUT_TOKENS", "200000"))
+# Key themes are extracted locally; set to have the model reword the top ones
+THEME_COUNT: int = int(os.getenv("THEME_COUNT", "6"))
+THEME_POLISH: bool = os.getenv("THEME_POLISH", "false").lower() == "true"
+# Write a draft summary once this fraction of the dispatched agents has
+# answered (0 = off)
+AGGREGATION_DRAFT_AT: float = float(os.getenv("AGGREGATION_DRAFT_AT", "0"))
+MAX_CONCURRENT_AGENTS: int = int(os.getenv("MAX_CONCURRENT_AGENTS", "200"))
+INITIAL_CONCURRENT_AGENTS: int = int(os.getenv("INITIAL_CONCURRENT_AGENTS", "8"))
+AGENT_MAX_RETRIES: int = int(os.getenv("AGENT_MAX_RETRIES", "4"))
 MAX_AGENTS: int = int(os.getenv("MAX_AGENTS", "198"))
 PROFILES_DIR: str = os.getenv("PROFILES_DIR", "data/profiles")
 PROCESSED_DIR: str = os.getenv("PROCESSED_DIR", "data/processed")
+PROMPT_CACHING: bool = os.getenv("PROMPT_CACHING", "true").lower() == "true"
+RESPONSE_CACHE_PATH: str = os.getenv(
+    "RESPONSE_CACHE_PATH", "data/cache/responses.sqlite3"
+)
+RESPONSE_CACHE_TTL_SECONDS: float = float(
+    os.getenv("RESPONSE_CACHE_TTL_SECONDS", "604800")
+)
+RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "100000"))
+# Account-tier API budgets shared by all runs; 0 disables a limit
+RATE_LIMIT_RPM: int = int(os.getenv("RATE_LIMIT_RPM", "0"))
+RATE_LIMIT_INPUT_TPM: int = int(os.getenv("RATE_LIMIT_INPUT_TPM", "0"))
+RATE_LIMIT_OUTPUT_TPM: int = int(os.getenv("RATE_LIMIT_OUTPUT_TPM", "0"))
+BATCH_STATE_DIR: str = os.getenv("BATCH_STATE_DIR", "data/batches")
+AGENT_STREAMING: bool = os.getenv("AGENT_STREAMING", "true").lower() == "true"
+STREAM_CHUNK_MS: float = float(os.getenv("STREAM_CHUNK_MS", "100"))
+# Minimum gap between live_stats snapshots on a test's SSE stream
+LIVE_SNAPSHOT_MS: float = float(os.getenv("LIVE_SNAPSHOT_MS", "1000"))
+# Events held for a test's SSE client; a slower client holds back new agents
+STREAM_BUFFER_EVENTS: int = int(os.getenv("STREAM_BUFFER_EVENTS", "256"))
+# Per-test wall-clock budget and per-agent limit in seconds; 0 disables
+TEST_DEADLINE_SECONDS: float = float(os.getenv("TEST_DEADLINE_SECONDS", "120"))
+AGENT_TIMEOUT_SECONDS: float = float(os.getenv("AGENT_TIMEOUT_SECONDS", "60"))
+HEDGE_REQUESTS: bool = os.getenv("HEDGE_REQUESTS", "false").lower() == "true"
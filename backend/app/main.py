@@ -1,7 +1,96 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="CrowdTest API", version="0.1.0")
+from app.config import (
+    AGENT_MAX_RETRIES,
+    AGENT_MODEL,
+    AGENT_STREAMING,
+    AGGREGATION_CHUNK_TOKENS,
+    AGGREGATION_INPUT_TOKENS,
+    AGGREGATION_MAX_CONCURRENT,
+    AGGREGATION_MODEL,
+    ANTHROPIC_API_KEY,
+    BATCH_STATE_DIR,
+    HEDGE_REQUESTS,
+    INITIAL_CONCURRENT_AGENTS,
+    MAX_CONCURRENT_AGENTS,
+    PROCESSED_DIR,
+    PROMPT_CACHING,
+    RATE_LIMIT_INPUT_TPM,
+    RATE_LIMIT_OUTPUT_TPM,
+    RATE_LIMIT_RPM,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_TTL_SECONDS,
+    STREAM_CHUNK_MS,
+    THEME_COUNT,
+    THEME_POLISH,
+)
+from app.routers import batch, test
+from app.services.agent_runner import AgentRunner
+from app.services.aggregator import AggregationBudget, InsightAggregator
+from app.services.persona_registry import PersonaRegistry
+from app.services.rate_limiter import RateLimiter
+from app.services.response_cache import ResponseCache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Load every persona once so test runs are served from memory
+    registry = PersonaRegistry(PROCESSED_DIR)
+    await asyncio.to_thread(registry.load)
+    app.state.persona_registry = registry
+    response_cache = ResponseCache(
+        RESPONSE_CACHE_PATH,
+        max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    )
+    app.state.response_cache = response_cache
+    # One limiter for the whole process so concurrent tests share the budget
+    rate_limiter = RateLimiter(
+        requests_per_minute=RATE_LIMIT_RPM,
+        input_tokens_per_minute=RATE_LIMIT_INPUT_TPM,
+        output_tokens_per_minute=RATE_LIMIT_OUTPUT_TPM,
+    )
+    app.state.rate_limiter = rate_limiter
+    app.state.agent_runner = AgentRunner(
+        api_key=ANTHROPIC_API_KEY,
+        model=AGENT_MODEL,
+        max_concurrent=MAX_CONCURRENT_AGENTS,
+        initial_concurrent=INITIAL_CONCURRENT_AGENTS,
+        max_retries=AGENT_MAX_RETRIES,
+        registry=registry,
+        prompt_caching=PROMPT_CACHING,
+        response_cache=response_cache,
+        rate_limiter=rate_limiter if rate_limiter.enabled else None,
+        batch_state_dir=BATCH_STATE_DIR,
+        streaming=AGENT_STREAMING,
+        stream_chunk_ms=STREAM_CHUNK_MS,
+        hedging=HEDGE_REQUESTS,
+    )
+    app.state.aggregator = InsightAggregator(
+        api_key=ANTHROPIC_API_KEY,
+        map_model=AGENT_MODEL,
+        reduce_model=AGGREGATION_MODEL,
+        budget=AggregationBudget(
+            input_tokens=AGGREGATION_INPUT_TOKENS or None,
+            map_input_tokens=AGGREGATION_CHUNK_TOKENS,
+        ),
+        max_concurrent=AGGREGATION_MAX_CONCURRENT,
+        max_retries=AGENT_MAX_RETRIES,
+        rate_limiter=rate_limiter if rate_limiter.enabled else None,
+        theme_count=THEME_COUNT,
+        polish_themes=THEME_POLISH,
+    )
+    yield
+    response_cache.close()
+
+
+app = FastAPI(title="CrowdTest API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -11,6 +100,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.include_router(test.router)
+app.include_router(batch.router)
+
 
 @app.get("/")
 async def root() -> dict[str, str]:
@@ -3,7 +3,30 @@ from pydantic import BaseModel
 
 class TestRequest(BaseModel):
     product_description: str
+    # Segment expressions, any of which may match, e.g. "adult AND NOT tops_buyer"
     target_segments: list[str] | None = None
+    age_min: int | None = None
+    age_max: int | None = None
+    club_member_status: list[str] | None = None  # e.g. ["ACTIVE"]
+    deadline_seconds: float | None = None  # None = TEST_DEADLINE_SECONDS
+    agent_timeout_seconds: float | None = None  # None = AGENT_TIMEOUT_SECONDS
+    hedge: bool | None = None  # None = HEDGE_REQUESTS
+    bypass_cache: bool = False  # neither read nor write the response cache
+    refresh_cache: bool = False  # re-ask every agent and overwrite cached answers
+    # Stop once the positive/negative shares are known to within this width
+    # (0.1 = ten points); None runs every selected persona
+    sample_ci_width: float | None = None
+    # Preview: run this many typical personas per cluster (needs clusters.json)
+    representatives: int | None = None
+
+
+class BatchRequest(BaseModel):
+    # Every selected persona evaluates each product through the Batches API
+    product_descriptions: list[str]
+    target_segments: list[str] | None = None
+    age_min: int | None = None
+    age_max: int | None = None
+    club_member_status: list[str] | None = None
 
 
 class AgentResponse(BaseModel):
@@ -14,6 +37,26 @@ class AgentResponse(BaseModel):
     response_text: str
     sentiment: str
     response_time_ms: float
+    status: str = "ok"  # "ok", "error", "timed_out"
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cached: bool = False
+    attempts: int = 1  # API calls made, including retries (0 when cached)
+    attempt_errors: list[str] = []  # error type of each failed attempt
+    hedged: bool = False  # a duplicate request was sent for this agent
+    time_to_first_token_ms: float | None = None  # streaming runs only
+    stratum: str | None = None  # sampled runs: age band / shopping frequency
+    sample_weight: float = 1.0  # personas this answer stands for in a sampled run
+
+
+class AgentChunk(BaseModel):
+    """Partial text of an agent's answer while it is still being generated."""
+
+    agent_id: str
+    text: str  # new text since the previous chunk for this agent
+    attempt: int = 1  # a higher attempt means a retry; discard earlier text
 
 
 class SentimentBreakdown(BaseModel):
@@ -23,6 +66,12 @@ class SentimentBreakdown(BaseModel):
     positive_pct: float = 0.0
     neutral_pct: float = 0.0
     negative_pct: float = 0.0
+    # Confidence intervals on the percentages; a point for a full run
+    positive_interval: tuple[float, float] | None = None
+    neutral_interval: tuple[float, float] | None = None
+    negative_interval: tuple[float, float] | None = None
+    sample_size: int = 0
+    population: int = 0
 
 
 class SegmentData(BaseModel):
@@ -34,13 +83,56 @@ class SegmentData(BaseModel):
     recommendation: str = ""
 
 
+class LatencySummary(BaseModel):
+    """Agent response-time percentiles in milliseconds; None before answers."""
+
+    p50_ms: float | None = None
+    p90_ms: float | None = None
+    p95_ms: float | None = None
+    p99_ms: float | None = None
+    max_ms: float | None = None
+
+
+class LiveSnapshot(BaseModel):
+    """Running totals of a test, published while its agents answer."""
+
+    completed: int = 0
+    expected: int = 0  # agents selected for the run (0 if not known)
+    errors: int = 0
+    timed_out: int = 0
+    sentiment_breakdown: SentimentBreakdown = SentimentBreakdown()
+    # Per primary segment, largest population first
+    segment_breakdown: dict[str, SentimentBreakdown] = {}
+    latency: LatencySummary = LatencySummary()
+    final: bool = False  # every agent has finished
+
+
+class Theme(BaseModel):
+    """A recurring point in the responses, found without an LLM."""
+
+    label: str
+    keyphrases: list[str] = []
+    count: int = 0  # responses making the point
+    share_pct: float = 0.0  # of the answered responses (of the segment's)
+    positive: int = 0
+    neutral: int = 0
+    negative: int = 0
+    quote: str = ""
+    # Segment themes: how many times more often the segment makes the point
+    lift: float | None = None
+
+
 class InsightResults(BaseModel):
     executive_summary: str = ""
     sentiment_breakdown: SentimentBreakdown = SentimentBreakdown()
     segments: list[SegmentData] = []
     key_themes: list[str] = []
+    themes: list[Theme] = []
+    # Per manifest segment tag, what sets its responses apart
+    segment_themes: dict[str, list[Theme]] = {}
     total_agents: int = 0
     response_rate: float = 0.0
+    draft: bool = False  # written before every agent had answered
 
 
 class TestSession(BaseModel):
@@ -49,3 +141,11 @@ class TestSession(BaseModel):
     product_description: str = ""
     responses: list[AgentResponse] = []
     created_at: str = ""
+    sentiment_breakdown: SentimentBreakdown | None = None  # set when complete
+
+
+class BatchJob(BaseModel):
+    job_id: str
+    status: str = "pending"  # "running", "complete", "failed"
+    created_at: str = ""
+    results: dict[str, list[AgentResponse]] = {}  # per product, once complete
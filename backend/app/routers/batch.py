@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import uuid
+from collections.abc import Awaitable
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.config import MAX_AGENTS
+from app.models.schemas import AgentResponse, BatchJob, BatchRequest
+from app.services.segment_index import SegmentQuery
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/batch", tags=["batch"])
+
+# In-memory job state; the batches themselves are persisted by the runner
+_jobs: dict[str, BatchJob] = {}
+_tasks: dict[str, asyncio.Task] = {}
+
+
+def _start(work: Awaitable[dict[str, list[AgentResponse]]]) -> dict[str, str]:
+    job = BatchJob(
+        job_id=str(uuid.uuid4()),
+        status="running",
+        created_at=datetime.now(timezone.utc).isoformat(),
+    )
+    _jobs[job.job_id] = job
+
+    async def run() -> None:
+        try:
+            job.results = await work
+            job.status = "complete"
+        except Exception:
+            logger.exception("Batch job %s failed", job.job_id)
+            job.status = "failed"
+
+    _tasks[job.job_id] = asyncio.create_task(run())
+    return {"job_id": job.job_id, "status": job.status}
+
+
+@router.post("")
+async def start_batch(body: BatchRequest, request: Request) -> dict[str, str]:
+    """Evaluate products offline through the Message Batches API.
+
+    Half the price of a live test, but results take minutes to hours; poll
+    GET /api/batch/{job_id} for them.
+    """
+    if not body.product_descriptions:
+        raise HTTPException(status_code=400, detail="No product descriptions")
+    runner = request.app.state.agent_runner
+    query = SegmentQuery(
+        segments=tuple(body.target_segments or ()),
+        age_min=body.age_min,
+        age_max=body.age_max,
+        club_member_status=tuple(body.club_member_status or ()),
+    )
+    try:
+        personas = await runner.select_agents(max_agents=MAX_AGENTS, query=query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return _start(runner.run_batch(body.product_descriptions, personas=personas))
+
+
+@router.post("/resume")
+async def resume_batches(request: Request) -> dict[str, str]:
+    """Collect batches submitted before a restart whose results were never read."""
+    return _start(request.app.state.agent_runner.resume_batches())
+
+
+@router.get("/{job_id}")
+async def get_batch(job_id: str) -> BatchJob:
+    """A batch job; ``results`` is filled in once it is complete."""
+    if job_id not in _jobs:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return _jobs[job_id]
@@ -0,0 +1,336 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import Counter
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, HTTPException, Request
+from sse_starlette.sse import EventSourceResponse
+
+from app.config import (
+    AGENT_TIMEOUT_SECONDS,
+    AGGREGATION_DRAFT_AT,
+    LIVE_SNAPSHOT_MS,
+    MAX_AGENTS,
+    STREAM_BUFFER_EVENTS,
+    TEST_DEADLINE_SECONDS,
+)
+from app.models.schemas import (
+    AgentChunk,
+    AgentResponse,
+    InsightResults,
+    LiveSnapshot,
+    TestRequest,
+    TestSession,
+)
+from app.services.aggregator import AggregationScheduler
+from app.services.live_aggregator import LiveAggregator
+from app.services.persona_clusters import CLUSTERS_FILENAME, load_clusters
+from app.services.persona_store import Persona
+from app.services.sampling import SamplingPlan
+from app.services.segment_index import SegmentQuery
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/test", tags=["test"])
+
+# In-memory test state (no database for the MVP)
+_sessions: dict[str, TestSession] = {}
+_queues: dict[str, asyncio.Queue] = {}
+_tasks: dict[str, asyncio.Task] = {}
+_insights: dict[str, InsightResults] = {}
+_drafts: dict[str, InsightResults] = {}
+_live: dict[str, LiveAggregator] = {}
+# Tests whose SSE stream has a client attached
+_readers: set[str] = set()
+
+# Queue sentinels marking the end of a run, then the end of its aggregation
+_DONE = object()
+_AGGREGATED = object()
+
+
+def _put_final(queue: asyncio.Queue, event: object) -> None:
+    """Queue an end-of-run sentinel without waiting, even with nobody reading.
+
+    A full queue loses its oldest event to make room.
+    """
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+def _or_default(value: float | None, default: float) -> float | None:
+    """Request override, else the configured default; 0 means no limit."""
+    value = default if value is None else value
+    return value or None
+
+
+@router.post("")
+async def start_test(body: TestRequest, request: Request) -> dict[str, str]:
+    """Start a new product test; agents run in the background."""
+    runner = request.app.state.agent_runner
+    aggregator = request.app.state.aggregator
+    query = SegmentQuery(
+        segments=tuple(body.target_segments or ()),
+        age_min=body.age_min,
+        age_max=body.age_max,
+        club_member_status=tuple(body.club_member_status or ()),
+    )
+    sampling = (
+        SamplingPlan(ci_width=body.sample_ci_width)
+        if body.sample_ci_width is not None
+        else None
+    )
+    if body.representatives is not None:
+        if sampling is not None:
+            raise HTTPException(
+                status_code=400,
+                detail="Use either sample_ci_width or representatives, not both",
+            )
+        if body.representatives < 1:
+            raise HTTPException(
+                status_code=400, detail="representatives must be at least 1"
+            )
+        processed_dir = request.app.state.persona_registry.processed_dir
+        if await asyncio.to_thread(load_clusters, processed_dir) is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No {CLUSTERS_FILENAME} in {processed_dir}; "
+                "run convert_real_data.py with --clusters first",
+            )
+    # Resolved up front so a bad segment query fails the request, not the run.
+    # A sample or preview is drawn from every match, with MAX_AGENTS capping
+    # its size.
+    try:
+        personas = await runner.select_agents(
+            max_agents=None if sampling or body.representatives else MAX_AGENTS,
+            query=query,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    test_id = str(uuid.uuid4())
+    session = TestSession(
+        test_id=test_id,
+        status="running",
+        product_description=body.product_description,
+        created_at=datetime.now(timezone.utc).isoformat(),
+    )
+    # Bounded, so a slow SSE client holds back the run rather than letting
+    # events pile up in memory
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_BUFFER_EVENTS)
+    live = LiveAggregator(interval_seconds=LIVE_SNAPSHOT_MS / 1000)
+    tags = {p.profile_id: p.entry.get("segments", []) for p in personas}
+
+    async def emit(event: object) -> None:
+        # Only a client reading the stream holds the run back. Without one
+        # (e.g. a caller polling /live and /results) events that do not fit
+        # are dropped.
+        if test_id in _readers:
+            await queue.put(event)
+            return
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def on_draft(results: InsightResults) -> None:
+        _drafts[test_id] = results
+        await emit(results)
+
+    # Aggregation starts as agents answer: a segment's analysis once all its
+    # dispatched personas are in, a draft summary at AGGREGATION_DRAFT_AT of
+    # them. A sample or preview runs only some of the selected personas, so
+    # what to expect is set once the runner has picked them.
+    scheduler = AggregationScheduler(
+        aggregator,
+        body.product_description,
+        {},
+        draft_at=AGGREGATION_DRAFT_AT or None,
+        on_draft=on_draft,
+    )
+
+    def on_dispatch(dispatched: list[Persona]) -> None:
+        scheduler.expect(
+            Counter(
+                tags[p.profile_id][0] if tags[p.profile_id] else "unknown"
+                for p in dispatched
+            )
+        )
+
+    _sessions[test_id] = session
+    _queues[test_id] = queue
+    _live[test_id] = live
+
+    async def on_chunk(chunk: AgentChunk) -> None:
+        # Partial text is only a preview of the agent_response to come, so
+        # it is dropped rather than holding an agent up when the client lags
+        try:
+            queue.put_nowait(chunk)
+        except asyncio.QueueFull:
+            pass
+
+    async def run() -> None:
+        try:
+            responses = runner.iter_agents(
+                body.product_description,
+                on_chunk=on_chunk,
+                buffer_size=STREAM_BUFFER_EVENTS,
+                bypass_cache=body.bypass_cache,
+                refresh_cache=body.refresh_cache,
+                deadline=_or_default(body.deadline_seconds, TEST_DEADLINE_SECONDS),
+                agent_timeout=_or_default(
+                    body.agent_timeout_seconds, AGENT_TIMEOUT_SECONDS
+                ),
+                hedge=body.hedge,
+                personas=personas,
+                max_agents=MAX_AGENTS,
+                sampling=sampling,
+                representatives=body.representatives,
+                live=live,
+                on_dispatch=on_dispatch,
+            )
+            async with aclosing(responses):
+                async for response in responses:
+                    session.responses.append(response)
+                    scheduler.add(response, tags.get(response.agent_id, ()))
+                    await emit(response)
+                    # The runner has already added the response to the tallies
+                    if live.due():
+                        await emit(live.snapshot())
+            final = live.snapshot(final=True)
+            session.sentiment_breakdown = final.sentiment_breakdown
+            session.status = "complete"
+            await emit(final)
+        except asyncio.CancelledError:
+            logger.info("Test %s cancelled", test_id)
+            session.status = "cancelled"
+        except Exception:
+            logger.exception("Test %s failed", test_id)
+            session.status = "failed"
+        finally:
+            _put_final(queue, _DONE)
+        if session.status == "complete":
+            await aggregate()
+        else:
+            scheduler.cancel()
+
+    async def aggregate() -> None:
+        try:
+            _insights[test_id] = await scheduler.finish(session.sentiment_breakdown)
+        except Exception:
+            logger.exception("Aggregation for test %s failed", test_id)
+        finally:
+            _put_final(queue, _AGGREGATED)
+
+    _tasks[test_id] = asyncio.create_task(run())
+    return {"test_id": test_id, "status": "running"}
+
+
+@router.post("/{test_id}/cancel")
+async def cancel_test(test_id: str) -> dict[str, str]:
+    """Stop a running test; agents still in flight are abandoned."""
+    if test_id not in _sessions:
+        raise HTTPException(status_code=404, detail="Test not found")
+    task = _tasks.get(test_id)
+    if task is not None and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    return {"test_id": test_id, "status": _sessions[test_id].status}
+
+
+def _draft_event(test_id: str) -> dict:
+    return {"event": "insights_draft", "data": json.dumps({"test_id": test_id})}
+
+
+@router.get("/{test_id}/stream")
+async def stream_test(test_id: str) -> EventSourceResponse:
+    """SSE stream of agent_chunk / agent_response events, then agents_complete.
+
+    live_stats snapshots of the running tallies are interleaved at most once
+    per LIVE_SNAPSHOT_MS, with a final one just before agents_complete. A
+    completed run goes on to aggregation_started, then insights_ready (or
+    aggregation_failed) once its results can be fetched. insights_draft
+    says a draft can be fetched; it may come before or after agents_complete.
+    """
+    if test_id not in _sessions:
+        raise HTTPException(status_code=404, detail="Test not found")
+    queue = _queues[test_id]
+    session = _sessions[test_id]
+
+    async def event_generator() -> AsyncIterator[dict]:
+        _readers.add(test_id)
+        try:
+            while True:
+                event = await queue.get()
+                if event is _DONE:
+                    break
+                if isinstance(event, AgentChunk):
+                    yield {"event": "agent_chunk", "data": event.model_dump_json()}
+                elif isinstance(event, InsightResults):
+                    yield _draft_event(test_id)
+                elif isinstance(event, LiveSnapshot):
+                    yield {"event": "live_stats", "data": event.model_dump_json()}
+                else:
+                    yield {
+                        "event": "agent_response",
+                        "data": event.model_dump_json(),
+                    }
+            yield {
+                "event": "agents_complete",
+                "data": json.dumps(
+                    {"total": len(session.responses), "status": session.status}
+                ),
+            }
+            if session.status != "complete":
+                return
+            yield {"event": "aggregation_started", "data": json.dumps({})}
+            # A draft may still land after the last agent
+            while await queue.get() is not _AGGREGATED:
+                yield _draft_event(test_id)
+            yield {
+                "event": (
+                    "insights_ready" if test_id in _insights else "aggregation_failed"
+                ),
+                "data": json.dumps({"test_id": test_id}),
+            }
+        except asyncio.CancelledError:
+            # Client went away mid-run; nobody is left to read the results
+            task = _tasks.get(test_id)
+            if task is not None and not task.done():
+                logger.info("Client disconnected, cancelling test %s", test_id)
+                task.cancel()
+            raise
+        finally:
+            _readers.discard(test_id)
+
+    return EventSourceResponse(event_generator())
+
+
+@router.get("/{test_id}/live")
+async def get_live(test_id: str) -> LiveSnapshot:
+    """Current tallies of a test, running or finished."""
+    if test_id not in _live:
+        raise HTTPException(status_code=404, detail="Test not found")
+    session = _sessions[test_id]
+    return _live[test_id].snapshot(final=session.status == "complete")
+
+
+@router.get("/{test_id}/results")
+async def get_results(test_id: str) -> InsightResults:
+    """Insights for a finished test, else its draft (``draft`` is set).
+
+    404 until aggregation has completed or a draft has been written.
+    """
+    if test_id not in _sessions:
+        raise HTTPException(status_code=404, detail="Test not found")
+    if test_id in _insights:
+        return _insights[test_id]
+    if test_id in _drafts:
+        return _drafts[test_id]
+    raise HTTPException(status_code=404, detail="Insights not ready")
@@ -1,46 +1,138 @@
 import asyncio
-import json
 import logging
 import time
-from collections.abc import Callable
+from collections import Counter
+from collections.abc import AsyncIterator, Callable, Sequence
+from contextlib import aclosing
 from pathlib import Path
+from typing import Any
 
 import anthropic
 
-from app.models.schemas import AgentResponse
-from app.services.prompt_manager import format_agent_prompt, format_evaluation_prompt
+from app.models.schemas import AgentChunk, AgentResponse
+from app.services.batch_runner import BatchRunner, split_requests
+from app.services.concurrency import (
+    AdaptiveLimiter,
+    LatencyTracker,
+    backoff_delay,
+    is_overload_error,
+    is_retryable_error,
+    retry_after_seconds,
+)
+from app.services.live_aggregator import LiveAggregator
+from app.services.persona_clusters import CLUSTERS_FILENAME, load_clusters
+from app.services.persona_registry import Persona, PersonaRegistry
+from app.services.prompt_manager import (
+    format_agent_prompt,
+    format_agent_system_blocks,
+    format_evaluation_prompt,
+)
+from app.services.rate_limiter import RateLimiter, estimate_tokens
+from app.services.response_cache import ResponseCache, make_cache_key
+from app.services.sampling import (
+    SamplingPlan,
+    StratifiedTally,
+    assign_weights,
+    stratified_order,
+    stratum_of,
+)
+from app.services.segment_index import SegmentQuery
+from app.services.sentiment import detect_sentiment
 
 logger = logging.getLogger(__name__)
 
-# Sentiment keyword lists for simple MVP detection
-_POSITIVE_WORDS = [
-    "love", "great", "amazing", "fantastic", "excellent", "perfect",
-    "definitely", "would buy", "i'd buy", "sign me up", "excited",
-    "awesome", "wonderful", "brilliant", "yes", "absolutely",
-    "interested", "want", "need this", "can't wait", "impressive",
-]
-_NEGATIVE_WORDS = [
-    "don't like", "wouldn't", "not interested", "dislike", "hate",
-    "terrible", "awful", "no way", "pass", "skip", "not for me",
-    "waste", "disappointed", "overpriced", "cheap", "wouldn't buy",
-    "don't need", "not worth", "ugly", "boring",
-]
-
-
-def detect_sentiment(text: str) -> str:
-    """Simple keyword-based sentiment detection for visualization color coding.
-
-    Returns 'positive', 'negative', or 'neutral'.
-    """
-    lower = text.lower()
-    pos_count = sum(1 for w in _POSITIVE_WORDS if w in lower)
-    neg_count = sum(1 for w in _NEGATIVE_WORDS if w in lower)
-
-    if pos_count > neg_count:
-        return "positive"
-    elif neg_count > pos_count:
-        return "negative"
-    return "neutral"
+AGENT_MAX_TOKENS = 300
+
+
+def _agent_fields(profile_id: str, manifest_entry: dict | None) -> dict:
+    """AgentResponse identity fields taken from a manifest entry."""
+    entry = manifest_entry or {}
+    segments = entry.get("segments", [])
+    return {
+        "agent_id": profile_id,
+        "profile_name": entry.get("display_name", profile_id[:12]),
+        "age": entry.get("age", 0),
+        "segment": segments[0] if segments else "unknown",
+    }
+
+
+def timed_out_response(
+    profile_id: str, manifest_entry: dict | None, elapsed_ms: float = 0.0
+) -> AgentResponse:
+    """Placeholder for an agent that hit its timeout or the test deadline."""
+    return AgentResponse(
+        response_text="[Error: timed_out]",
+        sentiment="neutral",
+        response_time_ms=round(elapsed_ms, 1),
+        status="timed_out",
+        **_agent_fields(profile_id, manifest_entry),
+    )
+
+
+# Queue sentinel: one per worker when it runs out of agents
+_WORKER_DONE = object()
+
+
+class _RunStats:
+    """Running totals for the end-of-run log line."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.failures = 0
+        self.timed_out = 0
+        self.retries = 0
+        self.cached = 0
+        self.input_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+
+    def add(self, response: AgentResponse) -> None:
+        self.count += 1
+        self.failures += response.status == "error"
+        self.timed_out += response.status == "timed_out"
+        self.retries += max(response.attempts - 1, 0)
+        self.cached += response.cached
+        self.input_tokens += response.input_tokens
+        self.cache_creation_input_tokens += response.cache_creation_input_tokens
+        self.cache_read_input_tokens += response.cache_read_input_tokens
+
+
+class _ChunkEmitter:
+    """Debounces streamed text deltas into AgentChunk callback events."""
+
+    def __init__(
+        self, agent_id: str, callback: Callable, interval_ms: float, start: float
+    ) -> None:
+        self.agent_id = agent_id
+        self.callback = callback
+        self.interval = interval_ms / 1000
+        self.start = start
+        self.first_token_ms: float | None = None
+        self._buffer: list[str] = []
+        self._attempt = 1
+        self._last_flush = 0.0
+
+    async def feed(self, text: str, attempt: int) -> None:
+        now = time.monotonic()
+        if self.first_token_ms is None:
+            self.first_token_ms = (now - self.start) * 1000
+        if attempt != self._attempt:
+            # A retry restarts the answer; drop what the failed attempt left
+            self._buffer.clear()
+            self._attempt = attempt
+        self._buffer.append(text)
+        if now - self._last_flush >= self.interval:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        chunk = AgentChunk(
+            agent_id=self.agent_id, text="".join(self._buffer), attempt=self._attempt
+        )
+        self._buffer.clear()
+        self._last_flush = time.monotonic()
+        await self.callback(chunk)
 
 
 class AgentRunner:
@@ -51,10 +143,203 @@ class AgentRunner:
         api_key: str,
         model: str = "claude-sonnet-4-20250514",
         max_concurrent: int = 50,
+        registry: PersonaRegistry | None = None,
+        prompt_caching: bool = False,
+        response_cache: ResponseCache | None = None,
+        initial_concurrent: int = 8,
+        max_retries: int = 4,
+        retry_base_delay: float = 1.0,
+        rate_limiter: RateLimiter | None = None,
+        batch_state_dir: str = "data/batches",
+        batch_poll_interval: float = 5.0,
+        streaming: bool = False,
+        stream_chunk_ms: float = 100.0,
+        hedging: bool = False,
     ) -> None:
-        self.client = anthropic.AsyncAnthropic(api_key=api_key)
+        # Retries are handled here so the limiter sees every 429/529
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
         self.model = model
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.limiter = AdaptiveLimiter(
+            initial_limit=initial_concurrent, max_limit=max_concurrent
+        )
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.rate_limiter = rate_limiter
+        self.registry = registry
+        self.prompt_caching = prompt_caching
+        self.response_cache = response_cache
+        self.batch_state_dir = batch_state_dir
+        self.batch_poll_interval = batch_poll_interval
+        self.streaming = streaming
+        self.stream_chunk_ms = stream_chunk_ms
+        self.hedging = hedging
+        self.latency_tracker = LatencyTracker()
+        self._registries: dict[str, PersonaRegistry] = {}
+
+    @property
+    def batch_runner(self) -> BatchRunner:
+        return BatchRunner(
+            self.client,
+            state_dir=self.batch_state_dir,
+            poll_interval=self.batch_poll_interval,
+            retry_base_delay=self.retry_base_delay,
+        )
+
+    def _system_prompt(self, persona_prompt: str) -> str | list[dict]:
+        if self.prompt_caching:
+            return format_agent_system_blocks(persona_prompt)
+        return format_agent_prompt(persona_prompt)
+
+    def _registry_for(self, processed_dir: str | None) -> PersonaRegistry:
+        """Return the injected registry, or a cached one for processed_dir."""
+        if self.registry is not None and (
+            processed_dir is None
+            or Path(processed_dir) == self.registry.processed_dir
+        ):
+            return self.registry
+
+        key = processed_dir or "data/processed"
+        if key not in self._registries:
+            self._registries[key] = PersonaRegistry(key)
+        return self._registries[key]
+
+    async def _create_with_retries(
+        self,
+        attempt_errors: list[str],
+        estimated_input_tokens: int,
+        on_text: "_ChunkEmitter | None" = None,
+        started: asyncio.Event | None = None,
+        **request: Any,
+    ) -> anthropic.types.Message:
+        """Call the Messages API under the rate and concurrency limiters.
+
+        Transient failures are retried with jittered exponential backoff
+        (honoring retry-after); the error type of every failed attempt is
+        appended to attempt_errors. With on_text, the call is streamed and
+        every text delta is fed to it as it arrives. ``started`` is set once
+        the first attempt holds its rate and concurrency slots.
+        """
+        while True:
+            reservation = None
+            if self.rate_limiter is not None:
+                reservation = await self.rate_limiter.acquire(
+                    estimated_input_tokens, request["max_tokens"]
+                )
+            async with self.limiter:
+                call_start = time.monotonic()
+                if started is not None:
+                    started.set()
+                try:
+                    if on_text is None:
+                        response = await self.client.messages.create(**request)
+                    else:
+                        attempt = len(attempt_errors) + 1
+                        async with self.client.messages.stream(**request) as stream:
+                            async for text in stream.text_stream:
+                                await on_text.feed(text, attempt)
+                            response = await stream.get_final_message()
+                        await on_text.flush()
+                except Exception as e:
+                    if reservation is not None:
+                        # Rejected calls consume no tokens; the request stays counted
+                        self.rate_limiter.reconcile(reservation, 0, 0)
+                    attempt_errors.append(type(e).__name__)
+                    if is_overload_error(e):
+                        self.limiter.on_overload()
+                    retry_after = retry_after_seconds(e)
+                    if retry_after is not None:
+                        self.limiter.pause_for(retry_after)
+                    if (
+                        not is_retryable_error(e)
+                        or len(attempt_errors) > self.max_retries
+                    ):
+                        raise
+                else:
+                    latency_ms = (time.monotonic() - call_start) * 1000
+                    self.limiter.on_success(latency_ms)
+                    self.latency_tracker.record(latency_ms)
+                    if reservation is not None:
+                        usage = response.usage
+                        # Cache reads do not count toward the input-TPM limit
+                        self.rate_limiter.reconcile(
+                            reservation,
+                            (usage.input_tokens or 0)
+                            + (usage.cache_creation_input_tokens or 0),
+                            usage.output_tokens or 0,
+                        )
+                    return response
+
+            delay = backoff_delay(
+                len(attempt_errors), base=self.retry_base_delay, retry_after=retry_after
+            )
+            await asyncio.sleep(delay)
+
+    async def _call_with_hedge(
+        self,
+        attempt_errors: list[str],
+        estimated_input_tokens: int,
+        emitter: "_ChunkEmitter | None",
+        hedge: bool,
+        **request: Any,
+    ) -> tuple[anthropic.types.Message, bool]:
+        """Make the agent's API call, hedging it if it runs long.
+
+        With hedge, once the call has been in flight longer than the observed
+        p95 latency a duplicate (non-streamed) request is sent and whichever
+        succeeds first wins. Time spent waiting for the rate limiter or a
+        concurrency slot does not count. Errors of the duplicate's attempts
+        are added to attempt_errors as "hedge:<type>" once the race is over.
+        Returns (message, whether a hedge was sent).
+        """
+        hedge_after_ms = self.latency_tracker.percentile(0.95) if hedge else None
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(
+            self._create_with_retries(
+                attempt_errors,
+                estimated_input_tokens,
+                on_text=emitter,
+                started=started,
+                **request,
+            )
+        )
+        tasks = {primary}
+        hedge_errors: list[str] = []
+        try:
+            if hedge_after_ms is None:
+                return await primary, False
+            # The clock starts once the primary holds its rate and concurrency slots
+            in_flight = asyncio.ensure_future(started.wait())
+            try:
+                await asyncio.wait(
+                    {primary, in_flight}, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                in_flight.cancel()
+            if not primary.done():
+                await asyncio.wait({primary}, timeout=hedge_after_ms / 1000)
+            if primary.done():
+                return primary.result(), False
+
+            tasks.add(
+                asyncio.ensure_future(
+                    self._create_with_retries(
+                        hedge_errors, estimated_input_tokens, **request
+                    )
+                )
+            )
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), True
+            return primary.result(), True  # both failed: raise the primary's error
+        finally:
+            for task in tasks:
+                task.cancel()
+            attempt_errors.extend(f"hedge:{error}" for error in hedge_errors)
 
     async def run_single_agent(
         self,
@@ -62,156 +347,655 @@ class AgentRunner:
         persona_prompt: str,
         product_description: str,
         manifest_entry: dict | None = None,
+        bypass_cache: bool = False,
+        refresh_cache: bool = False,
+        on_chunk: Callable | None = None,
+        timeout: float | None = None,
+        hedge: bool | None = None,
     ) -> AgentResponse:
-        """Run a single agent with semaphore-based rate limiting.
+        """Run a single agent under the adaptive concurrency limiter.
+
+        Answers are served from the response cache when one is configured,
+        unless bypass_cache (neither read nor write) or refresh_cache (skip
+        the read, overwrite the entry) is set.
+
+        With on_chunk, the answer is streamed and on_chunk is awaited with an
+        AgentChunk of new text every ``stream_chunk_ms`` milliseconds.
+
+        An agent still running after ``timeout`` seconds is abandoned and
+        reported with status "timed_out". ``hedge`` (default: the runner's
+        ``hedging`` setting) sends a duplicate request for slow calls.
 
         Returns an AgentResponse on success, or an error response on failure.
         """
         start = time.monotonic()
-        display_name = (manifest_entry or {}).get("display_name", profile_id[:12])
-        age = (manifest_entry or {}).get("age", 0)
-        segments = (manifest_entry or {}).get("segments", [])
-        segment = segments[0] if segments else "unknown"
+        fields = _agent_fields(profile_id, manifest_entry)
+        attempt_errors: list[str] = []
+        ttft_ms: float | None = None
+        hedged = False
 
         try:
-            async with self.semaphore:
-                system_prompt = format_agent_prompt(persona_prompt)
-                user_message = format_evaluation_prompt(product_description)
-
-                response = await self.client.messages.create(
-                    model=self.model,
-                    max_tokens=300,
-                    system=system_prompt,
-                    messages=[{"role": "user", "content": user_message}],
+            system_prompt = self._system_prompt(persona_prompt)
+            user_message = format_evaluation_prompt(product_description)
+
+            cache = None if bypass_cache else self.response_cache
+            cache_key = ""
+            cached: dict | None = None
+            if cache is not None:
+                cache_key = make_cache_key(
+                    self.model, system_prompt, user_message, AGENT_MAX_TOKENS
                 )
+                if not refresh_cache:
+                    cached = await asyncio.to_thread(cache.get, cache_key)
+
+            if cached is None:
+                emitter = None
+                if on_chunk is not None:
+                    emitter = _ChunkEmitter(
+                        profile_id, on_chunk, self.stream_chunk_ms, start
+                    )
+                async with asyncio.timeout(timeout):
+                    response, hedged = await self._call_with_hedge(
+                        attempt_errors,
+                        estimate_tokens(system_prompt) + estimate_tokens(user_message),
+                        emitter,
+                        self.hedging if hedge is None else hedge,
+                        model=self.model,
+                        max_tokens=AGENT_MAX_TOKENS,
+                        system=system_prompt,
+                        messages=[{"role": "user", "content": user_message}],
+                    )
+                usage = response.usage
+                result = {
+                    "response_text": response.content[0].text,
+                    "input_tokens": usage.input_tokens or 0,
+                    "output_tokens": usage.output_tokens or 0,
+                    "cache_creation_input_tokens": (
+                        usage.cache_creation_input_tokens or 0
+                    ),
+                    "cache_read_input_tokens": usage.cache_read_input_tokens or 0,
+                }
+                if cache is not None:
+                    await asyncio.to_thread(cache.put, cache_key, result)
+                if emitter is not None and emitter.first_token_ms is not None:
+                    ttft_ms = round(emitter.first_token_ms, 1)
+            else:
+                result = cached
 
-                response_text = response.content[0].text
-                elapsed_ms = (time.monotonic() - start) * 1000
+            elapsed_ms = (time.monotonic() - start) * 1000
+            return AgentResponse(
+                sentiment=detect_sentiment(result["response_text"]),
+                response_time_ms=round(elapsed_ms, 1),
+                cached=cached is not None,
+                attempts=len(attempt_errors) + (0 if cached else 1) + hedged,
+                attempt_errors=attempt_errors,
+                hedged=hedged,
+                time_to_first_token_ms=ttft_ms,
+                **fields,
+                **result,
+            )
 
-                return AgentResponse(
-                    agent_id=profile_id,
-                    profile_name=display_name,
-                    age=age,
-                    segment=segment,
-                    response_text=response_text,
-                    sentiment=detect_sentiment(response_text),
-                    response_time_ms=round(elapsed_ms, 1),
-                )
+        except TimeoutError:
+            elapsed_ms = (time.monotonic() - start) * 1000
+            logger.warning("Agent %s timed out after %.0fms", profile_id, elapsed_ms)
+            return timed_out_response(profile_id, manifest_entry, elapsed_ms)
 
         except Exception as e:
             elapsed_ms = (time.monotonic() - start) * 1000
             logger.error("Agent %s failed: %s", profile_id, e)
             return AgentResponse(
-                agent_id=profile_id,
-                profile_name=display_name,
-                age=age,
-                segment=segment,
                 response_text=f"[Error: {type(e).__name__}]",
                 sentiment="neutral",
                 response_time_ms=round(elapsed_ms, 1),
+                attempts=len(attempt_errors),
+                attempt_errors=attempt_errors,
+                status="error",
+                **fields,
             )
 
-    async def run_all_agents(
+    async def select_agents(
+        self,
+        processed_dir: str | None = None,
+        max_agents: int | None = None,
+        query: SegmentQuery | None = None,
+    ) -> list[Persona]:
+        """Resolve the personas a run targets.
+
+        Args:
+            processed_dir: Directory with persona .txt files and manifest.json
+                (None = the registry injected at construction).
+            max_agents: Limit number of agents (None = all).
+            query: Segment/age/club filter (None = everyone).
+
+        Raises:
+            ValueError: If a segment expression is malformed or unknown.
+        """
+        registry = self._registry_for(processed_dir)
+        # Stat-only freshness check; persona texts are served from memory
+        await asyncio.to_thread(registry.reload_if_changed)
+        if query is None or query.is_empty:
+            # Sliced before materializing: a packed store decodes only these
+            return registry.all(limit=max_agents)
+        # The first query after a load builds the segment index
+        return await asyncio.to_thread(registry.select, query, max_agents)
+
+    async def _resolve_agents(
+        self,
+        processed_dir: str | None,
+        max_agents: int | None,
+        query: SegmentQuery | None,
+        personas: Sequence[Persona] | None,
+    ) -> list[Persona]:
+        if personas is not None:
+            return list(personas[:max_agents])
+        return await self.select_agents(processed_dir, max_agents, query)
+
+    async def iter_agents(
         self,
         product_description: str,
-        processed_dir: str = "data/processed",
+        processed_dir: str | None = None,
         max_agents: int | None = None,
-        callback: Callable | None = None,
-    ) -> list[AgentResponse]:
-        """Run all persona agents in parallel.
+        on_chunk: Callable | None = None,
+        bypass_cache: bool = False,
+        refresh_cache: bool = False,
+        buffer_size: int = 64,
+        deadline: float | None = None,
+        agent_timeout: float | None = None,
+        hedge: bool | None = None,
+        query: SegmentQuery | None = None,
+        personas: Sequence[Persona] | None = None,
+        sampling: SamplingPlan | None = None,
+        representatives: int | None = None,
+        live: LiveAggregator | None = None,
+        on_dispatch: Callable[[list[Persona]], None] | None = None,
+    ) -> AsyncIterator[AgentResponse]:
+        """Yield AgentResponses in completion order as agents finish.
+
+        Work is pulled lazily by a fixed pool of workers (the concurrency
+        ceiling), never by one coroutine per agent. Finished results wait in
+        a queue of ``buffer_size``; when the consumer falls behind, workers
+        block on it and stop starting new agents. Breaking out of the loop
+        cancels the agents still running.
 
         Args:
             product_description: The product/change to evaluate.
-            processed_dir: Directory with persona .txt files and manifest.json.
+            processed_dir: Directory with persona .txt files and manifest.json
+                (None = the registry injected at construction).
             max_agents: Limit number of agents (None = all).
-            callback: Called with each AgentResponse as it completes (for SSE streaming).
+            on_chunk: Called with AgentChunk partial-text events (streaming
+                mode only).
+            bypass_cache: Skip the response cache entirely for this run.
+            refresh_cache: Ignore cached answers but store the fresh ones.
+            buffer_size: Finished results held for a slow consumer.
+            deadline: Wall-clock budget in seconds for the whole run; agents
+                unfinished by then are reported with status "timed_out".
+            agent_timeout: Per-agent time limit in seconds.
+            hedge: Send duplicate requests for calls slower than the observed
+                p95 (None = the runner's ``hedging`` setting).
+            query: Only run the personas matching this segment/age/club filter.
+            personas: An already resolved subset (see select_agents) to run
+                instead of selecting from the registry.
+            sampling: Run a stratified sample and stop once the sentiment
+                split is known to the plan's precision; max_agents then caps
+                the sample size.
+            representatives: Preview mode: run only this many of the most
+                typical personas per cluster (see run_all_agents).
+            live: Running tallies to update with each response before it is
+                yielded.
+            on_dispatch: Called with the personas about to be run, in run
+                order, once they are selected (a sampled run may stop before
+                reaching them all).
+
+        Sampled and preview responses carry their stratum when yielded and
+        get their sample_weight once the iteration is over.
+
+        Raises:
+            ValueError: As run_all_agents.
+        """
+        run = self._run(
+            product_description,
+            processed_dir,
+            max_agents,
+            on_chunk,
+            bypass_cache,
+            refresh_cache,
+            buffer_size,
+            deadline,
+            agent_timeout,
+            hedge,
+            query,
+            personas,
+            sampling,
+            representatives,
+            live,
+            on_dispatch,
+        )
+        async with aclosing(run):
+            async for _, response in run:
+                yield response
 
-        Returns:
-            List of all AgentResponse objects.
+    async def _run(
+        self,
+        product_description: str,
+        processed_dir: str | None,
+        max_agents: int | None,
+        on_chunk: Callable | None,
+        bypass_cache: bool,
+        refresh_cache: bool,
+        buffer_size: int | None,
+        deadline: float | None,
+        agent_timeout: float | None,
+        hedge: bool | None,
+        query: SegmentQuery | None,
+        personas: Sequence[Persona] | None,
+        sampling: SamplingPlan | None,
+        representatives: int | None,
+        live: LiveAggregator | None,
+        on_dispatch: Callable[[list[Persona]], None] | None = None,
+    ) -> AsyncIterator[tuple[int, AgentResponse]]:
+        """Select the personas, run them and yield (input index, response).
+
+        ``buffer_size`` None holds every result (a consumer that keeps up).
         """
-        processed_path = Path(processed_dir)
-        manifest_path = processed_path / "manifest.json"
-
-        with open(manifest_path) as f:
-            manifest: dict = json.load(f)
-
-        # Build list of (profile_id, persona_text, manifest_entry)
-        agent_inputs: list[tuple[str, str, dict]] = []
-        for profile_id, entry in manifest.items():
-            persona_file = entry["persona_file"]
-            persona_path = Path(persona_file)
-
-            # Try multiple resolution strategies:
-            # 1. Absolute or already correct relative path
-            # 2. Relative to processed_dir
-            # 3. Filename only, in processed_dir
-            if not persona_path.exists():
-                persona_path = processed_path / persona_file
-            if not persona_path.exists():
-                persona_path = processed_path / Path(persona_file).name
-
-            persona_text = persona_path.read_text()
-            agent_inputs.append((profile_id, persona_text, entry))
-
-        if max_agents is not None:
-            agent_inputs = agent_inputs[:max_agents]
-
-        total = len(agent_inputs)
+        tally: StratifiedTally | None = None
+        # Stratum of each selected persona, for weighting sampled/preview runs
+        strata: dict[str, str] | None = None
+        if sampling is None and representatives is None:
+            personas = await self._resolve_agents(
+                processed_dir, max_agents, query, personas
+            )
+        else:
+            if sampling is not None and representatives is not None:
+                raise ValueError("Use either sampling or representatives, not both")
+            if representatives is not None and representatives < 1:
+                raise ValueError("representatives must be at least 1")
+            # Drawn from every matching persona, with max_agents capping the run
+            selected = await self._resolve_agents(processed_dir, None, query, personas)
+            if sampling is not None:
+                strata = {p.profile_id: stratum_of(p.entry) for p in selected}
+                personas = stratified_order(selected, sampling.seed)[:max_agents]
+            else:
+                registry = self._registry_for(processed_dir)
+                clusters = await asyncio.to_thread(
+                    load_clusters, registry.processed_dir
+                )
+                if clusters is None:
+                    raise ValueError(
+                        f"No {CLUSTERS_FILENAME} in {registry.processed_dir}; "
+                        "run convert_real_data.py with --clusters first"
+                    )
+                personas, strata = clusters.representatives(selected, representatives)
+                personas = personas[:max_agents]
+            population = Counter(strata.values())
+            if sampling is not None:
+                tally = StratifiedTally(population, sampling.confidence)
+        if live is not None:
+            live.expect(population if strata is not None else {"": len(personas)})
+        if on_dispatch is not None:
+            on_dispatch(personas)
+
+        finished: list[AgentResponse] = []
+        results = self._iter_indexed(
+            product_description,
+            personas,
+            on_chunk=on_chunk,
+            bypass_cache=bypass_cache,
+            refresh_cache=refresh_cache,
+            buffer_size=buffer_size or len(personas) or 1,
+            deadline=deadline,
+            agent_timeout=agent_timeout,
+            hedge=hedge,
+        )
+        async with aclosing(results):
+            async for idx, result in results:
+                if strata is not None:
+                    result.stratum = strata[personas[idx].profile_id]
+                if tally is not None and result.status == "ok":
+                    tally.add(result.stratum, result.sentiment)
+                if live is not None:
+                    live.add(result)
+                finished.append(result)
+                yield idx, result
+                if tally is not None and tally.converged(sampling):
+                    logger.info(
+                        "Sampling converged after %d of %d agents",
+                        tally.total,
+                        sum(tally.population.values()),
+                    )
+                    break
+
+        if strata is not None:
+            assign_weights(finished, population)
+
+    async def _iter_indexed(
+        self,
+        product_description: str,
+        personas: list[Persona],
+        on_chunk: Callable | None,
+        bypass_cache: bool,
+        refresh_cache: bool,
+        buffer_size: int,
+        deadline: float | None = None,
+        agent_timeout: float | None = None,
+        hedge: bool | None = None,
+    ) -> AsyncIterator[tuple[int, AgentResponse]]:
+        """Worker-pool engine behind iter_agents; yields (input index, response)."""
+        total = len(personas)
+        num_workers = max(1, min(self.limiter.max_limit, total))
+        inputs = iter(enumerate(personas))
+        results: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        stats = _RunStats()
+
         logger.info(
-            "Starting %d agents (model=%s, concurrency=%d)",
+            "Starting %d agents (model=%s, concurrency=%d, max=%d)",
             total,
             self.model,
-            self.semaphore._value,
+            self.limiter.limit,
+            self.limiter.max_limit,
         )
         start = time.monotonic()
-
-        async def run_with_callback(
-            pid: str, persona: str, entry: dict
-        ) -> AgentResponse:
-            result = await self.run_single_agent(
-                pid, persona, product_description, entry
-            )
-            if callback is not None:
-                await callback(result)
-            return result
-
-        tasks = [
-            run_with_callback(pid, persona, entry)
-            for pid, persona, entry in agent_inputs
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        # Convert any unexpected exceptions to error responses
-        responses: list[AgentResponse] = []
-        failures = 0
-        for i, r in enumerate(results):
-            if isinstance(r, AgentResponse):
-                responses.append(r)
-                if r.response_text.startswith("[Error:"):
-                    failures += 1
-            elif isinstance(r, Exception):
-                failures += 1
-                pid, _, entry = agent_inputs[i]
-                logger.error("Unexpected exception for agent %s: %s", pid, r)
-                responses.append(
-                    AgentResponse(
-                        agent_id=pid,
-                        profile_name=entry.get("display_name", pid[:12]),
-                        age=entry.get("age", 0),
-                        segment=(entry.get("segments") or ["unknown"])[0],
-                        response_text=f"[Error: {type(r).__name__}]",
+        deadline_at = start + deadline if deadline is not None else None
+
+        async def worker() -> None:
+            # The shared iterator hands each persona to exactly one worker
+            for idx, persona in inputs:
+                timeout = agent_timeout
+                if deadline_at is not None:
+                    remaining = deadline_at - time.monotonic()
+                    timeout = (
+                        remaining if timeout is None else min(timeout, remaining)
+                    )
+                if timeout is not None and timeout <= 0:
+                    # Past the test deadline: report without calling the API
+                    result = timed_out_response(persona.profile_id, persona.entry)
+                    await results.put((idx, result))
+                    continue
+                try:
+                    result = await self.run_single_agent(
+                        persona.profile_id,
+                        persona.text,
+                        product_description,
+                        persona.entry,
+                        bypass_cache=bypass_cache,
+                        refresh_cache=refresh_cache,
+                        on_chunk=on_chunk if self.streaming else None,
+                        timeout=timeout,
+                        hedge=hedge,
+                    )
+                except Exception as e:
+                    logger.error(
+                        "Unexpected exception for agent %s: %s", persona.profile_id, e
+                    )
+                    result = AgentResponse(
+                        response_text=f"[Error: {type(e).__name__}]",
                         sentiment="neutral",
                         response_time_ms=0,
+                        status="error",
+                        **_agent_fields(persona.profile_id, persona.entry),
                     )
-                )
+                await results.put((idx, result))
+            await results.put(_WORKER_DONE)
+
+        workers = [asyncio.create_task(worker()) for _ in range(num_workers)]
+        try:
+            running = num_workers
+            while running:
+                item = await results.get()
+                if item is _WORKER_DONE:
+                    running -= 1
+                    continue
+                stats.add(item[1])
+                yield item
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
 
         elapsed = time.monotonic() - start
         logger.info(
-            "Completed %d agents in %.1fs (avg %.0fms/agent, %d failures)",
-            total,
+            "Completed %d agents in %.1fs (avg %.0fms/agent, %d failures, "
+            "%d timed out, %d retries, final concurrency %d)",
+            stats.count,
             elapsed,
-            (elapsed / total * 1000) if total else 0,
-            failures,
+            (elapsed / stats.count * 1000) if stats.count else 0,
+            stats.failures,
+            stats.timed_out,
+            stats.retries,
+            self.limiter.limit,
         )
+        if self.prompt_caching:
+            logger.info(
+                "Prompt cache: %d tokens written, %d tokens read, %d uncached",
+                stats.cache_creation_input_tokens,
+                stats.cache_read_input_tokens,
+                stats.input_tokens,
+            )
+        if self.response_cache is not None:
+            logger.info(
+                "Response cache: %d of %d answers served from cache (%s)",
+                stats.cached,
+                stats.count,
+                self.response_cache.stats(),
+            )
+
+    async def run_all_agents(
+        self,
+        product_description: str,
+        processed_dir: str | None = None,
+        max_agents: int | None = None,
+        callback: Callable | None = None,
+        bypass_cache: bool = False,
+        refresh_cache: bool = False,
+        deadline: float | None = None,
+        agent_timeout: float | None = None,
+        hedge: bool | None = None,
+        query: SegmentQuery | None = None,
+        personas: Sequence[Persona] | None = None,
+        sampling: SamplingPlan | None = None,
+        representatives: int | None = None,
+        live: LiveAggregator | None = None,
+    ) -> list[AgentResponse]:
+        """Run all persona agents in parallel.
+
+        Args:
+            product_description: The product/change to evaluate.
+            processed_dir: Directory with persona .txt files and manifest.json
+                (None = the registry injected at construction).
+            max_agents: Limit number of agents (None = all).
+            callback: Called with each AgentResponse as it completes (for SSE
+                streaming). When the runner is in streaming mode it is also
+                called with AgentChunk partial-text events while agents type.
+            bypass_cache: Skip the response cache entirely for this run.
+            refresh_cache: Ignore cached answers but store the fresh ones.
+            deadline: Wall-clock budget in seconds for the whole run; agents
+                unfinished by then are reported with status "timed_out".
+            agent_timeout: Per-agent time limit in seconds.
+            hedge: Send duplicate requests for calls slower than the observed
+                p95 (None = the runner's ``hedging`` setting).
+            query: Only run the personas matching this segment/age/club filter.
+            personas: An already resolved subset (see select_agents) to run
+                instead of selecting from the registry.
+            sampling: Run a stratified sample and stop once the sentiment
+                split is known to the plan's precision; max_agents then caps
+                the sample size. In-flight agents are cancelled on stopping.
+            representatives: Preview mode: run only this many of the most
+                typical personas per cluster (clusters.json, see
+                persona_clusters), each weighted by its cluster's size.
+            live: Running tallies to update with each response as it
+                completes (before the callback sees it).
 
-        return responses
+        Returns:
+            List of all AgentResponse objects, in manifest order (sampling
+            order for sampled and preview runs, each with its stratum and
+            sample_weight).
+
+        Raises:
+            ValueError: If both sampling and representatives are given, or
+                representatives below 1 or without a clustering.
+        """
+        found: dict[int, AgentResponse] = {}
+        run = self._run(
+            product_description,
+            processed_dir,
+            max_agents,
+            callback,
+            bypass_cache,
+            refresh_cache,
+            None,
+            deadline,
+            agent_timeout,
+            hedge,
+            query,
+            personas,
+            sampling,
+            representatives,
+            live,
+        )
+        async with aclosing(run):
+            async for idx, result in run:
+                if callback is not None:
+                    await callback(result)
+                found[idx] = result
+        return [found[i] for i in sorted(found)]
+
+    async def run_batch(
+        self,
+        product_descriptions: list[str],
+        processed_dir: str | None = None,
+        max_agents: int | None = None,
+        callback: Callable | None = None,
+        query: SegmentQuery | None = None,
+        personas: Sequence[Persona] | None = None,
+    ) -> dict[str, list[AgentResponse]]:
+        """Evaluate every persona x product through the Message Batches API.
+
+        For offline runs: half the price of run_all_agents and no pressure on
+        the interactive rate limits, but results take minutes to hours.
+        Blocks until every batch has ended.
+
+        Args:
+            product_descriptions: Products/changes to evaluate.
+            processed_dir: Directory with persona .txt files and manifest.json
+                (None = the registry injected at construction).
+            max_agents: Limit number of agents per product (None = all).
+            callback: Called with each AgentResponse as results are read.
+            query: Only run the personas matching this segment/age/club filter.
+            personas: An already resolved subset (see select_agents) to run
+                instead of selecting from the registry.
+
+        Returns:
+            AgentResponses per product description.
+        """
+        personas = await self._resolve_agents(
+            processed_dir, max_agents, query, personas
+        )
+
+        requests: list[dict] = []
+        items: dict[str, list] = {}
+        for pi, product in enumerate(product_descriptions):
+            user_message = format_evaluation_prompt(product)
+            for ai, persona in enumerate(personas):
+                custom_id = f"p{pi}-a{ai}"
+                requests.append(
+                    {
+                        "custom_id": custom_id,
+                        "params": {
+                            "model": self.model,
+                            "max_tokens": AGENT_MAX_TOKENS,
+                            "system": self._system_prompt(persona.text),
+                            "messages": [{"role": "user", "content": user_message}],
+                        },
+                    }
+                )
+                items[custom_id] = [pi, persona.profile_id, persona.entry]
+
+        batch_ids = []
+        # Split by request count and by serialized size (persona prompts are
+        # several KB each, so the byte limit is usually hit first)
+        for chunk in split_requests(requests):
+            metadata = {
+                "products": product_descriptions,
+                "items": {r["custom_id"]: items[r["custom_id"]] for r in chunk},
+            }
+            batch_ids.append(await self.batch_runner.submit(chunk, metadata))
+
+        results: dict[str, list[AgentResponse]] = {
+            p: [] for p in product_descriptions
+        }
+        for batch_id in batch_ids:
+            for product, responses in (
+                await self._collect_batch(batch_id, callback)
+            ).items():
+                results[product].extend(responses)
+        return results
+
+    async def resume_batches(
+        self, callback: Callable | None = None
+    ) -> dict[str, list[AgentResponse]]:
+        """Finish batches whose results were never read (e.g. after a restart).
+
+        Returns:
+            AgentResponses per product description, across all resumed batches.
+        """
+        results: dict[str, list[AgentResponse]] = {}
+        for state in self.batch_runner.pending():
+            logger.info("Resuming batch %s", state["batch_id"])
+            collected = await self._collect_batch(state["batch_id"], callback)
+            for product, responses in collected.items():
+                results.setdefault(product, []).extend(responses)
+        return results
+
+    async def _collect_batch(
+        self, batch_id: str, callback: Callable | None
+    ) -> dict[str, list[AgentResponse]]:
+        batch_runner = self.batch_runner
+        await batch_runner.wait(batch_id)
+
+        state = batch_runner.load_state(batch_id)
+        products: list[str] = state["metadata"]["products"]
+        items: dict[str, list] = state["metadata"]["items"]
+        elapsed_ms = round((time.time() - state["submitted_at"]) * 1000, 1)
+
+        results: dict[str, list[AgentResponse]] = {p: [] for p in products}
+        async for entry in batch_runner.iter_results(batch_id):
+            if entry.custom_id not in items:
+                continue
+            pi, profile_id, manifest_entry = items[entry.custom_id]
+            fields = {
+                **_agent_fields(profile_id, manifest_entry),
+                "response_time_ms": elapsed_ms,
+            }
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                usage = message.usage
+                response_text = message.content[0].text
+                response = AgentResponse(
+                    response_text=response_text,
+                    sentiment=detect_sentiment(response_text),
+                    input_tokens=usage.input_tokens or 0,
+                    output_tokens=usage.output_tokens or 0,
+                    cache_creation_input_tokens=(
+                        usage.cache_creation_input_tokens or 0
+                    ),
+                    cache_read_input_tokens=usage.cache_read_input_tokens or 0,
+                    **fields,
+                )
+            else:
+                response = AgentResponse(
+                    response_text=f"[Error: batch_{entry.result.type}]",
+                    sentiment="neutral",
+                    status="error",
+                    **fields,
+                )
+
+            results[products[pi]].append(response)
+            if callback is not None:
+                await callback(response)
+
+        batch_runner.mark_completed(batch_id)
+        logger.info(
+            "Collected batch %s: %d results",
+            batch_id,
+            sum(len(r) for r in results.values()),
+        )
+        return results
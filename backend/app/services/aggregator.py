@@ -0,0 +1,962 @@
+import asyncio
+import logging
+import re
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable, Mapping, Sequence
+from dataclasses import dataclass
+
+import anthropic
+
+from app.models.schemas import (
+    AgentResponse,
+    InsightResults,
+    SegmentData,
+    SentimentBreakdown,
+    Theme,
+)
+from app.services.compaction import (
+    Quote,
+    collapse,
+    compact,
+    format_response,
+    quote_line,
+    quote_responses,
+    quote_tokens,
+    select,
+    trim,
+)
+from app.services.concurrency import (
+    backoff_delay,
+    is_retryable_error,
+    retry_after_seconds,
+)
+from app.services.prompt_manager import (
+    format_map_prompt,
+    format_merge_prompt,
+    format_reduce_prompt,
+    format_segment_prompt,
+    format_summary_prompt,
+    format_themes_prompt,
+)
+from app.services.rate_limiter import RateLimiter, estimate_tokens
+from app.services.sampling import sentiment_breakdown
+from app.services.themes import ThemeExtractor, describe
+
+logger = logging.getLogger(__name__)
+
+# The "4. Specific recommendation" point of a segment analysis
+_RECOMMENDATION = re.compile(r"^\W*4[.)]\s*(.*)$", re.MULTILINE | re.DOTALL)
+_HEADING = re.compile(r"^\**[\w ]*recommend[\w ]*\**:\**\s*", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class AggregationBudget:
+    """Token budgets for each level of the executive summary.
+
+    Crowds whose responses fit in ``direct_input_tokens`` are summarised in
+    one call. Larger ones are cut into chunks of at most
+    ``map_input_tokens`` and each chunk is turned into notes; the notes are
+    then merged in groups of at most ``reduce_input_tokens`` until a single
+    call can read them all. The ``*_output_tokens`` values are the
+    ``max_tokens`` of each kind of call.
+
+    Responses are compacted first (see compaction.compact); with
+    ``input_tokens``, only the most informative fitting in that many tokens
+    are read at all, across every chunk.
+    """
+
+    input_tokens: int | None = None
+    direct_input_tokens: int = 40_000
+    map_input_tokens: int = 8_000
+    map_output_tokens: int = 800
+    reduce_input_tokens: int = 16_000
+    reduce_output_tokens: int = 1_200
+    summary_output_tokens: int = 2_000
+
+
+@dataclass
+class Notes:
+    """An analyst's notes on a run of responses."""
+
+    text: str
+    customers: int
+    segments: list[str]
+
+
+def chunk_responses(
+    responses: Sequence[AgentResponse],
+    max_tokens: int,
+    lines: Sequence[str] | None = None,
+) -> list[list[int]]:
+    """Cut responses into chunks of at most ``max_tokens``, by segment.
+
+    Each segment's responses stay together and in order: a segment that
+    does not fit in what is left of the current chunk starts a new one, and
+    one too big for any chunk is split over as few chunks as possible. A
+    response larger than the budget gets a chunk of its own.
+
+    Args:
+        responses: The responses to split.
+        max_tokens: Estimated prompt tokens per chunk.
+        lines: The responses already run through format_response, if at hand.
+
+    Returns:
+        Each chunk as positions in ``responses``.
+    """
+    if lines is None:
+        lines = [format_response(r) for r in responses]
+    by_segment: dict[str, list[tuple[int, int]]] = {}
+    for i, (response, line) in enumerate(zip(responses, lines)):
+        cost = estimate_tokens(line) + 1
+        by_segment.setdefault(response.segment, []).append((i, cost))
+
+    chunks: list[list[int]] = []
+    current: list[int] = []
+    used = 0
+    for group in by_segment.values():
+        size = sum(cost for _, cost in group)
+        if current and used + size > max_tokens:
+            chunks.append(current)
+            current, used = [], 0
+        for i, cost in group:
+            if current and used + cost > max_tokens:
+                chunks.append(current)
+                current, used = [], 0
+            current.append(i)
+            used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_customers(
+    quotes: Sequence[Quote], kept: Sequence[Quote], chunks: list[list[int]]
+) -> list[int]:
+    """Customers each chunk of ``kept`` stands for.
+
+    Customers whose quote was left out (``quotes`` not in ``kept``) count
+    in the chunk of the nearest earlier kept quote of their segment (the
+    first kept one if none is earlier, the first chunk if none was kept).
+    """
+    chunk_of = {id(kept[i]): c for c, chunk in enumerate(chunks) for i in chunk}
+    customers = [0] * len(chunks)
+    last: dict[str, int] = {}
+    waiting: Counter = Counter()
+    for quote in quotes:
+        segment = quote.response.segment
+        c = chunk_of.get(id(quote))
+        if c is not None:
+            last[segment] = c
+            customers[c] += quote.count + waiting.pop(segment, 0)
+        elif segment in last:
+            customers[last[segment]] += quote.count
+        else:
+            waiting[segment] += quote.count
+    if customers:
+        customers[0] += sum(waiting.values())
+    return customers
+
+
+def notes_block(notes: Sequence[Notes]) -> str:
+    """Several batches' notes, each under a header saying whom it covers."""
+    return "\n\n".join(
+        f"--- Batch {i} ({n.customers} customers: {', '.join(n.segments)}) ---\n"
+        f"{n.text.strip()}"
+        for i, n in enumerate(notes, 1)
+    )
+
+
+def group_notes(notes: Sequence[Notes], max_tokens: int) -> list[list[Notes]]:
+    """Consecutive groups of notes of at most ``max_tokens`` each.
+
+    Every group but a trailing one holds at least two notes, even past the
+    budget, so each merge level shrinks the list.
+    """
+    groups: list[list[Notes]] = []
+    current: list[Notes] = []
+    used = 0
+    for note in notes:
+        cost = estimate_tokens(notes_block([note]))
+        if len(current) >= 2 and used + cost > max_tokens:
+            groups.append(current)
+            current, used = [], 0
+        current.append(note)
+        used += cost
+    if current:
+        groups.append(current)
+    return groups
+
+
+def sentiment_overview(breakdown: SentimentBreakdown, sample_size: int) -> str:
+    """The measured sentiment split as a line for the summary prompt."""
+    overview = (
+        f"{breakdown.positive_pct}% positive, {breakdown.neutral_pct}% neutral, "
+        f"{breakdown.negative_pct}% negative"
+    )
+    if sample_size < breakdown.population:
+        return (
+            f"{overview} (estimated for {breakdown.population} customers from "
+            f"a sample of {sample_size})"
+        )
+    return f"{overview} ({sample_size} customers)"
+
+
+def segment_sentiment(responses: Sequence[AgentResponse]) -> str:
+    """positive or negative when at least half the segment says so, else mixed."""
+    counts = Counter(r.sentiment for r in responses)
+    for label in ("positive", "negative"):
+        if responses and 2 * counts[label] >= len(responses):
+            return label
+    return "mixed"
+
+
+def recommendation(analysis: str) -> str:
+    """The recommendation point of a segment analysis, or ""."""
+    match = _RECOMMENDATION.search(analysis)
+    if not match:
+        return ""
+    # Drop a heading such as "**Recommendation**:"
+    return _HEADING.sub("", match.group(1).strip())
+
+
+def _unique(items: Sequence[str]) -> list[str]:
+    return list(dict.fromkeys(items))
+
+
+async def _value(value: object) -> object:
+    return value
+
+
+async def _gather(aws: Sequence[Awaitable]) -> list:
+    """Like asyncio.gather, but one failure cancels the rest."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+class InsightAggregator:
+    """Synthesises a finished run's responses into InsightResults.
+
+    The executive summary is a hierarchical map-reduce: chunks of responses
+    are summarised in parallel with the cheaper ``map_model``, and the notes
+    are merged level by level with ``reduce_model`` into the final summary.
+    Each level is one round of parallel calls over a bounded input, so the
+    time taken grows with the logarithm of the crowd size rather than with
+    the size of one ever-larger prompt.
+
+    Key themes are extracted locally (see themes.ThemeExtractor); with
+    ``polish_themes`` the ``map_model`` rewords the top ones, reading only
+    the themes rather than every response.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        map_model: str = "claude-sonnet-4-20250514",
+        reduce_model: str = "claude-opus-4-20250514",
+        budget: AggregationBudget | None = None,
+        max_concurrent: int = 32,
+        max_retries: int = 4,
+        retry_base_delay: float = 1.0,
+        rate_limiter: RateLimiter | None = None,
+        theme_count: int = 6,
+        polish_themes: bool = False,
+    ) -> None:
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
+        self.map_model = map_model
+        self.reduce_model = reduce_model
+        self.budget = budget or AggregationBudget()
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.rate_limiter = rate_limiter
+        self.theme_count = theme_count
+        self.polish_themes = polish_themes
+
+    async def _complete(
+        self, model: str, prompt: str, max_tokens: int, slots: asyncio.Semaphore
+    ) -> str:
+        """One Messages API call, retried with backoff on transient errors."""
+        estimated_input_tokens = estimate_tokens(prompt)
+        attempts = 0
+        while True:
+            reservation = None
+            if self.rate_limiter is not None:
+                reservation = await self.rate_limiter.acquire(
+                    estimated_input_tokens, max_tokens
+                )
+            async with slots:
+                try:
+                    message = await self.client.messages.create(
+                        model=model,
+                        max_tokens=max_tokens,
+                        messages=[{"role": "user", "content": prompt}],
+                    )
+                except Exception as e:
+                    if reservation is not None:
+                        self.rate_limiter.reconcile(reservation, 0, 0)
+                    attempts += 1
+                    if not is_retryable_error(e) or attempts > self.max_retries:
+                        raise
+                    retry_after = retry_after_seconds(e)
+                else:
+                    if reservation is not None:
+                        self.rate_limiter.reconcile(
+                            reservation,
+                            message.usage.input_tokens or 0,
+                            message.usage.output_tokens or 0,
+                        )
+                    return message.content[0].text
+            await asyncio.sleep(
+                backoff_delay(
+                    attempts, base=self.retry_base_delay, retry_after=retry_after
+                )
+            )
+
+    async def map_notes(
+        self,
+        chunk: Sequence[Quote],
+        product_description: str,
+        total_agents: int,
+        slots: asyncio.Semaphore,
+        customers: int | None = None,
+    ) -> Notes:
+        """Notes on one chunk of quotes (the map step of the summary).
+
+        ``customers`` is how many responses the chunk stands for, if more
+        than its quotes count (some were left out to fit the budget).
+        """
+        if customers is None:
+            customers = sum(q.count for q in chunk)
+        prompt = format_map_prompt(
+            product_description,
+            total_agents,
+            customers,
+            "\n".join(quote_line(q) for q in chunk),
+        )
+        text = await self._complete(
+            self.map_model, prompt, self.budget.map_output_tokens, slots
+        )
+        return Notes(text, customers, _unique([q.response.segment for q in chunk]))
+
+    async def merge_notes(
+        self, group: list[Notes], product_description: str, slots: asyncio.Semaphore
+    ) -> Notes:
+        """Several notes combined into one (a reduce step of the summary)."""
+        if len(group) == 1:
+            return group[0]
+        customers = sum(n.customers for n in group)
+        prompt = format_merge_prompt(
+            product_description, customers, len(group), notes_block(group)
+        )
+        text = await self._complete(
+            self.reduce_model, prompt, self.budget.reduce_output_tokens, slots
+        )
+        return Notes(text, customers, _unique([s for n in group for s in n.segments]))
+
+    async def reduce_notes(
+        self,
+        notes: list[Notes],
+        product_description: str,
+        total_agents: int,
+        overview: str,
+        slots: asyncio.Semaphore,
+    ) -> str:
+        """Merge notes level by level until one call can read them, then
+        write the executive summary from them.
+
+        Args:
+            notes: Map notes, in the order of the responses they cover.
+            product_description: The product/change that was tested.
+            total_agents: Customers the run stands for.
+            overview: The measured sentiment, from sentiment_overview.
+            slots: Bounds the calls made in parallel.
+        """
+        budget = self.budget
+        level = 1
+        while (
+            len(notes) > 1
+            and estimate_tokens(notes_block(notes)) > budget.reduce_input_tokens
+        ):
+            start = time.monotonic()
+            groups = group_notes(notes, budget.reduce_input_tokens)
+            notes = await _gather(
+                [self.merge_notes(g, product_description, slots) for g in groups]
+            )
+            logger.info(
+                "Merge level %d: %d notes (%.1fs)",
+                level,
+                len(notes),
+                time.monotonic() - start,
+            )
+            level += 1
+
+        prompt = format_reduce_prompt(
+            product_description, total_agents, overview, notes_block(notes)
+        )
+        return await self._complete(
+            self.reduce_model, prompt, budget.summary_output_tokens, slots
+        )
+
+    async def generate_executive_summary(
+        self,
+        responses: Sequence[AgentResponse],
+        product_description: str,
+        slots: asyncio.Semaphore | None = None,
+    ) -> str:
+        """Markdown executive summary of every response.
+
+        Args:
+            responses: The responses to summarise.
+            product_description: The product/change that was tested.
+            slots: Bounds the calls made in parallel, if shared with other
+                work; ``max_concurrent`` calls otherwise.
+
+        Returns:
+            The summary, or "" when there are no responses.
+        """
+        if not responses:
+            return ""
+        budget = self.budget
+        if slots is None:
+            slots = asyncio.Semaphore(self.max_concurrent)
+        breakdown = sentiment_breakdown(responses)
+        total_agents = breakdown.population or len(responses)
+
+        quotes = await asyncio.to_thread(collapse, quote_responses(responses))
+        kept = quotes
+        if budget.input_tokens is not None:
+            kept = select(quotes, budget.input_tokens)
+        lines = [quote_line(q) for q in kept]
+        if estimate_tokens("\n".join(lines)) <= budget.direct_input_tokens:
+            prompt = format_summary_prompt(
+                product_description, total_agents, "\n".join(lines)
+            )
+            return await self._complete(
+                self.reduce_model, prompt, budget.summary_output_tokens, slots
+            )
+
+        start = time.monotonic()
+        chunks = chunk_responses(
+            [q.response for q in kept], budget.map_input_tokens, lines
+        )
+        customers = chunk_customers(quotes, kept, chunks)
+        notes = await _gather(
+            [
+                self.map_notes(
+                    [kept[i] for i in chunk],
+                    product_description,
+                    total_agents,
+                    slots,
+                    count,
+                )
+                for chunk, count in zip(chunks, customers)
+            ]
+        )
+        logger.info(
+            "Summarised %d responses in %d chunks (%.1fs)",
+            len(responses),
+            len(chunks),
+            time.monotonic() - start,
+        )
+        return await self.reduce_notes(
+            notes,
+            product_description,
+            total_agents,
+            sentiment_overview(breakdown, len(responses)),
+            slots,
+        )
+
+    async def analyze_segment(
+        self,
+        segment: str,
+        responses: Sequence[AgentResponse],
+        product_description: str,
+        quotes: Sequence[str] = (),
+        slots: asyncio.Semaphore | None = None,
+    ) -> SegmentData:
+        """How one segment reacted, from the segment_analysis prompt.
+
+        The responses are compacted to ``budget.reduce_input_tokens``; the
+        segment's count and sentiment still cover those left out.
+
+        Args:
+            segment: The segment's name.
+            responses: The segment's answered responses.
+            product_description: The product/change that was tested.
+            quotes: Quotes to report for the segment (e.g. its themes').
+            slots: Bounds the calls made in parallel, if shared.
+        """
+        if slots is None:
+            slots = asyncio.Semaphore(self.max_concurrent)
+        kept = await asyncio.to_thread(
+            compact, responses, self.budget.reduce_input_tokens
+        )
+        prompt = format_segment_prompt(
+            product_description,
+            segment,
+            len(responses),
+            "\n".join(quote_line(q) for q in kept),
+        )
+        text = await self._complete(
+            self.reduce_model, prompt, self.budget.reduce_output_tokens, slots
+        )
+        return SegmentData(
+            segment_name=segment,
+            count=len(responses),
+            sentiment=segment_sentiment(responses),
+            summary=text.strip(),
+            key_quotes=list(quotes[:3]),
+            recommendation=recommendation(text),
+        )
+
+    async def reword_themes(
+        self, themes: Sequence[Theme], product_description: str, total_agents: int
+    ) -> list[str]:
+        """Key themes reworded by the ``map_model``.
+
+        Returns:
+            One line per theme; the local descriptions if the model's answer
+            has no bullet lines.
+        """
+        if not themes:
+            return []
+        lines = []
+        for theme in themes:
+            phrases = ", ".join(theme.keyphrases)
+            lines.append(
+                f"- {phrases} ({theme.count} customers; {theme.positive} positive, "
+                f'{theme.neutral} neutral, {theme.negative} negative): "{theme.quote}"'
+            )
+        prompt = format_themes_prompt(
+            product_description, total_agents, "\n".join(lines)
+        )
+        text = await self._complete(
+            self.map_model,
+            prompt,
+            self.budget.map_output_tokens,
+            asyncio.Semaphore(1),
+        )
+        reworded = [
+            line.strip()[2:].strip()
+            for line in text.splitlines()
+            if line.strip().startswith("- ")
+        ]
+        return reworded or [describe(t) for t in themes]
+
+    async def key_themes(
+        self,
+        extractor: ThemeExtractor,
+        product_description: str,
+        total_agents: int,
+    ) -> tuple[list[Theme], list[str]]:
+        """The extractor's top themes and their one-line descriptions.
+
+        The themes are found in a worker thread, so ``extractor`` must not
+        take more responses meanwhile (see ThemeExtractor.snapshot).
+        """
+        themes = await asyncio.to_thread(extractor.themes, self.theme_count)
+        if not self.polish_themes:
+            return themes, [describe(t) for t in themes]
+        return themes, await self.reword_themes(
+            themes, product_description, total_agents
+        )
+
+    async def aggregate_all(
+        self,
+        responses: Sequence[AgentResponse],
+        product_description: str,
+        breakdown: SentimentBreakdown | None = None,
+    ) -> InsightResults:
+        """Insights for a finished run, with nothing started beforehand.
+
+        Runs started through the API feed an AggregationScheduler as agents
+        answer instead; this is the same work done all at once.
+
+        Args:
+            responses: Every response of the run.
+            product_description: The product/change that was tested.
+            breakdown: The run's sentiment split if already tallied (e.g. the
+                final LiveAggregator snapshot); computed here otherwise.
+        """
+        scheduler = AggregationScheduler(
+            self, product_description, Counter(r.segment for r in responses)
+        )
+        for response in responses:
+            scheduler.add(response)
+        return await scheduler.finish(breakdown)
+
+
+class AggregationScheduler:
+    """A test's aggregation, started while its agents are still answering.
+
+    Fed each response as it arrives (``add``), it starts work as soon as
+    the work's inputs are complete rather than after the last agent:
+
+    - a segment's analysis starts once every persona of the segment
+      (``expected``, by primary segment) has answered;
+    - once the responses outgrow a single summary call, each segment's
+      responses are mapped into notes a chunk at a time as they arrive
+      (near-duplicates collapsed, and thinned to the budget's share of
+      ``input_tokens``, see compaction), and
+      the notes are merged as soon as there are enough to fill a merge, so
+      only the last chunk or two is left to map at the end, then the reduce;
+    - with ``draft_at``, a draft summary is written once that fraction of
+      the expected responses is in (from the notes written so far, for a
+      map-reduced crowd) and handed to ``on_draft`` together with whatever
+      else is ready, unless the final results are ready first.
+
+    ``finish`` then maps what is left and reduces, and collects the segment
+    analyses and themes. Everything shares one budget of
+    ``aggregator.max_concurrent`` calls. Segments of a sampled run, whose
+    expected count is never reached, are analysed at ``finish``.
+    """
+
+    def __init__(
+        self,
+        aggregator: InsightAggregator,
+        product_description: str,
+        expected: Mapping[str, int],
+        draft_at: float | None = None,
+        on_draft: Callable[[InsightResults], Awaitable[None]] | None = None,
+    ) -> None:
+        self.aggregator = aggregator
+        self.product_description = product_description
+        self.expect(expected)
+        self.draft_at = draft_at
+        self.on_draft = on_draft
+        self.themes = ThemeExtractor()
+        self.responses: list[AgentResponse] = []
+        self.draft: InsightResults | None = None
+        self.slots = asyncio.Semaphore(aggregator.max_concurrent)
+        self._finished: Counter = Counter()
+        self._answered: dict[str, list[AgentResponse]] = {}
+        self._segments: dict[str, asyncio.Task] = {}
+        # Answered responses not yet mapped, per segment, with their cost
+        self._unmapped: dict[str, list[tuple[Quote, int]]] = {}
+        self._unmapped_tokens: Counter = Counter()
+        self._tokens = 0
+        self._answered_count = 0
+        self._mapping = False
+        # Share of a buffer's tokens left once near-duplicates are collapsed,
+        # as of the last full chunk mapped
+        self._collapsed = 1.0
+        # Map and merge calls in flight, each with the number of the oldest
+        # chunk it covers; finished notes waiting to be merged, likewise
+        self._pending: dict[asyncio.Task, int] = {}
+        self._notes: list[tuple[int, Notes]] = []
+        self._merging: dict[asyncio.Task, list[tuple[int, Notes]]] = {}
+        self._notes_tokens = 0
+        self._chunks = 0
+        self._failures: list[BaseException] = []
+        self._draft_task: asyncio.Task | None = None
+        self._draft_covers = 0
+        self._last_response = time.monotonic()
+
+    def expect(self, expected: Mapping[str, int]) -> None:
+        """Set how many agents of each primary segment will answer, e.g.
+        once the run has chosen whom to dispatch; call before ``add``."""
+        self.expected = dict(expected)
+        self.total = sum(self.expected.values())
+
+    def add(self, response: AgentResponse, tags: Sequence[str] = ()) -> None:
+        """Take in one finished agent; must be called from the event loop.
+
+        Args:
+            response: The agent's response.
+            tags: The persona's segments from the manifest, for themes.
+        """
+        self.responses.append(response)
+        self._last_response = time.monotonic()
+        self.themes.add(response, tags)
+        segment = response.segment
+        if response.status == "ok":
+            self._answered.setdefault(segment, []).append(response)
+            self._buffer(response)
+
+        self._finished[segment] += 1
+        if self._finished[segment] == self.expected.get(segment):
+            self._start_segment(segment)
+            if self._mapping:
+                self._map(segment)
+        if (
+            self.draft_at
+            and self.total
+            and self._draft_task is None
+            and len(self.responses) >= self.draft_at * self.total
+        ):
+            self._draft_task = asyncio.create_task(self._write_draft())
+
+    def _buffer(self, response: AgentResponse) -> None:
+        """Queue an answered response for the summary, mapping its segment's
+        queue once collapsing and thinning it would about fill a chunk."""
+        budget = self.aggregator.budget
+        segment = response.segment
+        quote = Quote(response, trim(response.response_text))
+        cost = quote_tokens(quote)
+        self._tokens += cost
+        self._answered_count += 1
+        if self._mapping and self._unmapped_tokens[segment] + cost > (
+            budget.map_input_tokens / (self._collapsed * self._kept())
+        ):
+            self._map(segment)
+        self._unmapped.setdefault(segment, []).append((quote, cost))
+        self._unmapped_tokens[segment] += cost
+        if not self._mapping and self._tokens > budget.direct_input_tokens:
+            # Too many for one call: the summary will be map-reduced
+            self._mapping = True
+            for name in list(self._unmapped):
+                self._map(name, full_only=True)
+
+    def _kept(self) -> float:
+        """Share of the collapsed quotes the maps can read within
+        ``budget.input_tokens``, projected from the responses so far."""
+        cap = self.aggregator.budget.input_tokens
+        if cap is None or not self._answered_count:
+            return 1.0
+        projected = self._tokens / self._answered_count * self._collapsed
+        return min(1.0, cap / (projected * max(self.total, self._answered_count)))
+
+    def _map(self, segment: str, full_only: bool = False) -> None:
+        """Start mapping a segment's unmapped responses into notes.
+
+        Near-duplicates are collapsed first and, under ``input_tokens``,
+        only the most informative quotes kept. With ``full_only``, a last
+        chunk short of the budget is kept back (unthinned) for more
+        responses to join.
+        """
+        unmapped = self._unmapped.pop(segment, [])
+        self._unmapped_tokens[segment] = 0
+        if not unmapped:
+            return
+        budget = self.aggregator.budget
+        buffered = sum(cost for _, cost in unmapped)
+        quotes = collapse([quote for quote, _ in unmapped])
+        costs = [quote_tokens(q) for q in quotes]
+        if buffered >= budget.map_input_tokens:
+            self._collapsed = sum(costs) / buffered
+        kept, share = quotes, self._kept()
+        if not full_only and share < 1:
+            kept = select(quotes, int(sum(costs) * share))
+        lines = [quote_line(q) for q in kept]
+        chunks = chunk_responses(
+            [q.response for q in kept], budget.map_input_tokens, lines
+        )
+        customers = chunk_customers(quotes, kept, chunks)
+        if full_only:
+            held = [(kept[i], quote_tokens(kept[i])) for i in chunks.pop()]
+            self._unmapped[segment] = held
+            self._unmapped_tokens[segment] = sum(cost for _, cost in held)
+        for chunk, count in zip(chunks, customers):
+            self._start_notes(
+                self.aggregator.map_notes(
+                    [kept[i] for i in chunk],
+                    self.product_description,
+                    self.total,
+                    self.slots,
+                    count,
+                ),
+                self._chunks,
+            )
+            self._chunks += 1
+
+    def _start_notes(self, notes: Awaitable[Notes], oldest: int) -> asyncio.Task:
+        task = asyncio.create_task(notes)
+        self._pending[task] = oldest
+        task.add_done_callback(self._collect)
+        return task
+
+    def _collect(self, task: asyncio.Task) -> None:
+        """Pool finished notes, merging them once a merge's worth is in."""
+        oldest = self._pending.pop(task)
+        self._merging.pop(task, None)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self._failures.append(task.exception())
+            return
+        note = task.result()
+        cost = estimate_tokens(notes_block([note]))
+        if (
+            len(self._notes) >= 2
+            and self._notes_tokens + cost > self.aggregator.budget.reduce_input_tokens
+        ):
+            group = self._notes
+            self._notes, self._notes_tokens = [], 0
+            merge = self._start_notes(
+                self.aggregator.merge_notes(
+                    [n for _, n in group], self.product_description, self.slots
+                ),
+                min(n for n, _ in group),
+            )
+            self._merging[merge] = group
+        self._notes.append((oldest, note))
+        self._notes_tokens += cost
+
+    def _start_segment(self, segment: str) -> None:
+        if segment in self._segments or not self._answered.get(segment):
+            return
+        quotes = [t.quote for t in self.themes.segment_themes(segment)]
+        self._segments[segment] = asyncio.create_task(
+            self.aggregator.analyze_segment(
+                segment,
+                list(self._answered[segment]),
+                self.product_description,
+                quotes,
+                self.slots,
+            )
+        )
+
+    async def _summary(
+        self, breakdown: SentimentBreakdown, wait: bool = True
+    ) -> tuple[str, int]:
+        """Executive summary of the responses so far.
+
+        Args:
+            breakdown: The sentiment split of the responses so far.
+            wait: Map every response and wait for the notes. Without it, a
+                crowd being map-reduced is summarised from the notes already
+                written (merges in flight are read from their inputs).
+
+        Returns:
+            The summary and the number of answered responses it covers.
+        """
+        responses = list(self.responses)
+        if not self._mapping:
+            answered = self._answered_count
+            summary = await self.aggregator.generate_executive_summary(
+                responses, self.product_description, self.slots
+            )
+            return summary, answered
+        if wait:
+            for segment in list(self._unmapped):
+                self._map(segment)
+            # Wait for the notes on every chunk so far, including merges of
+            # them that start meanwhile. Unlike gather, wait leaves the calls
+            # running if this is cancelled: a draft and the final share them.
+            covered = self._chunks
+            while older := [t for t, n in self._pending.items() if n < covered]:
+                await asyncio.wait(older)
+            if self._failures:
+                raise self._failures[0]
+            pooled = self._notes
+        else:
+            pooled = self._notes + [n for g in self._merging.values() for n in g]
+        notes = [note for _, note in sorted(pooled, key=lambda n: n[0])]
+        if not notes:
+            return "", 0
+        summary = await self.aggregator.reduce_notes(
+            notes,
+            self.product_description,
+            breakdown.population or len(responses),
+            sentiment_overview(breakdown, len(responses)),
+            self.slots,
+        )
+        return summary, sum(n.customers for n in notes)
+
+    def _results(
+        self,
+        summary: str,
+        breakdown: SentimentBreakdown,
+        themes: list[Theme],
+        key_themes: list[str],
+        segment_themes: dict[str, list[Theme]],
+        draft: bool = False,
+    ) -> InsightResults:
+        segments = [
+            task.result()
+            for task in self._segments.values()
+            if task.done() and not task.cancelled() and task.exception() is None
+        ]
+        answered = sum(r.status == "ok" for r in self.responses)
+        total = len(self.responses)
+        return InsightResults(
+            executive_summary=summary,
+            sentiment_breakdown=breakdown,
+            segments=sorted(segments, key=lambda s: -s.count),
+            key_themes=key_themes,
+            themes=themes,
+            segment_themes=segment_themes,
+            total_agents=total,
+            response_rate=round(answered / total, 4) if total else 0.0,
+            draft=draft,
+        )
+
+    async def _write_draft(self) -> None:
+        breakdown = sentiment_breakdown(self.responses)
+        try:
+            summary, covered = await self._summary(breakdown, wait=False)
+        except Exception:
+            logger.warning("Draft summary failed", exc_info=True)
+            return
+        if not covered:
+            return
+        extractor = self.themes.snapshot()
+        themes = await asyncio.to_thread(extractor.themes, self.aggregator.theme_count)
+        self.draft = self._results(
+            summary,
+            breakdown,
+            themes,
+            [describe(t) for t in themes],
+            await asyncio.to_thread(extractor.all_segment_themes),
+            draft=True,
+        )
+        self._draft_covers = covered
+        logger.info("Draft summary of %d/%d responses ready", covered, self.total)
+        if self.on_draft is not None:
+            await self.on_draft(self.draft)
+
+    async def finish(
+        self, breakdown: SentimentBreakdown | None = None
+    ) -> InsightResults:
+        """The final insights, once every agent has finished.
+
+        A draft that already covers every response is reused. One still
+        being written carries on, and is published if it is done first.
+
+        Args:
+            breakdown: The run's sentiment split if already tallied;
+                computed here otherwise.
+        """
+        if breakdown is None:
+            breakdown = sentiment_breakdown(self.responses)
+        for segment in self._answered:
+            self._start_segment(segment)
+        if self.draft is not None and self._draft_covers == self._answered_count:
+            summary: Awaitable = _value((self.draft.executive_summary, 0))
+        else:
+            summary = self._summary(breakdown)
+        extractor = self.themes.snapshot()
+        (summary_text, _), (themes, key_themes), segment_themes, *_ = await _gather(
+            [
+                summary,
+                self.aggregator.key_themes(
+                    extractor,
+                    self.product_description,
+                    breakdown.population or len(self.responses),
+                ),
+                asyncio.to_thread(extractor.all_segment_themes),
+                *self._segments.values(),
+            ]
+        )
+        if self._draft_task is not None:
+            # Too late to be of use
+            self._draft_task.cancel()
+        logger.info(
+            "Insights ready %.1fs after the last response",
+            time.monotonic() - self._last_response,
+        )
+        return self._results(
+            summary_text, breakdown, themes, key_themes, segment_themes
+        )
+
+    def cancel(self) -> None:
+        """Abandon all work in flight (the run failed or was cancelled)."""
+        tasks = [*self._segments.values(), *self._pending, self._draft_task]
+        for task in tasks:
+            if task is not None:
+                task.cancel()
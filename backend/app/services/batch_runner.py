@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+from app.services.concurrency import (
+    backoff_delay,
+    is_retryable_error,
+    retry_after_seconds,
+)
+
+logger = logging.getLogger(__name__)
+
+# Message Batches API limits on requests and bytes per batch; the byte
+# budget leaves room for the request envelope
+MAX_BATCH_REQUESTS = 100_000
+MAX_BATCH_BYTES = 256 * 1024 * 1024 - 64 * 1024
+
+
+def request_bytes(request: dict) -> int:
+    """Serialized size of one batch request, with its separating comma."""
+    return len(json.dumps(request, ensure_ascii=False).encode()) + 1
+
+
+def split_requests(
+    requests: list[dict],
+    max_requests: int = MAX_BATCH_REQUESTS,
+    max_bytes: int = MAX_BATCH_BYTES,
+) -> list[list[dict]]:
+    """Cut requests into batches within both the count and the size limit.
+
+    Requests keep their order; a batch is closed as soon as the next
+    request would take it over either limit.
+    """
+    batches: list[list[dict]] = []
+    current: list[dict] = []
+    size = 0
+    for request in requests:
+        cost = request_bytes(request)
+        if current and (len(current) >= max_requests or size + cost > max_bytes):
+            batches.append(current)
+            current, size = [], 0
+        current.append(request)
+        size += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+class BatchRunner:
+    """Submits requests through the Message Batches API and tracks them.
+
+    Every submitted batch gets a small JSON state file in ``state_dir``
+    holding the batch id and caller metadata, so polling can resume after a
+    process restart. A batch is marked completed once its results have been
+    fully read.
+
+    The client is the interactive one, which does not retry, so every API
+    call here retries transient errors (overload, 5xx, dropped connections)
+    itself: one hiccup during hours of polling must not fail the batch.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        state_dir: str = "data/batches",
+        poll_interval: float = 5.0,
+        max_poll_interval: float = 60.0,
+        max_retries: int = 8,
+        retry_base_delay: float = 1.0,
+    ) -> None:
+        self.client = client
+        self.state_dir = Path(state_dir)
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+
+    async def submit(self, requests: list[dict], metadata: dict) -> str:
+        """Create a batch and persist its state. Returns the batch id.
+
+        Each request is ``{"custom_id": ..., "params": {...messages.create kwargs}}``.
+        """
+        if len(requests) > MAX_BATCH_REQUESTS:
+            raise ValueError(
+                f"{len(requests)} requests exceed the batch limit of "
+                f"{MAX_BATCH_REQUESTS}; split them across batches"
+            )
+        size = sum(request_bytes(r) for r in requests)
+        if size > MAX_BATCH_BYTES:
+            raise ValueError(
+                f"{size} bytes of requests exceed the batch limit of "
+                f"{MAX_BATCH_BYTES}; split them across batches"
+            )
+        batch = await self._call(
+            "Creating a batch", self.client.messages.batches.create, requests=requests
+        )
+        self._write_state(
+            {
+                "batch_id": batch.id,
+                "submitted_at": time.time(),
+                "completed": False,
+                "metadata": metadata,
+            }
+        )
+        logger.info("Submitted batch %s (%d requests)", batch.id, len(requests))
+        return batch.id
+
+    def load_state(self, batch_id: str) -> dict:
+        with open(self._state_path(batch_id)) as f:
+            return json.load(f)
+
+    def pending(self) -> list[dict]:
+        """State of every submitted batch whose results were not yet read."""
+        if not self.state_dir.exists():
+            return []
+        states = []
+        for path in sorted(self.state_dir.glob("*.json")):
+            with open(path) as f:
+                state = json.load(f)
+            if not state.get("completed"):
+                states.append(state)
+        return states
+
+    async def wait(self, batch_id: str) -> None:
+        """Poll until the batch has ended, backing off between polls."""
+        interval = self.poll_interval
+        while True:
+            batch = await self._call(
+                f"Polling batch {batch_id}",
+                self.client.messages.batches.retrieve,
+                batch_id,
+            )
+            if batch.processing_status == "ended":
+                return
+            logger.info(
+                "Batch %s %s (%s); next poll in %.0fs",
+                batch_id,
+                batch.processing_status,
+                batch.request_counts,
+                interval,
+            )
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, self.max_poll_interval)
+
+    async def iter_results(self, batch_id: str) -> AsyncIterator[Any]:
+        """Yield each result (``custom_id`` + ``result``) of an ended batch.
+
+        A download cut short is started again, skipping the results already
+        yielded.
+        """
+        yielded = 0
+        failures = 0
+        while True:
+            try:
+                results = await self._call(
+                    f"Reading batch {batch_id}",
+                    self.client.messages.batches.results,
+                    batch_id,
+                )
+                seen = 0
+                async for entry in results:
+                    seen += 1
+                    if seen > yielded:
+                        yielded += 1
+                        yield entry
+                return
+            except Exception as exc:
+                failures += 1
+                if not is_retryable_error(exc) or failures > self.max_retries:
+                    raise
+                await self._back_off(f"Reading batch {batch_id}", exc, failures)
+
+    async def _call(self, what: str, method: Any, *args: Any, **kwargs: Any) -> Any:
+        """Await ``method``, retrying transient errors with backoff."""
+        attempt = 0
+        while True:
+            try:
+                return await method(*args, **kwargs)
+            except Exception as exc:
+                attempt += 1
+                if not is_retryable_error(exc) or attempt > self.max_retries:
+                    raise
+                await self._back_off(what, exc, attempt)
+
+    async def _back_off(self, what: str, exc: Exception, attempt: int) -> None:
+        delay = backoff_delay(
+            attempt, self.retry_base_delay, retry_after=retry_after_seconds(exc)
+        )
+        logger.warning(
+            "%s failed (%s), retrying in %.1fs", what, type(exc).__name__, delay
+        )
+        await asyncio.sleep(delay)
+
+    def mark_completed(self, batch_id: str) -> None:
+        state = self.load_state(batch_id)
+        state["completed"] = True
+        self._write_state(state)
+
+    def _state_path(self, batch_id: str) -> Path:
+        return self.state_dir / f"{batch_id}.json"
+
+    def _write_state(self, state: dict) -> None:
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._state_path(state["batch_id"])
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
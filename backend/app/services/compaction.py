@@ -0,0 +1,238 @@
+import math
+import re
+import zlib
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.models.schemas import AgentResponse
+from app.services.rate_limiter import estimate_tokens
+from app.services.themes import STOPWORDS
+
+# Interjections and hedges agents open with; they carry nothing for analysis
+_FILLER = re.compile(
+    r"^(?:(?:honestly|well|so|okay|ok|oh|ooh|hmm+|um+|uh+|look|yeah|wow|right"
+    r"|to be honest|to be fair|i have to say|i must say|i'll be honest"
+    r"|i'?m not gonna lie)\b[\s,.!:;—–-]*)+",
+    re.IGNORECASE,
+)
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9']*")
+_SHINGLE = 3
+_PERMUTATIONS = 64
+_BANDS = 16  # of 4 rows: pairs about 0.5 alike or more become candidates
+
+
+@dataclass
+class Quote:
+    """A response as it goes into an aggregation prompt.
+
+    ``text`` is the response without its filler opener and ``count`` the
+    number of responses it stands for, near-duplicates included.
+    """
+
+    response: AgentResponse
+    text: str
+    count: int = 1
+
+
+def trim(text: str) -> str:
+    """A response's text with whitespace collapsed and filler openers cut."""
+    text = " ".join(text.split())
+    trimmed = _FILLER.sub("", text)
+    if not trimmed:
+        return text
+    return trimmed[0].upper() + trimmed[1:]
+
+
+def format_response(
+    response: AgentResponse, count: int = 1, text: str | None = None
+) -> str:
+    """One response as a prompt line: segment, age and sentiment, then text.
+
+    Args:
+        response: The response.
+        count: Responses the line stands for (shown when more than one).
+        text: The text to show instead of the response's own.
+    """
+    text = " ".join((response.response_text if text is None else text).split())
+    tags = f"{response.segment}, {response.age}, {response.sentiment}"
+    if count > 1:
+        tags += f", said by {count}"
+    return f"[{tags}] {text}"
+
+
+def quote_line(quote: Quote) -> str:
+    """A quote as a prompt line (see format_response)."""
+    return format_response(quote.response, quote.count, quote.text)
+
+
+def quote_tokens(quote: Quote) -> int:
+    """Estimated prompt tokens of a quote's line, newline included."""
+    return estimate_tokens(quote_line(quote)) + 1
+
+
+def quote_responses(responses: Iterable[AgentResponse]) -> list[Quote]:
+    """A quote per answered response; failed agents (whose text is an
+    "[Error: ...]" placeholder) are dropped."""
+    return [Quote(r, trim(r.response_text)) for r in responses if r.status == "ok"]
+
+
+def _shingles(text: str) -> set[str]:
+    words = _TOKEN.findall(text.lower())
+    if len(words) <= _SHINGLE:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + _SHINGLE]) for i in range(len(words) - _SHINGLE + 1)}
+
+
+def _signatures(texts: Sequence[str], seed: int, block: int = 500) -> np.ndarray:
+    """MinHash signatures of texts' word 3-shingles, one row per text."""
+    rng = np.random.default_rng(seed)
+    # Multiply-shift hashing: odd multipliers, arithmetic mod 2**64
+    a = rng.integers(0, 1 << 63, _PERMUTATIONS, dtype=np.uint64) * 2 + 1
+    b = rng.integers(0, 1 << 63, _PERMUTATIONS, dtype=np.uint64)
+    rows = []
+    for first in range(0, len(texts), block):
+        shingles = [_shingles(t) for t in texts[first : first + block]]
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode()) for group in shingles for s in group),
+            dtype=np.uint64,
+        )
+        starts = np.cumsum([0] + [len(group) for group in shingles[:-1]])
+        permuted = (hashes[:, None] * a + b) >> np.uint64(32)
+        rows.append(np.minimum.reduceat(permuted, starts, axis=0))
+    if not rows:
+        return np.zeros((0, _PERMUTATIONS), dtype=np.uint64)
+    return np.concatenate(rows)
+
+
+def _informative(text: str) -> set[str]:
+    return {w for w in _TOKEN.findall(text.lower()) if w not in STOPWORDS}
+
+
+def collapse(
+    quotes: Sequence[Quote], similarity: float = 0.8, seed: int = 0
+) -> list[Quote]:
+    """Quotes with near-duplicates folded into one.
+
+    Quotes are near-duplicates when the estimated Jaccard similarity of
+    their word 3-shingles (MinHash, with LSH banding to find candidates) is
+    at least ``similarity``. Only quotes of the same segment and sentiment
+    are folded together, so counts stay attributable.
+
+    Returns:
+        One quote per group, in the order of each group's first quote,
+        counting every response of the group and represented by the
+        member with the most distinct content words.
+    """
+    signatures = _signatures([q.text for q in quotes], seed)
+    parent = list(range(len(quotes)))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = _PERMUTATIONS // _BANDS
+    buckets: dict[tuple, int] = {}
+    for i, quote in enumerate(quotes):
+        for band in range(_BANDS):
+            key = (
+                quote.response.segment,
+                quote.response.sentiment,
+                band,
+                signatures[i, band * rows : (band + 1) * rows].tobytes(),
+            )
+            j = buckets.setdefault(key, i)
+            if j == i or root(i) == root(j):
+                continue
+            if np.mean(signatures[i] == signatures[j]) >= similarity:
+                parent[root(i)] = root(j)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(quotes)):
+        groups.setdefault(root(i), []).append(i)
+    folded = []
+    for members in sorted(groups.values(), key=lambda m: m[0]):
+        best = quotes[max(members, key=lambda i: len(_informative(quotes[i].text)))]
+        folded.append(
+            Quote(best.response, best.text, sum(quotes[i].count for i in members))
+        )
+    return folded
+
+
+def select(quotes: Sequence[Quote], max_tokens: int) -> list[Quote]:
+    """The most informative quotes that fit in ``max_tokens``.
+
+    Each segment gets a share of the budget in proportion to the customers
+    it stands for. Within a segment, quotes are ranked by the rarity (IDF)
+    of their content words per token, weighted up by how many responses
+    they stand for, and taken in turn from each sentiment so that minority
+    views are kept along with the majority's. Budget a segment cannot use
+    goes to the best quotes left anywhere.
+
+    Returns:
+        The quotes kept, in their original order.
+    """
+    costs = [quote_tokens(q) for q in quotes]
+    if sum(costs) <= max_tokens:
+        return list(quotes)
+    words = [_informative(q.text) for q in quotes]
+    df = Counter(w for ws in words for w in ws)
+    n = len(quotes)
+    scores = [
+        sum(math.log(n / df[w]) for w in ws) / math.sqrt(cost) * (1 + math.log(q.count))
+        for q, ws, cost in zip(quotes, words, costs)
+    ]
+
+    by_segment: dict[str, dict[str, list[int]]] = {}
+    for i, quote in enumerate(quotes):
+        sentiments = by_segment.setdefault(quote.response.segment, {})
+        sentiments.setdefault(quote.response.sentiment, []).append(i)
+    customers = sum(q.count for q in quotes)
+    kept: set[int] = set()
+    spent = 0
+    for sentiments in by_segment.values():
+        ranked = [sorted(ids, key=lambda i: -scores[i]) for ids in sentiments.values()]
+        share = max_tokens * sum(quotes[i].count for r in ranked for i in r)
+        share /= customers
+        used = 0
+        # Best of each sentiment in turn, larger sentiments first
+        ranked.sort(key=lambda r: -sum(quotes[i].count for i in r))
+        for i in _interleave(ranked):
+            if used + costs[i] <= share and spent + costs[i] <= max_tokens:
+                kept.add(i)
+                used += costs[i]
+                spent += costs[i]
+    for i in sorted(range(n), key=lambda i: -scores[i]):
+        if i not in kept and spent + costs[i] <= max_tokens:
+            kept.add(i)
+            spent += costs[i]
+    return [quotes[i] for i in sorted(kept)]
+
+
+def _interleave(lists: list[list[int]]) -> list[int]:
+    return [
+        i
+        for row in range(max(map(len, lists), default=0))
+        for ranked in lists
+        if row < len(ranked)
+        for i in ranked[row : row + 1]
+    ]
+
+
+def compact(
+    responses: Iterable[AgentResponse],
+    max_tokens: int | None = None,
+    similarity: float = 0.8,
+) -> list[Quote]:
+    """Responses ready for an aggregation prompt: failed agents dropped,
+    filler openers trimmed, near-duplicates collapsed and, with
+    ``max_tokens``, the most informative kept within that many tokens.
+    """
+    quotes = collapse(quote_responses(responses), similarity)
+    if max_tokens is None:
+        return quotes
+    return select(quotes, max_tokens)
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+import anthropic
+
+logger = logging.getLogger(__name__)
+
+# Status codes that mean "the API is saturated, slow down"
+OVERLOAD_STATUS_CODES = {429, 503, 529}
+# Status codes worth retrying at all (overload plus transient server errors)
+RETRYABLE_STATUS_CODES = OVERLOAD_STATUS_CODES | {408, 409, 500, 502, 504}
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """True for rate-limit / overloaded responses (429, 503, 529)."""
+    return getattr(exc, "status_code", None) in OVERLOAD_STATUS_CODES
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """True for errors where the same request may succeed if sent again."""
+    if isinstance(exc, anthropic.APIConnectionError):
+        return True
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """Read the server's retry-after-ms / retry-after hint, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+def backoff_delay(
+    attempt: int,
+    base: float = 1.0,
+    cap: float = 30.0,
+    retry_after: float | None = None,
+) -> float:
+    """Full-jitter exponential backoff, never shorter than retry_after."""
+    delay = random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class AdaptiveLimiter:
+    """Concurrency limit that adapts to API feedback.
+
+    Starts in slow start (+1 per success, roughly doubling every round trip)
+    until the first congestion signal, then grows additively (+1 per
+    ``limit`` successes). Overload errors and latency inflation (short-term
+    latency EWMA exceeding the long-term EWMA by ``latency_tolerance``)
+    shrink the limit multiplicatively, at most once per cooldown.
+    ``pause_for`` holds back all new requests, e.g. for a retry-after hint.
+
+    Use as ``async with limiter:`` around a single API call, then report the
+    outcome with ``on_success`` or ``on_overload``.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        decrease_factor: float = 0.7,
+        latency_tolerance: float = 2.0,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._slow_start = True
+        self._short_latency: float | None = None
+        self._long_latency: float | None = None
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            if self._in_flight < self.limit:
+                self._in_flight += 1
+                return
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                else:
+                    # We were handed a wake-up we can no longer use
+                    self._wake()
+                raise
+
+    def release(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self.release()
+
+    def on_success(self, latency_ms: float) -> None:
+        """Record a successful call and grow or shrink the limit."""
+        if self._long_latency is None:
+            self._short_latency = self._long_latency = latency_ms
+        else:
+            self._short_latency = 0.8 * self._short_latency + 0.2 * latency_ms
+            self._long_latency = 0.98 * self._long_latency + 0.02 * latency_ms
+
+        if self._short_latency > self._long_latency * self.latency_tolerance:
+            self._decrease("latency inflation")
+            return
+
+        if self._slow_start:
+            self._limit += 1
+        else:
+            self._limit += 1 / max(self._limit, 1)
+        self._limit = min(self._limit, self.max_limit)
+        self._wake()
+
+    def on_overload(self) -> None:
+        """Record a 429/529-style rejection."""
+        self._decrease("overload")
+
+    def pause_for(self, seconds: float) -> None:
+        """Stop admitting new requests for the next ``seconds``."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _decrease(self, reason: str) -> None:
+        self._slow_start = False
+        now = time.monotonic()
+        cooldown = (self._long_latency or 1000.0) / 1000
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        old = self.limit
+        self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+        logger.info("Concurrency %d -> %d (%s)", old, self.limit, reason)
+
+    def _wake(self) -> None:
+        free = self.limit - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies for percentile estimates."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, latency_ms: float) -> None:
+        self._samples.append(latency_ms)
+
+    def percentile(self, q: float) -> float | None:
+        """The q-quantile (0-1) of the window, or None until min_samples."""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
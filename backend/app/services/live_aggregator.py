@@ -0,0 +1,156 @@
+import math
+import time
+from collections.abc import Mapping
+
+from app.models.schemas import (
+    AgentResponse,
+    LatencySummary,
+    LiveSnapshot,
+    SentimentBreakdown,
+)
+from app.services.sampling import SENTIMENTS, StratifiedTally
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram.
+
+    Recording is O(1) and memory is bounded by the number of buckets (a few
+    hundred for latencies up to minutes); percentiles are accurate to about
+    ``resolution`` relative error.
+    """
+
+    def __init__(self, resolution: float = 0.02) -> None:
+        self._log_base = math.log1p(resolution)
+        self.counts: dict[int, int] = {}
+        self.total = 0
+        self.max_ms = 0.0
+
+    def record(self, latency_ms: float) -> None:
+        bucket = int(math.log(max(latency_ms, 1.0)) / self._log_base)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total += 1
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, q: float) -> float | None:
+        """The q-quantile (0-1) of the recorded latencies, or None if empty."""
+        if not self.total:
+            return None
+        rank = max(1, math.ceil(q * self.total))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                # Geometric middle of the bucket, never above the largest seen
+                middle = math.exp((bucket + 0.5) * self._log_base)
+                return round(min(middle, self.max_ms), 1)
+        return round(self.max_ms, 1)
+
+    def summary(self) -> LatencySummary:
+        return LatencySummary(
+            p50_ms=self.percentile(0.5),
+            p90_ms=self.percentile(0.9),
+            p95_ms=self.percentile(0.95),
+            p99_ms=self.percentile(0.99),
+            max_ms=round(self.max_ms, 1) if self.total else None,
+        )
+
+
+class LiveAggregator:
+    """Sentiment, segment, latency and error tallies kept as agents finish.
+
+    ``add`` is O(1) per response: it only bumps counters per sampling
+    stratum and per (segment, stratum). ``snapshot`` turns the counters into
+    the same weighted breakdowns that sampling.sentiment_breakdown and
+    segment_breakdown compute from the full response list, in time that
+    depends on the number of strata and segments, not of responses; once
+    every agent has finished the two agree exactly.
+
+    While a run is in progress a stratum's responses stand for its whole
+    population (``expect``), so a segment's population is extrapolated from
+    its share of the answers so far.
+    """
+
+    def __init__(self, confidence: float = 0.95, interval_seconds: float = 1.0):
+        self.confidence = confidence
+        self.interval_seconds = interval_seconds
+        self.population: dict[str, float] = {}
+        self.expected = 0
+        self.completed = 0
+        self.errors = 0
+        self.timed_out = 0
+        self.latency = LatencyHistogram()
+        # Answers per stratum and label, and finished agents per stratum
+        self._counts: dict[str, dict[str, int]] = {}
+        self._finished: dict[str, int] = {}
+        # The same, per primary segment
+        self._segment_counts: dict[str, dict[str, dict[str, int]]] = {}
+        self._segment_finished: dict[str, dict[str, int]] = {}
+        self._last_snapshot = 0.0
+
+    def expect(self, population: Mapping[str, float]) -> None:
+        """Set how many personas each stratum stands for ("" for full runs)."""
+        self.population = dict(population)
+        self.expected = round(sum(self.population.values()))
+
+    def add(self, response: AgentResponse) -> None:
+        stratum = response.stratum or ""
+        self.completed += 1
+        self._finished[stratum] = self._finished.get(stratum, 0) + 1
+        finished = self._segment_finished.setdefault(response.segment, {})
+        finished[stratum] = finished.get(stratum, 0) + 1
+        if response.status == "error":
+            self.errors += 1
+        elif response.status == "timed_out":
+            self.timed_out += 1
+        if response.status != "ok":
+            return
+        self.latency.record(response.response_time_ms)
+        counts = self._counts.setdefault(stratum, dict.fromkeys(SENTIMENTS, 0))
+        counts[response.sentiment] += 1
+        by_stratum = self._segment_counts.setdefault(response.segment, {})
+        counts = by_stratum.setdefault(stratum, dict.fromkeys(SENTIMENTS, 0))
+        counts[response.sentiment] += 1
+
+    def _stratum_size(self, stratum: str) -> float:
+        return self.population.get(stratum, self._finished[stratum])
+
+    def _breakdown(
+        self, population: dict[str, float], counts: dict[str, dict[str, int]]
+    ) -> SentimentBreakdown:
+        return StratifiedTally.from_counts(
+            population, counts, self.confidence
+        ).breakdown()
+
+    def sentiment_breakdown(self) -> SentimentBreakdown:
+        population = {s: self._stratum_size(s) for s in self._finished}
+        return self._breakdown(population, self._counts)
+
+    def segment_breakdown(self) -> dict[str, SentimentBreakdown]:
+        breakdowns = {}
+        for segment, finished in self._segment_finished.items():
+            # The segment's share of each stratum so far, scaled to the stratum
+            population = {
+                s: self._stratum_size(s) * n / self._finished[s]
+                for s, n in finished.items()
+            }
+            breakdowns[segment] = self._breakdown(
+                population, self._segment_counts.get(segment, {})
+            )
+        return dict(sorted(breakdowns.items(), key=lambda item: -item[1].population))
+
+    def snapshot(self, final: bool = False) -> LiveSnapshot:
+        self._last_snapshot = time.monotonic()
+        return LiveSnapshot(
+            completed=self.completed,
+            expected=self.expected,
+            errors=self.errors,
+            timed_out=self.timed_out,
+            sentiment_breakdown=self.sentiment_breakdown(),
+            segment_breakdown=self.segment_breakdown(),
+            latency=self.latency.summary(),
+            final=final,
+        )
+
+    def due(self) -> bool:
+        """True once ``interval_seconds`` have passed since the last snapshot."""
+        return time.monotonic() - self._last_snapshot >= self.interval_seconds
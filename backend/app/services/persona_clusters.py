@@ -0,0 +1,268 @@
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from app.services.persona_registry import PersonaRegistry
+from app.services.persona_store import Persona
+from app.services.sampling import CLUSTER_STRATUM
+
+logger = logging.getLogger(__name__)
+
+CLUSTERS_FILENAME = "clusters.json"
+CLUSTERS_VERSION = 1
+
+_TERM = re.compile(r"[a-z][a-z']{2,}")
+# Rows per block when computing point-to-centroid distances
+_BLOCK = 4096
+
+
+@dataclass
+class PersonaClusters:
+    """Cluster membership of the personas in a processed directory.
+
+    ``members[c]`` lists cluster c's profile ids, closest to its centroid
+    first, so the head of each list is its most typical persona.
+    """
+
+    members: list[list[str]]
+
+    def __post_init__(self) -> None:
+        self._cluster_of = {
+            pid: c for c, members in enumerate(self.members) for pid in members
+        }
+
+    @property
+    def sizes(self) -> list[int]:
+        return [len(m) for m in self.members]
+
+    def cluster_of(self, profile_id: str) -> int | None:
+        return self._cluster_of.get(profile_id)
+
+    def representatives(
+        self, personas: Sequence[Persona], per_cluster: int = 1
+    ) -> tuple[list[Persona], dict[str, str]]:
+        """Pick the most typical ``per_cluster`` personas of each cluster.
+
+        Only ``personas`` are considered, so a targeted preview stands for
+        the targeted personas alone. Personas missing from the clustering
+        (added since it was computed) represent only themselves.
+
+        Returns:
+            The representatives, and the stratum of every persona given
+            ("cluster-<id>", or "persona-<id>" for unclustered ones).
+        """
+        by_id = {p.profile_id: p for p in personas}
+        strata: dict[str, str] = {}
+        chosen: list[Persona] = []
+        for c, members in enumerate(self.members):
+            present = [pid for pid in members if pid in by_id]
+            for pid in present:
+                strata[pid] = f"{CLUSTER_STRATUM}{c}"
+            chosen.extend(by_id[pid] for pid in present[:per_cluster])
+        unclustered = [p for p in personas if p.profile_id not in strata]
+        if unclustered:
+            logger.warning(
+                "%d personas are not in %s; running them individually",
+                len(unclustered),
+                CLUSTERS_FILENAME,
+            )
+        for persona in unclustered:
+            strata[persona.profile_id] = f"persona-{persona.profile_id}"
+            chosen.append(persona)
+        return chosen, strata
+
+
+def tfidf_matrix(texts: Sequence[str], max_features: int = 300) -> np.ndarray:
+    """L2-normalized TF-IDF rows over the ``max_features`` most common terms.
+
+    Terms found in a single document or in nearly all of them carry no
+    grouping signal and are left out. Term frequencies are sublinear.
+    """
+    docs = [Counter(_TERM.findall(text.lower())) for text in texts]
+    df = Counter(term for doc in docs for term in doc)
+    n = len(docs)
+    candidates = [t for t, count in df.items() if 2 <= count <= 0.9 * n]
+    vocabulary = sorted(candidates, key=lambda t: (-df[t], t))[:max_features]
+    column = {term: j for j, term in enumerate(vocabulary)}
+    idf = np.array([math.log(n / df[t]) + 1 for t in vocabulary], dtype=np.float32)
+
+    matrix = np.zeros((n, len(vocabulary)), dtype=np.float32)
+    for i, doc in enumerate(docs):
+        for term, count in doc.items():
+            j = column.get(term)
+            if j is not None:
+                matrix[i, j] = 1 + math.log(count)
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def entry_features(entries: Sequence[dict]) -> np.ndarray:
+    """Segments and club status one-hot, plus age scaled to 0..1; unit rows."""
+    labels = sorted(
+        {s for e in entries for s in e.get("segments", [])}
+        | {
+            f"club:{e['club_member_status']}"
+            for e in entries
+            if "club_member_status" in e
+        }
+    )
+    column = {label: j for j, label in enumerate(labels)}
+    matrix = np.zeros((len(entries), len(labels) + 1), dtype=np.float32)
+    for i, entry in enumerate(entries):
+        for segment in entry.get("segments", []):
+            matrix[i, column[segment]] = 1
+        if "club_member_status" in entry:
+            matrix[i, column[f"club:{entry['club_member_status']}"]] = 1
+        matrix[i, -1] = min(entry.get("age", 0), 100) / 100
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def _nearest(X: np.ndarray, centroids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Index of and squared distance to each row's nearest centroid."""
+    c_sq = (centroids * centroids).sum(axis=1)
+    labels = np.empty(len(X), dtype=np.int64)
+    dist = np.empty(len(X), dtype=np.float32)
+    for start in range(0, len(X), _BLOCK):
+        block = X[start : start + _BLOCK]
+        d = (block * block).sum(axis=1)[:, None] - 2 * block @ centroids.T + c_sq
+        labels[start : start + _BLOCK] = d.argmin(axis=1)
+        dist[start : start + _BLOCK] = np.maximum(d.min(axis=1), 0)
+    return labels, dist
+
+
+def cluster_sums(X: np.ndarray, labels: np.ndarray, k: int) -> np.ndarray:
+    """Sum of the rows of ``X`` in each of ``k`` clusters (zero if empty).
+
+    Rows are sorted by cluster and each run summed with np.add.reduceat,
+    which needs no k x n membership matrix and beats np.add.at.
+    """
+    order = np.argsort(labels, kind="stable")
+    present, starts = np.unique(labels[order], return_index=True)
+    sums = np.zeros((k, X.shape[1]), dtype=X.dtype)
+    if len(present):
+        sums[present] = np.add.reduceat(X[order], starts, axis=0)
+    return sums
+
+
+def kmeans(
+    X: np.ndarray, k: int, seed: int = 0, max_iter: int = 50
+) -> tuple[np.ndarray, np.ndarray]:
+    """k-means with k-means++ seeding.
+
+    Returns:
+        Each row's cluster and its squared distance to that centroid.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(X)
+    k = max(1, min(k, n))
+
+    centroids = np.empty((k, X.shape[1]), dtype=X.dtype)
+    centroids[0] = X[rng.integers(n)]
+    # float64: choice() rejects float32 probabilities that miss 1 by rounding
+    closest = ((X - centroids[0]) ** 2).sum(axis=1, dtype=np.float64)
+    for c in range(1, k):
+        total = closest.sum()
+        i = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centroids[c] = X[i]
+        distance = ((X - centroids[c]) ** 2).sum(axis=1, dtype=np.float64)
+        closest = np.minimum(closest, distance)
+
+    labels = np.full(n, -1)
+    for _ in range(max_iter):
+        new_labels, dist = _nearest(X, centroids)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        sums = cluster_sums(X, labels, k)
+        for c in np.flatnonzero(counts == 0):
+            # Reseed an empty cluster with the worst-fitting point
+            far = int(dist.argmax())
+            sums[c], counts[c], dist[far] = X[far], 1, 0
+        centroids = sums / counts[:, None]
+    return _nearest(X, centroids)
+
+
+def cluster_personas(
+    personas: Sequence[Persona],
+    k: int,
+    seed: int = 0,
+    text_weight: float = 1.0,
+    max_features: int = 300,
+) -> PersonaClusters:
+    """Group near-duplicate personas by their text and manifest features."""
+    if not personas:
+        return PersonaClusters([])
+    X = np.hstack(
+        [
+            tfidf_matrix([p.text for p in personas], max_features) * text_weight,
+            entry_features([p.entry for p in personas]),
+        ]
+    )
+    labels, dist = kmeans(X, k, seed=seed)
+    members: list[list[tuple[float, str]]] = [[] for _ in range(labels.max() + 1)]
+    for persona, label, d in zip(personas, labels.tolist(), dist.tolist()):
+        members[label].append((d, persona.profile_id))
+    return PersonaClusters(
+        [[pid for _, pid in sorted(m)] for m in members if m],
+    )
+
+
+def write_clusters(path: str | Path, clusters: PersonaClusters) -> None:
+    """Write clusters.json atomically."""
+    data = {
+        "version": CLUSTERS_VERSION,
+        "clusters": [
+            {"id": c, "size": len(members), "members": members}
+            for c, members in enumerate(clusters.members)
+        ],
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def load_clusters(processed_dir: str | Path) -> PersonaClusters | None:
+    """The clustering saved in a processed directory, if there is one."""
+    try:
+        with open(Path(processed_dir, CLUSTERS_FILENAME)) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    if data.get("version") != CLUSTERS_VERSION:
+        logger.warning("Ignoring %s from another version", CLUSTERS_FILENAME)
+        return None
+    return PersonaClusters([c["members"] for c in data["clusters"]])
+
+
+def cluster_directory(processed_dir: str | Path, k: int, seed: int = 0) -> Path:
+    """Cluster every persona in ``processed_dir`` and save clusters.json.
+
+    Returns:
+        Path of the written file.
+    """
+    registry = PersonaRegistry(str(processed_dir))
+    registry.load()
+    clusters = cluster_personas(registry.all(), k, seed=seed)
+    path = Path(processed_dir, CLUSTERS_FILENAME)
+    write_clusters(path, clusters)
+    sizes = clusters.sizes
+    logger.info(
+        "Clustered %d personas into %d clusters (largest %d, %d singletons)",
+        sum(sizes),
+        len(sizes),
+        max(sizes, default=0),
+        sizes.count(1),
+    )
+    return path
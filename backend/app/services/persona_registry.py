@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+from app.services.persona_store import STORE_FILENAME, Persona, PersonaStore
+from app.services.segment_index import SegmentIndex, SegmentQuery
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_persona_path(persona_file: str, processed_dir: Path) -> Path:
+    """Resolve a manifest ``persona_file`` value to an existing path.
+
+    Tries, in order:
+    1. Absolute or already correct relative path
+    2. Relative to processed_dir
+    3. Filename only, in processed_dir
+    """
+    persona_path = Path(persona_file)
+    if not persona_path.exists():
+        persona_path = processed_dir / persona_file
+    if not persona_path.exists():
+        persona_path = processed_dir / Path(persona_file).name
+    return persona_path
+
+
+class PersonaRegistry:
+    """In-memory index of every persona in a processed directory.
+
+    Loaded once (at app startup) and shared by all agent runs, so a test does
+    not touch the disk before its first API call. Reloads only when the
+    manifest or a persona file changes on disk.
+
+    A packed store (``personas.pack``, see persona_store) takes precedence
+    over manifest.json and the loose files unless the manifest is newer.
+    It is memory-mapped rather than read: loading costs milliseconds and
+    persona texts are decoded only when accessed.
+    """
+
+    def __init__(
+        self, processed_dir: str = "data/processed", check_interval: float = 2.0
+    ) -> None:
+        self.processed_dir = Path(processed_dir)
+        self.check_interval = check_interval
+        self._personas: Sequence[Persona] = []
+        self._index: dict[str, int] = {}
+        self._segment_index: SegmentIndex | None = None
+        # What was loaded (manifest or store) and its stamp when loaded
+        self._source: Path | None = None
+        self._manifest_stamp: tuple[int, int] | None = None
+        self._file_stamps: dict[str, tuple[str, int, int]] = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.processed_dir / "manifest.json"
+
+    @property
+    def store_path(self) -> Path:
+        return self.processed_dir / STORE_FILENAME
+
+    @property
+    def packed(self) -> bool:
+        """True if personas are served from a packed store."""
+        return isinstance(self._personas, PersonaStore)
+
+    def __len__(self) -> int:
+        return len(self._personas)
+
+    def __contains__(self, profile_id: object) -> bool:
+        return (
+            profile_id in self._personas if self.packed else profile_id in self._index
+        )
+
+    def get(self, profile_id: str) -> Persona | None:
+        """Look up a single persona by profile id."""
+        if isinstance(self._personas, PersonaStore):
+            return self._personas.get(profile_id)
+        idx = self._index.get(profile_id)
+        return self._personas[idx] if idx is not None else None
+
+    def all(self, limit: int | None = None) -> list[Persona]:
+        """All personas (or the first ``limit``), in manifest order."""
+        return list(self._personas[:limit])
+
+    @property
+    def segment_index(self) -> SegmentIndex:
+        """Segment/age/club index over the loaded personas, built on first use."""
+        index = self._segment_index
+        if index is None:
+            personas = self._personas
+            entries = (
+                map(personas.entry, range(len(personas)))
+                if isinstance(personas, PersonaStore)
+                else (p.entry for p in personas)
+            )
+            index = SegmentIndex(entries)
+            # Only publish it if no reload swapped the personas meanwhile
+            if personas is self._personas:
+                self._segment_index = index
+        return index
+
+    def select(
+        self, query: SegmentQuery | None = None, limit: int | None = None
+    ) -> list[Persona]:
+        """The personas matching ``query`` (or the first ``limit`` of them).
+
+        Only the selected personas are materialized, so a narrow query on a
+        packed store decodes just those texts.
+
+        Raises:
+            ValueError: If a segment expression is malformed or unknown.
+        """
+        if query is None or query.is_empty:
+            return self.all(limit=limit)
+        personas = self._personas
+        positions = self.segment_index.select(query)[:limit]
+        return [personas[i] for i in positions]
+
+    def load(self) -> None:
+        """(Re)load the manifest and persona texts.
+
+        Persona files whose mtime and size are unchanged since the last load
+        keep their cached text instead of being read again.
+        """
+        with self._lock:
+            self._load_locked()
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """Reload if the manifest or any persona file changed on disk.
+
+        Checks are throttled to once per ``check_interval`` seconds unless
+        ``force`` is set. Returns True if a reload happened.
+        """
+        now = time.monotonic()
+        if (
+            not force
+            and self._manifest_stamp is not None
+            and now - self._last_check < self.check_interval
+        ):
+            return False
+
+        with self._lock:
+            self._last_check = now
+            if self._manifest_stamp is None or self._is_stale():
+                self._load_locked()
+                return True
+        return False
+
+    def _source_path(self) -> Path:
+        """The packed store if there is one at least as new as the manifest."""
+        try:
+            store_mtime = os.stat(self.store_path).st_mtime_ns
+        except FileNotFoundError:
+            return self.manifest_path
+        try:
+            manifest_mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return self.store_path
+        return self.store_path if store_mtime >= manifest_mtime else self.manifest_path
+
+    def _is_stale(self) -> bool:
+        try:
+            source = self._source_path()
+            if source != self._source or _stamp(source) != self._manifest_stamp:
+                return True
+            for path_str, size, mtime in self._file_stamps.values():
+                if _stamp(Path(path_str)) != (size, mtime):
+                    return True
+        except FileNotFoundError:
+            return True
+        return False
+
+    def _load_locked(self) -> None:
+        start = time.monotonic()
+        source = self._source_path()
+        if source == self.store_path:
+            self._load_store_locked(start)
+            return
+        manifest_stamp = _stamp(self.manifest_path)
+        with open(self.manifest_path) as f:
+            manifest: dict = json.load(f)
+
+        old_texts = {p.profile_id: p.text for p in self._personas}
+        personas: list[Persona] = []
+        index: dict[str, int] = {}
+        file_stamps: dict[str, tuple[str, int, int]] = {}
+        reread = 0
+
+        for profile_id, entry in manifest.items():
+            persona_path = resolve_persona_path(
+                entry["persona_file"], self.processed_dir
+            )
+            size, mtime = _stamp(persona_path)
+            previous = self._file_stamps.get(profile_id)
+            if previous == (str(persona_path), size, mtime) and profile_id in old_texts:
+                text = old_texts[profile_id]
+            else:
+                text = persona_path.read_text()
+                reread += 1
+
+            index[profile_id] = len(personas)
+            personas.append(Persona(profile_id, text, entry))
+            file_stamps[profile_id] = (str(persona_path), size, mtime)
+
+        self._personas = personas
+        self._index = index
+        self._segment_index = None
+        self._file_stamps = file_stamps
+        self._source = self.manifest_path
+        self._manifest_stamp = manifest_stamp
+        self._last_check = time.monotonic()
+
+        logger.info(
+            "Loaded %d personas from %s (%d read from disk) in %.0fms",
+            len(personas),
+            self.processed_dir,
+            reread,
+            (time.monotonic() - start) * 1000,
+        )
+
+    def _load_store_locked(self, start: float) -> None:
+        stamp = _stamp(self.store_path)
+        # A replaced store is a new file; the old mapping stays valid for
+        # personas already handed out and is unmapped once unreferenced
+        self._personas = PersonaStore(self.store_path)
+        self._index = {}
+        self._segment_index = None
+        self._file_stamps = {}
+        self._source = self.store_path
+        self._manifest_stamp = stamp
+        self._last_check = time.monotonic()
+
+        logger.info(
+            "Mapped %d packed personas from %s in %.0fms",
+            len(self._personas),
+            self.store_path,
+            (time.monotonic() - start) * 1000,
+        )
+
+
+def _stamp(path: Path) -> tuple[int, int]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
@@ -0,0 +1,229 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+from pathlib import Path
+from typing import NamedTuple, overload
+
+# File name of the packed store inside a processed directory
+STORE_FILENAME = "personas.pack"
+
+_MAGIC = b"PERSONAS"
+_VERSION = 1
+# magic, version, count, then offsets of the ids, table and segments
+# sections and of the end of the file
+_HEADER = struct.Struct("<8sII4Q")
+# Per persona: text offset, text length, entry offset, entry length
+_FIELDS = 4
+
+
+class Persona(NamedTuple):
+    """A loaded persona: its id, full prompt text and manifest entry."""
+
+    profile_id: str
+    text: str
+    entry: dict
+
+
+def write_store(path: str | Path, personas: Iterable[tuple[str, str, dict]]) -> int:
+    """Pack (profile_id, text, manifest entry) triples into one store file.
+
+    Layout: a fixed header, then every persona's UTF-8 text followed by its
+    entry as compact JSON, then the newline-separated ids, a table of
+    (offset, length) pairs per persona as little-endian uint64s, and a JSON
+    map of segment -> persona positions. The file is written next to
+    ``path`` and renamed into place, so readers never see a partial store.
+
+    Returns:
+        The number of personas written.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    ids: list[str] = []
+    table = array("Q")
+    segments: dict[str, list[int]] = {}
+
+    with open(tmp_path, "wb") as f:
+        f.write(bytes(_HEADER.size))
+        offset = _HEADER.size
+        for profile_id, text, entry in personas:
+            if "\n" in profile_id:
+                raise ValueError(f"Profile id {profile_id!r} contains a newline")
+            text_bytes = text.encode("utf-8")
+            entry_bytes = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+            f.write(text_bytes)
+            f.write(entry_bytes)
+            table.extend(
+                (offset, len(text_bytes), offset + len(text_bytes), len(entry_bytes))
+            )
+            offset += len(text_bytes) + len(entry_bytes)
+            for segment in entry.get("segments", []):
+                segments.setdefault(segment, []).append(len(ids))
+            ids.append(profile_id)
+
+        ids_offset = offset
+        f.write("\n".join(ids).encode("utf-8"))
+        table_offset = f.tell()
+        if sys.byteorder != "little":
+            table.byteswap()
+        f.write(table.tobytes())
+        segments_offset = f.tell()
+        f.write(json.dumps(segments, separators=(",", ":")).encode("utf-8"))
+        end = f.tell()
+
+        f.seek(0)
+        f.write(
+            _HEADER.pack(
+                _MAGIC,
+                _VERSION,
+                len(ids),
+                ids_offset,
+                table_offset,
+                segments_offset,
+                end,
+            )
+        )
+    os.replace(tmp_path, path)
+    return len(ids)
+
+
+def pack_directory(
+    processed_dir: str | Path, store_path: str | Path | None = None
+) -> Path:
+    """Pack a processed directory (manifest.json + persona files) into a store.
+
+    Personas keep manifest order; the store goes to ``STORE_FILENAME`` in
+    the directory unless ``store_path`` is given.
+    """
+    processed_dir = Path(processed_dir)
+    with open(processed_dir / "manifest.json") as f:
+        manifest: dict = json.load(f)
+
+    def personas() -> Iterator[tuple[str, str, dict]]:
+        for profile_id, entry in manifest.items():
+            # Persona files always sit next to the manifest that lists them
+            persona_path = processed_dir / Path(entry["persona_file"]).name
+            yield profile_id, persona_path.read_text(encoding="utf-8"), entry
+
+    store_path = Path(store_path) if store_path else processed_dir / STORE_FILENAME
+    write_store(store_path, personas())
+    return store_path
+
+
+class PersonaStore(Sequence[Persona]):
+    """Read-only, memory-mapped view of a packed persona store.
+
+    Opening maps the file and reads only the ids and the offset table, so
+    it costs milliseconds even for tens of thousands of personas. A persona's
+    text and entry are decoded when it is accessed; ``raw_text`` returns the
+    mapped bytes without copying. Indexing by position and lookup by id are
+    O(1); ``segment`` lists the positions of a segment's personas.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, count, ids_offset, table_offset, segments_offset, end = (
+                _HEADER.unpack_from(self._mm)
+            )
+            if magic != _MAGIC or version != _VERSION or end != len(self._mm):
+                raise ValueError(
+                    f"{self.path} is not a version {_VERSION} persona store"
+                )
+        except (struct.error, ValueError):
+            self._mm.close()
+            raise
+
+        self._ids = (
+            self._mm[ids_offset:table_offset].decode("utf-8").split("\n")
+            if count
+            else []
+        )
+        # A few bytes per persona: copied out so nothing pins the mapping
+        self._table = array("Q")
+        self._table.frombytes(self._mm[table_offset:segments_offset])
+        if sys.byteorder != "little":
+            self._table.byteswap()
+        self._index = dict(zip(self._ids, range(count)))
+        self._segments_span = (segments_offset, end)
+        self._segments: dict[str, list[int]] | None = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @overload
+    def __getitem__(self, i: int) -> Persona: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[Persona]: ...
+
+    def __getitem__(self, i: int | slice) -> Persona | list[Persona]:
+        if isinstance(i, slice):
+            return [self._persona(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("persona index out of range")
+        return self._persona(i)
+
+    def __contains__(self, profile_id: object) -> bool:
+        return profile_id in self._index
+
+    @property
+    def ids(self) -> list[str]:
+        """Profile ids, in store order."""
+        return list(self._ids)
+
+    def position(self, profile_id: str) -> int | None:
+        return self._index.get(profile_id)
+
+    def get(self, profile_id: str) -> Persona | None:
+        """Look up a single persona by profile id."""
+        i = self._index.get(profile_id)
+        return self._persona(i) if i is not None else None
+
+    def raw_text(self, i: int) -> memoryview:
+        """The UTF-8 text of the persona at position i, without copying."""
+        offset, length = self._table[i * _FIELDS], self._table[i * _FIELDS + 1]
+        return memoryview(self._mm)[offset : offset + length]
+
+    def entry(self, i: int) -> dict:
+        """The manifest entry of the persona at position i, without its text."""
+        offset, length = self._table[i * _FIELDS + 2], self._table[i * _FIELDS + 3]
+        return json.loads(self._mm[offset : offset + length])
+
+    def segment(self, name: str) -> list[int]:
+        """Positions of the personas whose entry lists segment ``name``."""
+        if self._segments is None:
+            start, end = self._segments_span
+            self._segments = json.loads(self._mm[start:end])
+        return list(self._segments.get(name, []))
+
+    def close(self) -> None:
+        """Unmap the file (release raw_text views first).
+
+        Personas already returned stay valid.
+        """
+        self._mm.close()
+
+    def __enter__(self) -> "PersonaStore":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _persona(self, i: int) -> Persona:
+        base = i * _FIELDS
+        text_offset, text_length, entry_offset, entry_length = self._table[
+            base : base + _FIELDS
+        ]
+        return Persona(
+            self._ids[i],
+            self._mm[text_offset : text_offset + text_length].decode("utf-8"),
+            json.loads(self._mm[entry_offset : entry_offset + entry_length]),
+        )
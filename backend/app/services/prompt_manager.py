@@ -1,7 +1,11 @@
 import os
 from pathlib import Path
 
+from app.services.rate_limiter import estimate_tokens
+
 _PROMPTS_DIR = Path(__file__).parent.parent / "prompts"
+# Shortest prefix the API will cache for Sonnet and Opus 4 (Haiku: 2048)
+CACHE_MIN_TOKENS = 1024
 _template_cache: dict[str, str] = {}
 
 
@@ -26,12 +30,146 @@ def format_agent_prompt(persona: str) -> str:
     return template.replace("{persona_description}", persona)
 
 
+def split_agent_prompt(persona: str) -> tuple[str, str]:
+    """Split a persona into (shared instructions, persona description).
+
+    Pre-generated persona files end with an "INSTRUCTIONS FOR RESPONDING:"
+    block that is identical for every customer; raw descriptions get the
+    instructions from the agent_persona.txt template instead.
+    """
+    for marker in ("INSTRUCTIONS FOR RESPONDING:", "IMPORTANT INSTRUCTIONS:"):
+        if marker in persona:
+            description, _, rest = persona.partition(marker)
+            instructions = marker + rest
+            break
+    else:
+        template = _load_template("agent_persona.txt")
+        _, _, instructions = template.partition("{persona_description}")
+        description = persona
+
+    # The instructions now come first, so refer forward to the persona
+    instructions = instructions.strip().replace(
+        " described above", " described below"
+    )
+    description = description.strip().removesuffix("---").strip()
+    return instructions, description
+
+
+def format_agent_system_blocks(
+    persona: str, min_cache_tokens: int = CACHE_MIN_TOKENS
+) -> list[dict]:
+    """Build the agent system prompt as cacheable content blocks.
+
+    Layout is shared instructions first, then the persona, with a single
+    cache breakpoint after the persona: the instructions alone are far below
+    the minimum for a cached prefix, so a breakpoint on them would never be
+    written. The instructions+persona prefix is reused across repeat runs of
+    the same crowd. The product description goes in the user message, after
+    the breakpoint.
+
+    Most personas are short enough that the prefix falls below the minimum
+    too (the bundled ones come to roughly 700-950 tokens); those get no
+    breakpoint, since the API would not cache them anyway. The estimate errs
+    high, so a prefix that qualifies is never left unmarked.
+    """
+    instructions, description = split_agent_prompt(persona)
+    blocks = [
+        {"type": "text", "text": instructions},
+        {"type": "text", "text": f"YOUR PERSONA:\n\n{description}"},
+    ]
+    if estimate_tokens(blocks) >= min_cache_tokens:
+        blocks[1]["cache_control"] = {"type": "ephemeral"}
+    return blocks
+
+
 def format_evaluation_prompt(product_desc: str) -> str:
     """Format the product evaluation user message."""
     template = _load_template("agent_evaluation.txt")
     return template.replace("{product_description}", product_desc)
 
 
+def _fill(name: str, **values: object) -> str:
+    """Substitute ``{key}`` placeholders in a template, leaving other braces."""
+    text = _load_template(name)
+    for key, value in values.items():
+        text = text.replace("{" + key + "}", str(value))
+    return text
+
+
+def format_summary_prompt(
+    product_desc: str, total_agents: int, all_responses: str
+) -> str:
+    """Single-call executive summary over every response."""
+    return _fill(
+        "aggregation_summary.txt",
+        product_description=product_desc,
+        total_agents=total_agents,
+        all_responses=all_responses,
+    )
+
+
+def format_map_prompt(
+    product_desc: str, total_agents: int, batch_size: int, responses: str
+) -> str:
+    """Notes on one batch of responses (map step of the summary)."""
+    return _fill(
+        "aggregation_map.txt",
+        product_description=product_desc,
+        total_agents=total_agents,
+        batch_size=batch_size,
+        responses=responses,
+    )
+
+
+def format_merge_prompt(
+    product_desc: str, customer_count: int, batch_count: int, notes: str
+) -> str:
+    """Combine several batches' notes into one (intermediate reduce step)."""
+    return _fill(
+        "aggregation_merge.txt",
+        product_description=product_desc,
+        customer_count=customer_count,
+        batch_count=batch_count,
+        notes=notes,
+    )
+
+
+def format_reduce_prompt(
+    product_desc: str, total_agents: int, sentiment_overview: str, notes: str
+) -> str:
+    """Executive summary written from batch notes (final reduce step)."""
+    return _fill(
+        "aggregation_reduce.txt",
+        product_description=product_desc,
+        total_agents=total_agents,
+        sentiment_overview=sentiment_overview,
+        notes=notes,
+    )
+
+
+def format_segment_prompt(
+    product_desc: str, segment_name: str, segment_count: int, responses: str
+) -> str:
+    """How one segment reacted to the product."""
+    return _fill(
+        "segment_analysis.txt",
+        product_description=product_desc,
+        segment_name=segment_name,
+        segment_count=segment_count,
+        segment_responses=responses,
+    )
+
+
+def format_themes_prompt(product_desc: str, total_agents: int, themes: str) -> str:
+    """Reword locally extracted themes into readable key themes."""
+    return _fill(
+        "aggregation_themes.txt",
+        product_description=product_desc,
+        total_agents=total_agents,
+        themes=themes,
+    )
+
+
 def clear_cache() -> None:
     """Clear the template cache (useful for testing)."""
     _template_cache.clear()
@@ -0,0 +1,120 @@
+import asyncio
+import time
+from dataclasses import dataclass
+
+# Rough English-text ratio for Claude's tokenizer; errs on the high side
+_CHARS_PER_TOKEN = 3.5
+
+
+def estimate_tokens(content: str | list[dict]) -> int:
+    """Cheap local token estimate for a prompt string or list of text blocks."""
+    if isinstance(content, list):
+        return sum(estimate_tokens(block.get("text", "")) for block in content)
+    return int(len(content) / _CHARS_PER_TOKEN) + 1
+
+
+class TokenBucket:
+    """A per-minute budget that refills continuously, starting full."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` is available (call refill first)."""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass
+class Reservation:
+    """What a request was charged at admission, for later reconciliation."""
+
+    input_tokens: int
+    output_tokens: int
+
+
+class RateLimiter:
+    """Admits requests against RPM, input-TPM and output-TPM budgets.
+
+    A request reserves its estimated input tokens and its full ``max_tokens``
+    output allowance up front; ``reconcile`` then corrects both buckets with
+    the real ``usage`` once the call returns. Admission is FIFO so large
+    personas are not starved by small ones. A budget of 0 means unlimited.
+
+    One instance is meant to be shared by every AgentRunner in the process so
+    concurrent tests stay within the account limits together.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        input_tokens_per_minute: int = 0,
+        output_tokens_per_minute: int = 0,
+    ) -> None:
+        self._requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self._input = (
+            TokenBucket(input_tokens_per_minute) if input_tokens_per_minute else None
+        )
+        self._output = (
+            TokenBucket(output_tokens_per_minute) if output_tokens_per_minute else None
+        )
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return any(b is not None for b in (self._requests, self._input, self._output))
+
+    async def acquire(self, input_tokens: int, output_tokens: int) -> Reservation:
+        """Wait until one request with the given token estimates fits."""
+        costs = [
+            (self._requests, 1),
+            (self._input, input_tokens),
+            (self._output, output_tokens),
+        ]
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = 0.0
+                for bucket, amount in costs:
+                    if bucket is not None:
+                        bucket.refill(now)
+                        wait = max(wait, bucket.wait_time(amount))
+                if wait <= 0:
+                    for bucket, amount in costs:
+                        if bucket is not None:
+                            bucket.take(amount)
+                    return Reservation(input_tokens, output_tokens)
+                await asyncio.sleep(wait)
+
+    def reconcile(
+        self, reservation: Reservation, input_tokens: int, output_tokens: int
+    ) -> None:
+        """Correct a reservation with the tokens the call actually used."""
+        for bucket, reserved, actual in (
+            (self._input, reservation.input_tokens, input_tokens),
+            (self._output, reservation.output_tokens, output_tokens),
+        ):
+            if bucket is None:
+                continue
+            bucket.refill(time.monotonic())
+            if actual < reserved:
+                bucket.give_back(reserved - actual)
+            else:
+                bucket.take(actual - reserved)
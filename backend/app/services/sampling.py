@@ -0,0 +1,248 @@
+import math
+import random
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from statistics import NormalDist
+
+from app.models.schemas import AgentResponse, SentimentBreakdown
+from app.services.persona_store import Persona
+
+SENTIMENTS = ("positive", "neutral", "negative")
+
+# Same cut-offs as the age segments convert_real_data.py assigns
+AGE_BANDS = ((25, "young_adult"), (40, "adult"), (55, "mature"))
+
+# Stratum prefix of a preview run's persona clusters ("cluster-<id>")
+CLUSTER_STRATUM = "cluster-"
+
+
+@dataclass(frozen=True)
+class SamplingPlan:
+    """Stop a crowd run once the sentiment shares are known well enough.
+
+    Agents run in a stratified random order and the run stops once the
+    ``confidence`` intervals on the positive and negative shares are at most
+    ``ci_width`` wide (0.1 = ten percentage points, end to end). At least
+    ``min_samples`` answers are needed, with every stratum answered at least
+    once, before a run can stop.
+    """
+
+    ci_width: float = 0.1
+    confidence: float = 0.95
+    min_samples: int = 30
+    seed: int | None = 0
+
+
+def stratum_of(entry: dict | None) -> str:
+    """Stratum of a manifest entry: its age band and shopping frequency."""
+    entry = entry or {}
+    age = entry.get("age", 0)
+    band = next((name for limit, name in AGE_BANDS if age < limit), "senior")
+    frequency = next(
+        (s for s in entry.get("segments", []) if s.endswith("_shopper")), ""
+    )
+    return f"{band}/{frequency}" if frequency else band
+
+
+def stratified_order(
+    personas: Sequence[Persona], seed: int | None = 0
+) -> list[Persona]:
+    """Shuffle personas so that every prefix is a stratified sample.
+
+    One persona from each stratum comes first, so a run covers every stratum
+    early. The rest get the key (rank + u) / stratum size, with ranks taken
+    from a shuffle within the stratum and u drawn once per stratum; sorting
+    by it interleaves the strata, so after the first n personas a stratum of
+    size N_h has contributed about n * N_h / N of them.
+    """
+    rng = random.Random(seed)
+    strata: dict[str, list[Persona]] = {}
+    for persona in personas:
+        strata.setdefault(stratum_of(persona.entry), []).append(persona)
+    keyed = []
+    for members in strata.values():
+        rng.shuffle(members)
+        offset = rng.random()
+        size = len(members)
+        keyed.extend(
+            ((rank > 0, (rank + offset) / size), persona)
+            for rank, persona in enumerate(members)
+        )
+    keyed.sort(key=lambda item: item[0])
+    return [persona for _, persona in keyed]
+
+
+def wilson_interval(p: float, n: float, z: float) -> tuple[float, float]:
+    """Wilson score interval for a share ``p`` observed over ``n`` trials."""
+    if n <= 0:
+        return 0.0, 1.0
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z / denom * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+class StratifiedTally:
+    """Running per-stratum sentiment counts and stratified share estimates.
+
+    A share is estimated as sum(W_h * p_h) over the answered strata, W_h
+    being the stratum's share of the population. Its interval is a Wilson
+    interval on the effective sample size implied by the stratified
+    variance (with finite population correction), so a stratum that has
+    been exhausted contributes no uncertainty. Strata with no answers yet
+    are left out of the estimate.
+
+    Preview runs answer each persona cluster with its most typical members,
+    not a random draw, so their spread says little about the cluster's; a
+    single one has none at all. For those strata the variance is at least
+    the between-cluster (collapsed strata) estimate, which treats the
+    clusters' shares as draws around the overall one.
+    """
+
+    def __init__(self, population: dict[str, float], confidence: float = 0.95):
+        self.population = dict(population)
+        self.z = NormalDist().inv_cdf((1 + confidence) / 2)
+        self.counts: dict[str, dict[str, int]] = {}
+        self.total = 0
+
+    @classmethod
+    def from_counts(
+        cls,
+        population: dict[str, float],
+        counts: dict[str, dict[str, int]],
+        confidence: float = 0.95,
+    ) -> "StratifiedTally":
+        """A tally already holding ``counts`` (stratum -> label -> answers)."""
+        tally = cls(population, confidence)
+        tally.counts = {s: c for s, c in counts.items() if any(c.values())}
+        tally.total = sum(sum(c.values()) for c in tally.counts.values())
+        return tally
+
+    def add(self, stratum: str, label: str) -> None:
+        counts = self.counts.setdefault(stratum, dict.fromkeys(SENTIMENTS, 0))
+        counts[label] += 1
+        self.total += 1
+
+    @property
+    def covers_all_strata(self) -> bool:
+        return all(self.counts.get(s) for s in self.population)
+
+    def estimate(self, label: str) -> tuple[float, float, float]:
+        """(share, low, high) of ``label`` over the answered strata."""
+        covered = sum(self.population[s] for s in self.counts)
+        if not covered:
+            return 0.0, 0.0, 1.0
+        share = variance = 0.0
+        exhausted = True
+        for stratum, counts in self.counts.items():
+            n = sum(counts.values())
+            size = self.population[stratum]
+            weight = size / covered
+            p = counts[label] / n
+            share += weight * p
+            fpc = max(0.0, 1 - n / size)
+            variance += weight * weight * p * (1 - p) / n * fpc
+            exhausted = exhausted and fpc == 0
+        if exhausted:
+            return share, share, share
+        variance = max(variance, self._between_cluster_variance(label, covered))
+        n_eff = share * (1 - share) / variance if variance > 0 else self.total
+        low, high = wilson_interval(share, min(n_eff, covered), self.z)
+        return share, low, high
+
+    def _between_cluster_variance(self, label: str, covered: float) -> float:
+        """Collapsed strata variance of ``label``'s share over the clusters.
+
+        L / (L - 1) * sum(w_c^2 * fpc_c * (p_c - p)^2), p being the clusters'
+        weighted mean share; with fewer than two clusters the worst case
+        p(1 - p) = 1/4 stands in for each cluster's variance.
+        """
+        clusters = []
+        for stratum, counts in self.counts.items():
+            n = sum(counts.values())
+            size = self.population[stratum]
+            if stratum.startswith(CLUSTER_STRATUM) and n < size:
+                clusters.append((size / covered, counts[label] / n, 1 - n / size))
+        if len(clusters) < 2:
+            return sum(w * w * fpc / 4 for w, _, fpc in clusters)
+        mean = sum(w * p for w, p, _ in clusters) / sum(w for w, _, _ in clusters)
+        spread = sum(w * w * fpc * (p - mean) ** 2 for w, p, fpc in clusters)
+        return len(clusters) / (len(clusters) - 1) * spread
+
+    def converged(self, plan: SamplingPlan) -> bool:
+        if self.total < plan.min_samples or not self.covers_all_strata:
+            return False
+        for label in ("positive", "negative"):
+            _, low, high = self.estimate(label)
+            if high - low > plan.ci_width:
+                return False
+        return True
+
+    def breakdown(self) -> SentimentBreakdown:
+        """Counts as answered; percentages and intervals population-weighted."""
+        fields: dict = {"sample_size": self.total}
+        fields["population"] = round(sum(self.population[s] for s in self.counts))
+        for label in SENTIMENTS:
+            share, low, high = self.estimate(label)
+            fields[label] = sum(c[label] for c in self.counts.values())
+            fields[f"{label}_pct"] = round(share * 100, 1)
+            fields[f"{label}_interval"] = (round(low * 100, 1), round(high * 100, 1))
+        return SentimentBreakdown(**fields)
+
+
+def assign_weights(
+    responses: Iterable[AgentResponse], population: dict[str, int]
+) -> None:
+    """Set each response's sample_weight to N_h / n_h for its stratum."""
+    responses = list(responses)
+    sampled: dict[str | None, int] = {}
+    for response in responses:
+        sampled[response.stratum] = sampled.get(response.stratum, 0) + 1
+    for response in responses:
+        response.sample_weight = (
+            population[response.stratum] / sampled[response.stratum]
+        )
+
+
+def sentiment_breakdown(
+    responses: Iterable[AgentResponse], confidence: float = 0.95
+) -> SentimentBreakdown:
+    """Sentiment split of a run, weighted by each answer's sample_weight.
+
+    Responses without a stratum (full runs) form one stratum. Failed and
+    timed-out agents count toward their stratum's population but not its
+    sentiment shares.
+    """
+    population: dict[str, float] = {}
+    answered = []
+    for response in responses:
+        stratum = response.stratum or ""
+        population[stratum] = population.get(stratum, 0.0) + response.sample_weight
+        if response.status == "ok":
+            answered.append((stratum, response.sentiment))
+    tally = StratifiedTally(population, confidence)
+    for stratum, label in answered:
+        tally.add(stratum, label)
+    return tally.breakdown()
+
+
+def segment_breakdown(
+    responses: Iterable[AgentResponse], confidence: float = 0.95
+) -> dict[str, SentimentBreakdown]:
+    """sentiment_breakdown per primary segment, largest population first."""
+    by_segment: dict[str, list[AgentResponse]] = {}
+    for response in responses:
+        by_segment.setdefault(response.segment, []).append(response)
+    breakdowns = {
+        segment: sentiment_breakdown(group, confidence)
+        for segment, group in by_segment.items()
+    }
+    return dict(sorted(breakdowns.items(), key=lambda item: -item[1].population))
+
+
+def breakdown_error(estimate: SentimentBreakdown, actual: SentimentBreakdown) -> float:
+    """Largest gap, in percentage points, between two sentiment splits."""
+    return max(
+        abs(getattr(estimate, f"{label}_pct") - getattr(actual, f"{label}_pct"))
+        for label in SENTIMENTS
+    )
@@ -0,0 +1,331 @@
+import json
+import logging
+import operator
+from collections.abc import Callable, Sequence
+from pathlib import Path
+
+import numpy as np
+
+from app.services.persona_store import STORE_FILENAME, PersonaStore, write_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = Path(__file__).resolve().parents[2] / "data" / "segments.json"
+
+# Fields every manifest entry has, and those recorded under "features"
+BASE_FIELDS = ("age", "purchase_count")
+FEATURE_FIELDS = ("total_spent", "avg_price", "online_share")
+CATEGORY_FIELDS = ("category_count", "category_share")
+STRING_FIELDS = ("club_member_status",)
+
+_COMPARISONS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "eq": operator.eq,
+}
+_MEMBERSHIP = {"in", "not_in"}
+
+Predicate = Callable[["FeatureTable"], np.ndarray]
+
+
+class FeatureTable:
+    """Per-customer segmentation inputs as columns, in manifest order."""
+
+    def __init__(self, entries: Sequence[dict]) -> None:
+        n = len(entries)
+        self.size = n
+        self.columns: dict[str, np.ndarray] = {}
+        for field in BASE_FIELDS:
+            self.columns[field] = np.array(
+                [e.get(field) or 0 for e in entries], dtype=np.float64
+            )
+        self.columns["club_member_status"] = np.array(
+            [e.get("club_member_status", "") for e in entries], dtype=object
+        )
+        features = [e.get("features") for e in entries]
+        self.has_features = np.array([f is not None for f in features])
+        features = [f or {} for f in features]
+        for field in ("total_spent", "online_share"):
+            self.columns[field] = np.array(
+                [f.get(field, 0) for f in features], dtype=np.float64
+            )
+        count = self.columns["purchase_count"]
+        self.columns["avg_price"] = np.divide(
+            self.columns["total_spent"],
+            count,
+            out=np.zeros(n),
+            where=count > 0,
+        )
+
+        self.categories: list[str] = sorted(
+            {group for f in features for group in f.get("categories", {})}
+        )
+        column = {group: j for j, group in enumerate(self.categories)}
+        self.category_counts = np.zeros((n, len(self.categories)), dtype=np.float64)
+        for i, f in enumerate(features):
+            for group, c in f.get("categories", {}).items():
+                self.category_counts[i, column[group]] = c
+
+    def __len__(self) -> int:
+        return self.size
+
+    def category_columns(self, match: str | None, groups: list[str] | None) -> list:
+        return [
+            j
+            for j, group in enumerate(self.categories)
+            if (match is not None and match in group)
+            or (groups is not None and group in groups)
+        ]
+
+
+def load_rules(path: str | Path | None = None) -> list[dict]:
+    """Segment rules from a JSON file (default: data/segments.json)."""
+    with open(path or DEFAULT_RULES_PATH) as f:
+        return json.load(f)["segments"]
+
+
+def _compare(values: Callable, condition: dict, where: str) -> Predicate:
+    tests = []
+    for op, bound in condition.items():
+        if op not in _COMPARISONS:
+            raise ValueError(f"{where}: unknown comparison {op!r}")
+        if not isinstance(bound, (int, float)):
+            raise ValueError(f"{where}: {op} needs a number, got {bound!r}")
+        tests.append((_COMPARISONS[op], bound))
+    if not tests:
+        raise ValueError(f"{where}: no comparison given")
+
+    def predicate(table: FeatureTable) -> np.ndarray:
+        column = values(table)
+        mask = np.ones(len(table), dtype=bool)
+        for compare, bound in tests:
+            mask &= compare(column, bound)
+        return mask
+
+    return predicate
+
+
+def _category_values(field: str, match: str | None, groups: list | None):
+    def values(table: FeatureTable) -> np.ndarray:
+        columns = table.category_columns(match, groups)
+        counts = table.category_counts[:, columns].sum(axis=1)
+        if field == "category_count":
+            return counts
+        total = table.columns["purchase_count"]
+        return np.divide(counts, total, out=np.zeros(len(table)), where=total > 0)
+
+    return values
+
+
+def _compile_field(field: str, condition: object, where: str) -> Predicate:
+    if not isinstance(condition, dict):
+        raise ValueError(f"{where}: condition on {field!r} must be an object")
+    where = f"{where}.{field}"
+    if field in STRING_FIELDS:
+        ops = set(condition)
+        if len(ops) != 1 or not ops <= _MEMBERSHIP:
+            raise ValueError(f"{where}: expected exactly one of 'in' or 'not_in'")
+        op, allowed = next(iter(condition.items()))
+        allowed = list(allowed)
+
+        def membership(table: FeatureTable) -> np.ndarray:
+            mask = np.isin(table.columns[field], allowed)
+            return mask if op == "in" else ~mask
+
+        return membership
+    if field in CATEGORY_FIELDS:
+        condition = dict(condition)
+        match, groups = condition.pop("match", None), condition.pop("groups", None)
+        if (match is None) == (groups is None):
+            raise ValueError(f"{where}: give one of 'match' or 'groups'")
+        return _compare(_category_values(field, match, groups), condition, where)
+    if field in BASE_FIELDS or field in FEATURE_FIELDS:
+        return _compare(lambda table: table.columns[field], condition, where)
+    raise ValueError(f"{where}: unknown field")
+
+
+def compile_clause(clause: object, where: str = "where") -> Predicate:
+    """Compile a ``where`` clause into a mask function.
+
+    Raises:
+        ValueError: If the clause uses an unknown field or comparison.
+    """
+    if not isinstance(clause, dict) or not clause:
+        raise ValueError(f"{where}: expected a non-empty object")
+    parts: list[Predicate] = []
+    for key, value in clause.items():
+        if key in ("all", "any"):
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"{where}.{key}: expected a non-empty list")
+            subs = [
+                compile_clause(c, f"{where}.{key}[{i}]") for i, c in enumerate(value)
+            ]
+            combine = np.logical_and if key == "all" else np.logical_or
+
+            def combined(table: FeatureTable, subs=subs, combine=combine) -> np.ndarray:
+                return combine.reduce([sub(table) for sub in subs])
+
+            parts.append(combined)
+        elif key == "not":
+            sub = compile_clause(value, f"{where}.not")
+            parts.append(lambda table, sub=sub: ~sub(table))
+        else:
+            parts.append(_compile_field(key, value, where))
+
+    def predicate(table: FeatureTable) -> np.ndarray:
+        mask = parts[0](table)
+        for part in parts[1:]:
+            mask = mask & part(table)
+        return mask
+
+    return predicate
+
+
+def _uses_features(clause: object) -> bool:
+    if isinstance(clause, list):
+        return any(_uses_features(c) for c in clause)
+    if not isinstance(clause, dict):
+        return False
+    return any(
+        key in FEATURE_FIELDS
+        or key in CATEGORY_FIELDS
+        or (key in ("all", "any", "not") and _uses_features(value))
+        for key, value in clause.items()
+    )
+
+
+class SegmentRules:
+    """Segment definitions compiled to vectorized predicates.
+
+    Rules come from a JSON file (data/segments.json by default)::
+
+        {"segments": [
+            {"name": "adult", "where": {"age": {"gte": 25, "lt": 40}}},
+            {"name": "tops_buyer",
+             "where": {"category_count": {"match": "Upper", "gt": 0}}},
+            {"name": "loyal_spender",
+             "where": {"all": [{"club_member_status": {"in": ["ACTIVE"]}},
+                               {"total_spent": {"gte": 1.5}}]}}
+        ]}
+
+    A ``where`` clause maps fields to conditions, all of which must hold;
+    ``all``, ``any`` and ``not`` combine clauses. Numeric fields (age,
+    purchase_count, total_spent, avg_price, online_share) take any of
+    ``gt``, ``gte``, ``lt``, ``lte`` and ``eq``; club_member_status takes
+    ``in`` or ``not_in``. ``category_count`` and ``category_share`` (of the
+    customer's purchases) pick product groups by substring (``match``) or
+    exact name (``groups``) and compare like numeric fields.
+
+    Each rule compiles to a function from a FeatureTable to a boolean mask,
+    so a segment costs a few array operations over every customer at once.
+    A customer's segments are listed in rule order.
+    """
+
+    def __init__(self, rules: Sequence[dict]) -> None:
+        self.names: list[str] = []
+        self._predicates: list[Predicate] = []
+        self.needs_features = False
+        for i, rule in enumerate(rules):
+            name = rule.get("name")
+            if not name or not isinstance(name, str):
+                raise ValueError(f"segments[{i}]: missing name")
+            if name in self.names:
+                raise ValueError(f"segments[{i}]: duplicate segment {name!r}")
+            self.names.append(name)
+            self._predicates.append(compile_clause(rule.get("where"), name))
+            self.needs_features |= _uses_features(rule.get("where"))
+
+    @classmethod
+    def load(cls, path: str | Path | None = None) -> "SegmentRules":
+        return cls(load_rules(path))
+
+    def masks(self, table: FeatureTable) -> dict[str, np.ndarray]:
+        """Each segment's membership mask over the table's customers."""
+        if self.needs_features and not table.has_features.all():
+            missing = int((~table.has_features).sum())
+            raise ValueError(
+                f"{missing} manifest entries have no recorded features; rebuild "
+                "them with convert_real_data.py --incremental"
+            )
+        return {name: p(table) for name, p in zip(self.names, self._predicates)}
+
+    def evaluate(self, table: FeatureTable) -> list[list[str]]:
+        """Segment names of every customer, in rule order."""
+        segments: list[list[str]] = [[] for _ in range(len(table))]
+        for name, mask in self.masks(table).items():
+            for i in np.flatnonzero(mask).tolist():
+                segments[i].append(name)
+        return segments
+
+
+def assign_segments(manifest: dict, rules: SegmentRules) -> dict[str, int]:
+    """Set every manifest entry's segments from ``rules``.
+
+    Returns:
+        Number of customers in each segment.
+    """
+    entries = list(manifest.values())
+    segments = rules.evaluate(FeatureTable(entries))
+    for entry, names in zip(entries, segments):
+        entry["segments"] = names
+    counts = dict.fromkeys(rules.names, 0)
+    for names in segments:
+        for name in names:
+            counts[name] += 1
+    return counts
+
+
+def resegment_directory(
+    processed_dir: str | Path, rules: SegmentRules | None = None
+) -> dict[str, int]:
+    """Re-segment a processed directory in place; persona texts are untouched.
+
+    Updates manifest.json and personas.pack, whichever exist (both are
+    replaced atomically; the manifest first, so a store that was current
+    stays preferred by PersonaRegistry).
+
+    Returns:
+        Number of customers in each segment.
+    """
+    rules = rules or SegmentRules.load()
+    processed_dir = Path(processed_dir)
+    manifest_path = processed_dir / "manifest.json"
+    store_path = processed_dir / STORE_FILENAME
+
+    store = PersonaStore(store_path) if store_path.exists() else None
+    try:
+        if manifest_path.exists():
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        else:
+            manifest = {store.ids[i]: store.entry(i) for i in range(len(store))}
+        counts = assign_segments(manifest, rules)
+
+        if manifest_path.exists():
+            tmp_path = f"{manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                # One string, not json.dump's thousands of small writes
+                f.write(json.dumps(manifest, indent=2))
+            Path(tmp_path).replace(manifest_path)
+        if store is not None:
+            write_store(
+                store_path,
+                # Only the texts are carried over; old entries are not decoded
+                (
+                    (pid, str(store.raw_text(i), "utf-8"), manifest[pid])
+                    for i, pid in enumerate(store.ids)
+                    if pid in manifest
+                ),
+            )
+    finally:
+        if store is not None:
+            store.close()
+
+    logger.info(
+        "Re-segmented %d customers: %s",
+        len(manifest),
+        ", ".join(f"{n} {name}" for name, n in counts.items()),
+    )
+    return counts
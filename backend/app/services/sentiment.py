@@ -0,0 +1,297 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+# Sentiment keyword lists for simple MVP detection
+POSITIVE_PHRASES = [
+    "love",
+    "great",
+    "amazing",
+    "fantastic",
+    "excellent",
+    "perfect",
+    "definitely",
+    "would buy",
+    "i'd buy",
+    "sign me up",
+    "excited",
+    "awesome",
+    "wonderful",
+    "brilliant",
+    "yes",
+    "absolutely",
+    "interested",
+    "want",
+    "need this",
+    "can't wait",
+    "impressive",
+]
+NEGATIVE_PHRASES = [
+    "don't like",
+    "wouldn't",
+    "not interested",
+    "dislike",
+    "hate",
+    "terrible",
+    "awful",
+    "no way",
+    "pass",
+    "skip",
+    "not for me",
+    "waste",
+    "disappointed",
+    "overpriced",
+    "cheap",
+    "wouldn't buy",
+    "don't need",
+    "not worth",
+    "ugly",
+    "boring",
+]
+
+# Words that flip the polarity of a phrase shortly after them ("not great")
+NEGATORS = {
+    "not",
+    "no",
+    "never",
+    "don't",
+    "doesn't",
+    "didn't",
+    "won't",
+    "wouldn't",
+    "can't",
+    "cannot",
+    "isn't",
+    "aren't",
+    "wasn't",
+    "hardly",
+    "nor",
+    "without",
+}
+# A negator reaches at most this many words ahead...
+NEGATION_WINDOW = 3
+# ...and never across a clause boundary
+_CLAUSE_BREAK = re.compile(r"[.!?;:,\n]|\bbut\b")
+
+_WORD = re.compile(r"\S+")
+
+# Joins a batch into one corpus; ASCII record separator, never in a phrase
+_SEPARATOR_CHAR = "\x1e"
+_SEPARATOR = f" {_SEPARATOR_CHAR} "
+
+
+def _trie_pattern(phrases: list[str]) -> str:
+    """Regex alternation for phrases, factored into a character trie.
+
+    ``re`` tries the branches of a flat alternation one by one at every
+    offset; sharing prefixes means each offset costs one branch per distinct
+    next character instead of one per phrase (Aho-Corasick-style matching
+    within the regex engine).
+    """
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}  # end of a phrase
+
+    def to_regex(node: dict) -> str:
+        branches = []
+        optional = "" in node
+        for char, child in sorted(node.items()):
+            if char == "":
+                continue
+            if char == "'":
+                atom = "['’]"
+            elif char == " ":
+                atom = r"\s+"
+            else:
+                atom = re.escape(char)
+            branches.append(atom + to_regex(child))
+        if not branches:
+            return ""
+        if len(branches) == 1:
+            body = branches[0]
+        else:
+            body = "(?:" + "|".join(branches) + ")"
+        if optional:
+            # Longer continuations are tried first, then the phrase ends here
+            return "(?:" + body + r")?" if len(branches) == 1 else body + "?"
+        return body
+
+    return to_regex(trie)
+
+
+# Class of every phrase the matcher can return: +1, -1 or 0 for a negator
+_PHRASE_CLASS: dict[str, int] = {
+    **{n: 0 for n in NEGATORS},
+    **{p: 1 for p in POSITIVE_PHRASES},
+    **{p: -1 for p in NEGATIVE_PHRASES},
+}
+
+# Characters that can directly precede a word. _prepare puts a space after
+# each, so every word start follows a plain space: the pattern can then lead
+# with that literal, which ``re`` finds with a fast scan instead of
+# attempting a match at every offset.
+_WORD_START_CHARS = '\n\t([{"“‘*_-/—–….,;:!?'
+
+
+def _prepare(text: str) -> str:
+    """Lowercase text with a space before every word."""
+    text = " " + text.lower()
+    for char in _WORD_START_CHARS:
+        if char in text:
+            text = text.replace(char, char + " ")
+    return text
+
+
+# All phrases and negators in one compiled pattern, run over lowercased
+# text. The trie tries longer continuations first, so "wouldn't buy" wins
+# over "wouldn't" and "not interested" over "not"; the trailing boundary
+# stops "pass" matching inside "passionate" (and the engine backtracks to
+# the shorter phrase when a longer one fails it).
+_MATCHER = re.compile(" (" + _trie_pattern(list(_PHRASE_CLASS)) + r")\b")
+
+
+# Matched text -> (polarity, led by a negator); filled lazily because the
+# matcher also accepts curly apostrophes and runs of whitespace
+_MATCH_INFO: dict[str, tuple[int, bool]] = {}
+
+
+def _match_info(matched: str) -> tuple[int, bool]:
+    info = _MATCH_INFO.get(matched)
+    if info is None:
+        phrase = " ".join(matched.replace("’", "'").split())
+        info = (_PHRASE_CLASS[phrase], phrase.split(" ", 1)[0] in NEGATORS)
+        _MATCH_INFO[matched] = info
+    return info
+
+
+class SentimentScores(NamedTuple):
+    """Label plus smoothed class shares (summing to 1) for one text."""
+
+    label: str
+    positive: float
+    negative: float
+    neutral: float
+    confidence: float
+
+
+@lru_cache(maxsize=1024)
+def _scores(pos: int, neg: int) -> SentimentScores:
+    # The neutral class gets one pseudo-hit, so a single keyword is never
+    # fully confident and a text with no keywords is plainly neutral
+    total = pos + neg + 1
+    positive, negative, neutral = pos / total, neg / total, 1 / total
+    if pos > neg:
+        label, confidence = "positive", positive
+    elif neg > pos:
+        label, confidence = "negative", negative
+    else:
+        label, confidence = "neutral", neutral
+    return SentimentScores(
+        label=label,
+        positive=round(positive, 3),
+        negative=round(negative, 3),
+        neutral=round(neutral, 3),
+        confidence=round(confidence, 3),
+    )
+
+
+def _count(text: str, ends: list[int] | None = None) -> list[tuple[int, int]]:
+    """Positive and negative hit counts in prepared ``text``.
+
+    Args:
+        text: Prepared text, or several joined into one corpus.
+        ends: Offset where each joined text ends (None = one text). Negation
+            never carries over from one text to the next.
+
+    Returns:
+        (positive, negative) per text.
+    """
+    if ends is None:
+        ends = [len(text)]
+    counts: list[tuple[int, int]] = []
+    pos = neg = 0
+    negator_end = negated_until = -1
+    for match in _MATCHER.finditer(text):
+        start, end = match.span(1)
+        while start >= ends[len(counts)]:
+            counts.append((pos, neg))
+            pos = neg = 0
+            negator_end = negated_until = -1
+        phrase = match.group(1)
+        polarity, negator_led = _MATCH_INFO.get(phrase) or _match_info(phrase)
+
+        if (
+            polarity
+            and not negator_led
+            and start < negated_until
+            and not _CLAUSE_BREAK.search(text, negator_end, start)
+        ):
+            polarity = -polarity
+        if polarity > 0:
+            pos += 1
+        elif polarity < 0:
+            neg += 1
+
+        # Bare negators and negative phrases led by one ("don't like")
+        # negate what follows; "can't wait" does not
+        if polarity <= 0 and negator_led:
+            negator_end = end
+            negated_until = _negation_reach(text, end)
+    counts.append((pos, neg))
+    counts.extend([(0, 0)] * (len(ends) - len(counts)))
+    return counts
+
+
+def _negation_reach(text: str, end: int) -> int:
+    """Offset just past the NEGATION_WINDOW words following ``end``."""
+    for _ in range(NEGATION_WINDOW):
+        match = _WORD.search(text, end)
+        if match is None:
+            break
+        end = match.end()
+    return end
+
+
+def score_sentiment(text: str) -> SentimentScores:
+    """Score one response; see detect_sentiment_batch."""
+    return _scores(*_count(_prepare(text))[0])
+
+
+def detect_sentiment(text: str) -> str:
+    """Simple keyword-based sentiment detection for visualization color coding.
+
+    Returns 'positive', 'negative', or 'neutral'.
+    """
+    return score_sentiment(text).label
+
+
+def detect_sentiment_batch(texts: list[str]) -> list[SentimentScores]:
+    """Score many responses with the compiled matcher.
+
+    Each keyword hit counts once for its class; a phrase within
+    NEGATION_WINDOW words after a negator, in the same clause, counts for
+    the opposite class ("not great" is negative, "not overpriced" positive).
+
+    Args:
+        texts: Response texts.
+
+    The texts are lowercased, spaced and matched as one corpus, so the
+    per-call overhead of each pass is paid once per batch rather than once
+    per response.
+
+    Args:
+        texts: Response texts.
+
+    Returns:
+        One SentimentScores per text, in input order.
+    """
+    corpus = _prepare(_SEPARATOR.join(texts))
+    ends = [m.start() for m in re.finditer(_SEPARATOR_CHAR, corpus)]
+    if len(ends) != len(texts) - 1:
+        # A text holds the separator itself
+        return [score_sentiment(text) for text in texts]
+    ends.append(len(corpus))
+    return [_scores(pos, neg) for pos, neg in _count(corpus, ends)]
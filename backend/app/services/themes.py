@@ -0,0 +1,304 @@
+import copy
+import math
+import re
+from collections import Counter
+from collections.abc import Iterable, Sequence
+
+import numpy as np
+
+from app.models.schemas import AgentResponse, Theme
+from app.services.persona_clusters import cluster_sums, kmeans
+from app.services.sampling import SENTIMENTS
+
+_WORD = re.compile(r"[a-z][a-z'’]*[a-z]|[a-z]")
+# Phrases never span a clause
+_CLAUSE = re.compile(r"[.!?;:,()\n]+|\s[-–—]\s|\bbut\b")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset("""
+    a about above after again against all also am an and any are as at be
+    because been before being below between both but by can could did do does
+    doing don't down during each even ever few for from further get got had
+    has have having he her here hers herself him himself his how i i'd i'll
+    i'm i've if in into is isn't it it's its itself just like maybe me might
+    more most much must my myself no nor not now of off on once one only or
+    other our ours ourselves out over own quite rather really same she should
+    so some such than that that's the their theirs them themselves then there
+    there's these they they're this those through to too under until up us
+    very was wasn't we we're were what what's when where which while who whom
+    why will with won't would wouldn't you you'd you're your yours yourself
+    definitely honestly probably actually think thing things something lot
+    bit kind sort pretty okay ok well yes yeah oh though still though guess
+    say sure see look looks looking feel feels seem seems going want wants
+    """.split())
+
+
+def phrases(text: str, max_ngram: int = 3) -> Counter:
+    """Word n-grams of a text, 1 to ``max_ngram`` words long.
+
+    Phrases stay within a clause and neither start nor end with a stopword
+    (so "value for money" is kept and "for the" is not).
+    """
+    counts: Counter = Counter()
+    for clause in _CLAUSE.split(text.lower()):
+        words = [w.replace("’", "'") for w in _WORD.findall(clause)]
+        for i, first in enumerate(words):
+            if first in STOPWORDS:
+                continue
+            for n in range(1, max_ngram + 1):
+                if i + n > len(words):
+                    break
+                last = words[i + n - 1]
+                if last not in STOPWORDS and len(last) > 2:
+                    counts[" ".join(words[i : i + n])] += 1
+    return counts
+
+
+def _quote(text: str, phrase: str, max_chars: int = 200) -> str:
+    """The sentence of ``text`` that mentions ``phrase`` (else the first)."""
+    sentences = [s.strip() for s in _SENTENCE.split(text.strip()) if s.strip()]
+    if not sentences:
+        return ""
+    words = set(phrase.split())
+    best = max(sentences, key=lambda s: len(words & set(_WORD.findall(s.lower()))))
+    if len(best) > max_chars:
+        best = best[: max_chars - 1].rsplit(" ", 1)[0] + "…"
+    return best
+
+
+def _distinct(candidates: Iterable[str], k: int) -> list[str]:
+    """The first ``k`` phrases that do not overlap an earlier pick."""
+    chosen: list[str] = []
+    for phrase in candidates:
+        words = set(phrase.split())
+        if any(words <= set(c.split()) or set(c.split()) <= words for c in chosen):
+            continue
+        chosen.append(phrase)
+        if len(chosen) == k:
+            break
+    return chosen
+
+
+def _assign(
+    X: np.ndarray, fitted: np.ndarray, labels: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Each row's nearest centroid of a fit, and its squared distance."""
+    k = labels.max() + 1
+    counts = np.bincount(labels, minlength=k)[:, None]
+    centroids = cluster_sums(fitted, labels, k) / np.maximum(counts, 1)
+    # Rows are unit length: |x - c|^2 = 1 - 2 x.c + |c|^2
+    dist = 1 - 2 * X @ centroids.T + (centroids**2).sum(axis=1)
+    nearest = dist.argmin(axis=1)
+    return nearest, dist[np.arange(len(X)), nearest]
+
+
+def describe(theme: Theme) -> str:
+    """A theme as one line for InsightResults.key_themes."""
+    counts = {label: getattr(theme, label) for label in SENTIMENTS}
+    mood = max(counts, key=counts.get)
+    line = (
+        f"{theme.label} — {theme.count} responses ({theme.share_pct}%), mostly {mood}"
+    )
+    return f'{line}: "{theme.quote}"' if theme.quote else line
+
+
+class ThemeExtractor:
+    """Recurring themes of a test's responses, found without an LLM.
+
+    Responses are added as they arrive; each one is tokenized into phrases
+    once. ``themes`` then builds a TF-IDF matrix over the phrases found in
+    at least ``min_df`` responses, clusters the responses with k-means
+    (fitted on at most ``max_fit`` of them) and labels each cluster with the
+    phrases most of it uses and the rest of the crowd uses less, picking the
+    response nearest the centroid as the quote. ``segment_themes`` ranks
+    phrases by how much more often a segment's responses use them than
+    everyone else's (log-odds z-scores), using the manifest segment tags
+    given to ``add``.
+    """
+
+    def __init__(
+        self,
+        max_ngram: int = 3,
+        min_df: int = 2,
+        max_features: int = 500,
+        restarts: int = 4,
+        max_fit: int = 2_000,
+    ) -> None:
+        self.max_ngram = max_ngram
+        self.min_df = min_df
+        self.max_features = max_features
+        self.restarts = restarts
+        self.max_fit = max_fit
+        self.texts: list[str] = []
+        self.sentiments: list[str] = []
+        self.docs: list[Counter] = []
+        self.df: Counter = Counter()
+        # Tag -> positions of the responses carrying it
+        self.tagged: dict[str, list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def snapshot(self) -> "ThemeExtractor":
+        """A copy that later ``add`` calls leave alone, to read in a thread."""
+        frozen = copy.copy(self)
+        frozen.texts = self.texts[:]
+        frozen.sentiments = self.sentiments[:]
+        frozen.docs = self.docs[:]
+        frozen.df = self.df.copy()
+        frozen.tagged = {tag: members[:] for tag, members in self.tagged.items()}
+        return frozen
+
+    def add(self, response: AgentResponse, tags: Sequence[str] = ()) -> None:
+        """Take in one response; failed agents are ignored.
+
+        Args:
+            response: A finished agent's response.
+            tags: The persona's segments from the manifest (the response's
+                primary segment is always included).
+        """
+        if response.status != "ok":
+            return
+        doc = phrases(response.response_text, self.max_ngram)
+        position = len(self.docs)
+        self.docs.append(doc)
+        self.texts.append(response.response_text)
+        self.sentiments.append(response.sentiment)
+        self.df.update(doc.keys())
+        for tag in dict.fromkeys([response.segment, *tags]):
+            self.tagged.setdefault(tag, []).append(position)
+
+    def _matrix(self) -> tuple[list[str], np.ndarray]:
+        """Vocabulary and L2-normalized TF-IDF rows of every response."""
+        n = len(self.docs)
+        candidates = [t for t, count in self.df.items() if count >= self.min_df]
+        vocabulary = sorted(candidates, key=lambda t: (-self.df[t], t))[
+            : self.max_features
+        ]
+        column = {term: j for j, term in enumerate(vocabulary)}
+        idf = np.array(
+            [math.log(n / self.df[t]) + 1 for t in vocabulary], dtype=np.float32
+        )
+        matrix = np.zeros((n, len(vocabulary)), dtype=np.float32)
+        for i, doc in enumerate(self.docs):
+            for term, count in doc.items():
+                j = column.get(term)
+                if j is not None:
+                    matrix[i, j] = 1 + math.log(count)
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return vocabulary, matrix / np.where(norms > 0, norms, 1)
+
+    def _theme(
+        self,
+        members: np.ndarray,
+        phrases_by_weight: list[str],
+        quote_from: int,
+        total: int,
+        lift: float | None = None,
+    ) -> Theme:
+        keyphrases = _distinct(phrases_by_weight, 3)
+        sentiments = Counter(self.sentiments[i] for i in members.tolist())
+        return Theme(
+            label=keyphrases[0] if keyphrases else "",
+            keyphrases=keyphrases,
+            count=len(members),
+            share_pct=round(100 * len(members) / total, 1) if total else 0.0,
+            quote=_quote(self.texts[quote_from], keyphrases[0] if keyphrases else ""),
+            lift=lift,
+            **{label: sentiments[label] for label in SENTIMENTS},
+        )
+
+    def themes(self, k: int = 6, seed: int = 0) -> list[Theme]:
+        """Up to ``k`` themes, most common first."""
+        n = len(self.docs)
+        if n == 0:
+            return []
+        vocabulary, X = self._matrix()
+        if not vocabulary:
+            return []
+        # Responses sharing no phrase with any other stay out of the clusters
+        rows = np.flatnonzero(X.any(axis=1))
+        if not len(rows):
+            return []
+        fitted = rows
+        if len(rows) > self.max_fit:
+            rng = np.random.default_rng(seed)
+            fitted = np.sort(rng.choice(rows, self.max_fit, replace=False))
+        # Best of a few seedings: one k-means++ start often merges two themes
+        k = min(k, max(1, len(fitted) // 2))
+        labels, dist = min(
+            (kmeans(X[fitted], k, seed=seed + r) for r in range(self.restarts)),
+            key=lambda fit: fit[1].sum(),
+        )
+        if len(fitted) < len(rows):
+            labels, dist = _assign(X[rows], X[fitted], labels)
+        share = np.array([self.df[t] for t in vocabulary]) / n
+        # Longer phrases say more, so near-ties go to them
+        length_bonus = np.array([1 + 0.1 * (len(t.split()) - 1) for t in vocabulary])
+        themes = []
+        for c in range(labels.max() + 1):
+            in_cluster = np.flatnonzero(labels == c)
+            if not len(in_cluster):
+                continue
+            # A label should be used across the cluster and less elsewhere:
+            # its term of the KL divergence of the cluster from the crowd
+            coverage = (X[rows[in_cluster]] > 0).mean(axis=0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                weights = np.where(
+                    coverage > 0, coverage * np.log(coverage / share), 0.0
+                )
+            weights *= length_bonus
+            order = [vocabulary[j] for j in np.argsort(-weights)[:20] if weights[j] > 0]
+            typical = int(rows[in_cluster[dist[in_cluster].argmin()]])
+            themes.append(self._theme(rows[in_cluster], order, typical, n))
+        return sorted(themes, key=lambda t: -t.count)
+
+    def segment_themes(self, tag: str, k: int = 3, min_count: int = 2) -> list[Theme]:
+        """Phrases distinctive of the responses tagged ``tag``.
+
+        Each phrase is scored by the z-score of the log-odds ratio of a tagged
+        response using it against an untagged one (with a +0.5 prior), so
+        phrases everyone uses score low however common they are.
+        """
+        members = self.tagged.get(tag, [])
+        n_in, n_out = len(members), len(self.docs) - len(members)
+        if n_in == 0 or n_out == 0:
+            return []
+        df_in: Counter = Counter()
+        for i in members:
+            df_in.update(self.docs[i].keys())
+        terms = [t for t, count in df_in.items() if count >= min_count]
+        if not terms:
+            return []
+        y_in = np.array([df_in[t] for t in terms], dtype=np.float64) + 0.5
+        y_out = np.array([self.df[t] - df_in[t] for t in terms], dtype=np.float64) + 0.5
+        not_in, not_out = n_in + 1 - y_in, n_out + 1 - y_out
+        delta = np.log(y_in / not_in) - np.log(y_out / not_out)
+        z = delta / np.sqrt(1 / y_in + 1 / not_in + 1 / y_out + 1 / not_out)
+        ranked = [terms[j] for j in np.argsort(-z) if z[j] > 0]
+
+        member_set = np.array(members)
+        themes = []
+        for phrase in _distinct(ranked, k):
+            using = member_set[[phrase in self.docs[i] for i in members]]
+            # Quote the tagged response that leans on the phrase most
+            quote_from = int(max(using.tolist(), key=lambda i: self.docs[i][phrase]))
+            share_in = len(using) / n_in
+            share_out = (self.df[phrase] - len(using)) / n_out
+            lift = round(share_in / share_out, 2) if share_out else None
+            theme = self._theme(using, [phrase], quote_from, n_in, lift)
+            themes.append(theme)
+        return themes
+
+    def all_segment_themes(self, k: int = 3, min_responses: int = 5) -> dict:
+        """segment_themes for every tag with at least ``min_responses``.
+
+        Tags every response carries have nothing to contrast with and are
+        left out.
+        """
+        return {
+            tag: self.segment_themes(tag, k)
+            for tag, members in sorted(self.tagged.items(), key=lambda t: -len(t[1]))
+            if min_responses <= len(members) < len(self.docs)
+        }
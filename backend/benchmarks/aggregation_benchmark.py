@@ -0,0 +1,122 @@
+"""Benchmark: row-by-row purchase aggregation vs the columnar NumPy path.
+
+Run from backend/:
+
+    python -m benchmarks.aggregation_benchmark [--customers 20000] [--repeat 3]
+
+Times loading a synthetic transactions CSV and building every customer's
+purchase summary and segment features, which is the whole conversion minus
+writing the persona files.
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from convert_real_data import (  # noqa: E402
+    CSV_COLUMNS,
+    PurchaseAggregate,
+    build_purchase_summary,
+    customer_features,
+    load_and_group_data,
+    load_columnar,
+)
+
+_GROUPS = ["Garment Upper body", "Garment Lower body", "Garment Full body", "Shoes"]
+_COLOURS = ["Black", "White", "Dark Blue", "Beige", "Grey", "Red", "Light Pink"]
+_DEPARTMENTS = ["Jersey Basic", "Trousers", "Dresses", "Knitwear", "Shoes", "Denim"]
+
+
+def write_transactions(path: str, n_customers: int, seed: int = 0) -> int:
+    """Synthetic transactions in the real CSV's layout. Returns the row count."""
+    rng = random.Random(seed)
+    n_rows = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for c in range(n_customers):
+            cid = f"{c:064x}"
+            age = f"{rng.randint(18, 70)}.0"
+            for _ in range(rng.randint(1, 30)):
+                writer.writerow(
+                    [
+                        cid,
+                        f"Customer {c} likes simple, practical clothes.",
+                        age,
+                        "ACTIVE",
+                        f"Item {rng.randint(1, 5000)}",
+                        rng.choice(["T-shirt", "Trousers", "Dress", "Sweater"]),
+                        rng.choice(_GROUPS),
+                        rng.choice(_COLOURS),
+                        "Dark",
+                        rng.choice(_DEPARTMENTS),
+                        "Ladieswear",
+                        "Womens Everyday Basics",
+                        "Jersey Basic",
+                        "Soft cotton jersey.",
+                        f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/"
+                        f"{rng.choice([2018, 2019, 2020])}",
+                        f"{rng.uniform(0.005, 0.1):.4f}",
+                        rng.choice(["1", "2"]),
+                    ]
+                )
+                n_rows += 1
+    return n_rows
+
+
+def rows_path(csv_path: str) -> list:
+    grouped = load_and_group_data(csv_path)
+    results = []
+    for data in grouped.values():
+        data["aggregate"] = PurchaseAggregate.from_purchases(data["purchases"])
+        results.append(
+            (build_purchase_summary(data["aggregate"]), customer_features(data))
+        )
+    return results
+
+
+def columnar_path(csv_path: str) -> list:
+    return [
+        (build_purchase_summary(data["aggregate"]), customer_features(data))
+        for data in load_columnar(csv_path).values()
+    ]
+
+
+def _best_of(repeat: int, fn, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "transactions.csv")
+        n_rows = write_transactions(path, args.customers)
+        assert rows_path(path) == columnar_path(path)
+        timings = {
+            "rows (PurchaseAggregate.add)": _best_of(args.repeat, rows_path, path),
+            "columnar (aggregate_columns)": _best_of(args.repeat, columnar_path, path),
+        }
+
+    baseline = timings["rows (PurchaseAggregate.add)"]
+    print(f"{args.customers} customers, {n_rows} rows, best of {args.repeat}")
+    for name, seconds in timings.items():
+        print(f"  {name:<30} {seconds:7.2f} s   {baseline / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
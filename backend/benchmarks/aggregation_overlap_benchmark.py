@@ -0,0 +1,163 @@
+"""Benchmark: time from the last agent's answer to finished insights.
+
+Run from backend/:
+
+    python -m benchmarks.aggregation_overlap_benchmark [--agents 200 2000 10000]
+
+Agents are made to answer evenly over --run-seconds, in random order.
+Insights (executive summary, an analysis per segment and key themes) are
+then produced three ways: one step after another once the last agent is
+in; all at once, in parallel, once the last agent is in (aggregate_all);
+and alongside the agents, fed as they answer (AggregationScheduler, with a
+draft summary at --draft-at). For the last, the draft column says how long
+before (-) or after the last answer the draft was ready.
+
+API calls are modelled as in summary_latency_benchmark. They run on an
+event loop whose clock jumps to the next timer whenever it would wait
+(unless a worker thread is busy), so modelled time costs no real time while
+the aggregator's own CPU time is counted in full.
+"""
+
+import argparse
+import asyncio
+import selectors
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.services.aggregator import AggregationBudget, AggregationScheduler
+from app.services.themes import ThemeExtractor
+from benchmarks.summary_latency_benchmark import _aggregator, make_responses
+
+PRODUCT = "Linen shirts"
+
+
+class _CountingExecutor(ThreadPoolExecutor):
+    def __init__(self) -> None:
+        super().__init__()
+        self.busy = 0
+
+    def submit(self, *args, **kwargs) -> Future:
+        self.busy += 1
+        future = super().submit(*args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future) -> None:
+        self.busy -= 1
+
+
+class _JumpingSelector(selectors.DefaultSelector):
+    def __init__(self, executor: _CountingExecutor) -> None:
+        super().__init__()
+        self.executor = executor
+        self.loop: "_VirtualClockLoop | None" = None
+
+    def select(self, timeout: float | None = None) -> list:
+        ready = super().select(0)
+        if ready or not timeout or timeout < 0 or self.executor.busy:
+            # Ready, nothing scheduled, or a thread at work: wait for real
+            return ready or super().select(timeout)
+        self.loop.offset += timeout
+        return []
+
+
+class _VirtualClockLoop(asyncio.SelectorEventLoop):
+    def __init__(self) -> None:
+        executor = _CountingExecutor()
+        selector = _JumpingSelector(executor)
+        super().__init__(selector)
+        selector.loop = self
+        self.set_default_executor(executor)
+        self.offset = 0.0
+
+    def time(self) -> float:
+        return super().time() + self.offset
+
+
+async def _answers(responses: list, gap: float):
+    for response in responses:
+        await asyncio.sleep(gap)
+        yield response
+
+
+async def _one_after_another(aggregator, responses: list, gap: float):
+    loop = asyncio.get_running_loop()
+    async for _ in _answers(responses, gap):
+        pass
+    last = loop.time()
+    await aggregator.generate_executive_summary(responses, PRODUCT)
+    for segment in Counter(r.segment for r in responses):
+        members = [r for r in responses if r.segment == segment]
+        await aggregator.analyze_segment(segment, members, PRODUCT)
+    extractor = ThemeExtractor()
+    for response in responses:
+        extractor.add(response)
+    extractor.themes()
+    return loop.time() - last, None
+
+
+async def _after_all(aggregator, responses: list, gap: float):
+    loop = asyncio.get_running_loop()
+    async for _ in _answers(responses, gap):
+        pass
+    last = loop.time()
+    await aggregator.aggregate_all(responses, PRODUCT)
+    return loop.time() - last, None
+
+
+async def _alongside(aggregator, responses: list, gap: float, draft_at: float):
+    loop = asyncio.get_running_loop()
+    drafted = []
+
+    async def on_draft(results: object) -> None:
+        drafted.append(loop.time())
+
+    scheduler = AggregationScheduler(
+        aggregator,
+        PRODUCT,
+        Counter(r.segment for r in responses),
+        draft_at=draft_at or None,
+        on_draft=on_draft,
+    )
+    async for response in _answers(responses, gap):
+        scheduler.add(response)
+    last = loop.time()
+    await scheduler.finish()
+    return loop.time() - last, (drafted[0] - last if drafted else None)
+
+
+def _run(pipeline, args: argparse.Namespace, n: int) -> tuple[float, int, object]:
+    """Seconds from the last answer to insights, calls made and draft time."""
+    aggregator = _aggregator(AggregationBudget(), args.concurrency, 1.0)
+    with asyncio.Runner(loop_factory=_VirtualClockLoop) as runner:
+        elapsed, draft = runner.run(pipeline(aggregator, args.run_seconds / n))
+    return elapsed, len(aggregator.client.calls), draft
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, nargs="+", default=[200, 2000, 10000])
+    parser.add_argument("--run-seconds", type=float, default=120.0)
+    parser.add_argument("--draft-at", type=float, default=0.9)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    for n in args.agents:
+        responses = make_responses(n)
+        serial, _, _ = _run(
+            lambda agg, gap: _one_after_another(agg, responses, gap), args, n
+        )
+        after, _, _ = _run(lambda agg, gap: _after_all(agg, responses, gap), args, n)
+        along, calls, draft = _run(
+            lambda agg, gap: _alongside(agg, responses, gap, args.draft_at), args, n
+        )
+        drafted = f"{draft:+6.1f}s" if draft is not None else "   none"
+        print(
+            f"{n:>6} agents  one after another {serial:6.1f}s  "
+            f"after the run {after:6.1f}s  alongside {along:6.1f}s "
+            f"(draft {drafted}, {calls} calls)"
+        )
+
+
+if __name__ == "__main__":
+    main()
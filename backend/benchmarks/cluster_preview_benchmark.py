@@ -0,0 +1,114 @@
+"""Benchmark: cluster preview runs against the full crowd.
+
+Run from backend/:
+
+    python -m benchmarks.cluster_preview_benchmark [--clusters 20 40 60]
+
+Uses the checked-in personas and an offline client whose answer depends on
+the persona's age band and shopping frequency (plus per-persona noise), so
+the full-crowd split is known and each preview's error can be measured.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import shutil
+import tempfile
+
+from app.services.agent_runner import AgentRunner
+from app.services.persona_clusters import cluster_directory
+from app.services.persona_registry import PersonaRegistry
+from app.services.sampling import (
+    breakdown_error,
+    segment_breakdown,
+    sentiment_breakdown,
+    stratum_of,
+)
+from tests.fakes import FakeAnthropic, make_message
+
+PROCESSED_DIR = "data/processed"
+
+_LEANING = {"young_adult": 0.8, "adult": 0.6, "mature": 0.4, "senior": 0.25}
+_ANSWERS = {
+    "positive": "I love this, great value and I would definitely buy it.",
+    "neutral": "It's okay I guess, nothing special either way.",
+    "negative": "Overpriced and poor quality, disappointing.",
+}
+
+
+def sentiment_of(entry: dict, profile_id: str) -> str:
+    """Deterministic answer: mostly set by the stratum, with some noise."""
+    band, _, frequency = stratum_of(entry).partition("/")
+    p = _LEANING[band] + (0.1 if frequency == "frequent_shopper" else 0)
+    u = int(hashlib.sha256(profile_id.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    if u < p:
+        return "positive"
+    return "neutral" if u < p + 0.15 else "negative"
+
+
+def _runner(registry: PersonaRegistry) -> tuple[AgentRunner, FakeAnthropic]:
+    answers = {
+        p.text[:200]: sentiment_of(p.entry, p.profile_id) for p in registry.all()
+    }
+    fake = FakeAnthropic()
+
+    async def create(**kwargs: object) -> object:
+        fake.calls.append(kwargs)
+        system = str(kwargs["system"])
+        label = next(a for head, a in answers.items() if head in system)
+        return make_message(_ANSWERS[label])
+
+    fake.messages.create = create
+    runner = AgentRunner(api_key="bench", registry=registry)
+    runner.client = fake
+    runner.streaming = False
+    runner.response_cache = None
+    return runner, fake
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clusters", type=int, nargs="+", default=[20, 40, 60])
+    parser.add_argument("--representatives", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        shutil.copytree(PROCESSED_DIR, tmpdir, dirs_exist_ok=True)
+        registry = PersonaRegistry(tmpdir)
+        registry.load()
+
+        runner, fake = _runner(registry)
+        full = asyncio.run(runner.run_all_agents("Linen shirts"))
+        full_split = sentiment_breakdown(full)
+        full_segments = segment_breakdown(full)
+        print(
+            f"full crowd: {len(fake.calls)} calls, positive "
+            f"{full_split.positive_pct}% / negative {full_split.negative_pct}%"
+        )
+
+        for k in args.clusters:
+            cluster_directory(tmpdir, k)
+            runner, fake = _runner(registry)
+            preview = asyncio.run(
+                runner.run_all_agents(
+                    "Linen shirts", representatives=args.representatives
+                )
+            )
+            split = sentiment_breakdown(preview)
+            segments = segment_breakdown(preview)
+            segment_error = max(
+                breakdown_error(segments[s], full_segments[s]) for s in segments
+            )
+            low, high = split.positive_interval
+            covered = "covers" if low <= full_split.positive_pct <= high else "misses"
+            print(
+                f"k={k:<3} {len(fake.calls):>4} calls "
+                f"({len(full) / len(fake.calls):.1f}x fewer)  positive "
+                f"{split.positive_pct:5.1f}% [{low}, {high}] {covered} the crowd  "
+                f"error {breakdown_error(split, full_split):4.1f} pts overall, "
+                f"{segment_error:4.1f} pts worst segment"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark: prompt tokens of a crowd's responses before and after compaction.
+
+Run from backend/:
+
+    python -m benchmarks.compaction_benchmark [--agents 1000 10000] [--budget 200000]
+
+Crowds larger than the persona pool repeat personas, whose answers then
+differ only in filler and a word or two. For each crowd size, prints the
+estimated prompt tokens of every response as formatted before compaction,
+after dropping failed agents and filler, after collapsing near-duplicates
+and after fitting the budget, with the time taken and how many of the
+crowd's (segment, sentiment) groups are still quoted.
+"""
+
+import argparse
+import random
+import time
+
+from app.models.schemas import AgentResponse
+from app.services.compaction import (
+    collapse,
+    format_response,
+    quote_responses,
+    quote_tokens,
+    select,
+)
+from app.services.rate_limiter import estimate_tokens
+
+_SEGMENTS = ["young_adult", "adult", "mature", "senior"]
+_OPENERS = ["", "", "Honestly, ", "Well, ", "Hmm, ", "To be honest, "]
+_TOPICS = [
+    "the linen looks breathable and right for summer",
+    "the price feels steep next to what I pay on the high street",
+    "I worry the sizing runs small like most slim fits",
+    "the colours are muted in a way I really like",
+    "I would want to see the stitching up close before buying",
+    "it reminds me of a shirt my father wore",
+    "delivery costs would put me off ordering online",
+    "I like that it can be dressed up or down for work",
+]
+
+
+def make_responses(n: int, personas: int = 198, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    pool = []
+    for p in range(personas):
+        topics = rng.sample(_TOPICS, 3)
+        pool.append(
+            (
+                rng.choice(_SEGMENTS),
+                rng.randint(18, 80),
+                rng.choice(["positive", "neutral", "negative"]),
+                f"As someone who {rng.choice(['cycles', 'gardens', 'travels'])} a "
+                f"lot, {topics[0]}, and {topics[1]}. Also {topics[2]}.",
+            )
+        )
+    responses = []
+    for i in range(n):
+        segment, age, sentiment, text = pool[i % personas]
+        words = text.split()
+        if rng.random() < 0.5:
+            del words[rng.randrange(len(words))]
+        status = rng.choices(["ok", "error", "timed_out"], weights=[96, 3, 1])[0]
+        responses.append(
+            AgentResponse(
+                agent_id=f"a{i}",
+                profile_name=f"Customer {i}",
+                age=age,
+                segment=segment,
+                response_text=(
+                    rng.choice(_OPENERS) + " ".join(words)
+                    if status == "ok"
+                    else f"[Error: {status}]"
+                ),
+                sentiment=sentiment,
+                response_time_ms=1.0,
+                status=status,
+            )
+        )
+    return responses
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--budget", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for n in args.agents:
+        responses = make_responses(n)
+        raw = sum(estimate_tokens(format_response(r)) + 1 for r in responses)
+        start = time.perf_counter()
+        quotes = quote_responses(responses)
+        trimmed = sum(quote_tokens(q) for q in quotes)
+        collapsed = collapse(quotes)
+        folded = sum(quote_tokens(q) for q in collapsed)
+        kept = select(collapsed, args.budget)
+        elapsed = time.perf_counter() - start
+        final = sum(quote_tokens(q) for q in kept)
+        groups = {(r.segment, r.sentiment) for r in responses if r.status == "ok"}
+        quoted = {(q.response.segment, q.response.sentiment) for q in kept}
+        print(
+            f"{n:>6} agents  {raw:>8} tokens  trimmed {trimmed:>8}  "
+            f"collapsed {folded:>7} ({len(collapsed)} quotes)  "
+            f"budgeted {final:>7} ({len(kept)} quotes)  "
+            f"groups quoted {len(quoted)}/{len(groups)}  {elapsed:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark: live tallies against recomputing breakdowns from all responses.
+
+Run from backend/:
+
+    python -m benchmarks.live_aggregation_benchmark [--agents 1000 10000 100000]
+
+For each crowd size, times feeding every response to a LiveAggregator, one
+snapshot, and the two-pass equivalent (sentiment_breakdown plus
+segment_breakdown over the whole list) that the final snapshot replaces.
+"""
+
+import argparse
+import random
+import time
+
+from app.models.schemas import AgentResponse
+from app.services.live_aggregator import LiveAggregator
+from app.services.sampling import segment_breakdown, sentiment_breakdown
+
+_SEGMENTS = ["young_adult", "adult", "mature", "senior"]
+
+
+def make_responses(n: int, seed: int = 0) -> list[AgentResponse]:
+    rng = random.Random(seed)
+    return [
+        AgentResponse(
+            agent_id=f"a{i}",
+            profile_name=f"Customer {i}",
+            age=rng.randint(18, 80),
+            segment=rng.choice(_SEGMENTS),
+            response_text="",
+            sentiment=rng.choice(["positive", "neutral", "negative"]),
+            response_time_ms=rng.lognormvariate(8, 0.5),
+            status=rng.choices(["ok", "error", "timed_out"], weights=[97, 2, 1])[0],
+        )
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    for n in args.agents:
+        responses = make_responses(n)
+        live = LiveAggregator()
+        live.expect({"": n})
+        start = time.perf_counter()
+        for response in responses:
+            live.add(response)
+        added = time.perf_counter() - start
+
+        start = time.perf_counter()
+        live.snapshot(final=True)
+        snapshot = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sentiment_breakdown(responses)
+        segment_breakdown(responses)
+        full_pass = time.perf_counter() - start
+
+        print(
+            f"{n:>7} agents  add {added / n * 1e6:5.2f} us/response  "
+            f"snapshot {snapshot * 1000:6.3f} ms  "
+            f"full pass {full_pass * 1000:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Benchmark: loading personas from loose files vs the packed store.
+
+Run from backend/:
+
+    python -m benchmarks.persona_store_benchmark [--personas 50000]
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.persona_registry import PersonaRegistry
+from app.services.persona_store import pack_directory
+
+_SENTENCES = [
+    "I shop mostly for comfortable basics I can wear to work and on weekends.",
+    "Price matters to me, but I will pay more for fabrics that last.",
+    "I usually buy online and return anything that does not fit well.",
+    "Neutral colours are my go-to, with the odd bright accessory.",
+    "Sustainability is something I think about more every year.",
+]
+
+
+def write_processed_dir(path: Path, n: int, seed: int = 0) -> None:
+    """n loose persona files of ~1.5 KB plus their manifest."""
+    rng = random.Random(seed)
+    manifest = {}
+    for i in range(n):
+        profile_id = f"{i:064x}"
+        text = " ".join(rng.choices(_SENTENCES, k=20))
+        filename = f"persona_{i:05d}.txt"
+        (path / filename).write_text(text)
+        manifest[profile_id] = {
+            "persona_file": filename,
+            "display_name": f"Persona {i}",
+            "age": rng.randint(18, 70),
+            "segments": rng.sample(["young_adult", "adult", "tops_buyer"], 2),
+        }
+    (path / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--personas", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        loose_dir, packed_dir = Path(tmpdir, "loose"), Path(tmpdir, "packed")
+        loose_dir.mkdir()
+        packed_dir.mkdir()
+        write_processed_dir(loose_dir, args.personas)
+        pack_seconds = _timed(
+            lambda: pack_directory(loose_dir, packed_dir / "personas.pack")
+        )
+
+        loose = PersonaRegistry(str(loose_dir))
+        packed = PersonaRegistry(str(packed_dir))
+        timings = {
+            "loose files: load": _timed(loose.load),
+            "packed: load (mmap)": _timed(packed.load),
+        }
+        ids = [p.profile_id for p in loose.all(limit=1000)]
+        timings["loose files: 1000 lookups"] = _timed(
+            lambda: [loose.get(i) for i in ids]
+        )
+        timings["packed: 1000 lookups"] = _timed(lambda: [packed.get(i) for i in ids])
+        timings["packed: decode all"] = _timed(packed.all)
+
+    print(f"{args.personas} personas (packing took {pack_seconds:.2f} s)")
+    for name, seconds in timings.items():
+        print(f"  {name:<28} {seconds * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark: profile loading modes against the original loader.
+
+Run from backend/:
+
+    python -m benchmarks.profile_loading_benchmark [--profiles 10000]
+
+The fixture is the checked-in profiles, copied with fresh ids and a purchase
+history padded to 20-120 items per customer (heavy shoppers are where
+validation cost shows).
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.models.profile import CustomerProfile
+from app.services.profile_builder import load_raw_profiles, profile_paths
+
+PROFILES_DIR = Path(__file__).resolve().parent.parent / "data" / "profiles"
+
+
+def legacy_load_raw_profiles(data_dir: str) -> list[CustomerProfile]:
+    """The original loader: json.load, then CustomerProfile(**data), serially."""
+    profiles = []
+    for file_path in profile_paths(data_dir):
+        with open(file_path) as f:
+            data = json.load(f)
+        profiles.append(CustomerProfile(**data))
+    return profiles
+
+
+def write_fixture(path: Path, n: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    templates = [json.loads(p.read_text()) for p in profile_paths(str(PROFILES_DIR))]
+    for i in range(n):
+        profile = dict(rng.choice(templates))
+        profile["customer_id"] = f"BENCH-{i:06d}"
+        items = profile["purchase_history"] or [
+            {"category": "Womens", "price": 19.99, "date": "2024-01-01"}
+        ]
+        profile["purchase_history"] = [
+            dict(rng.choice(items), item_id=f"HM-{rng.randrange(10**7):07d}")
+            for _ in range(rng.randint(20, 120))
+        ]
+        (path / f"customer_{i:06d}.json").write_text(json.dumps(profile, indent=2))
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_fixture(Path(tmpdir), args.profiles)
+        modes = {
+            "legacy (json.load + **data)": lambda: legacy_load_raw_profiles(tmpdir),
+            "model_validate_json, serial": lambda: load_raw_profiles(
+                tmpdir, io_workers=1
+            ),
+            "model_validate_json, 4 readers": lambda: load_raw_profiles(
+                tmpdir, io_workers=4
+            ),
+        }
+        timings = {name: _best_of(args.repeat, fn) for name, fn in modes.items()}
+
+    baseline = timings["legacy (json.load + **data)"]
+    print(f"{args.profiles} profiles, best of {args.repeat}")
+    for name, seconds in timings.items():
+        print(f"  {name:<32} {seconds:7.2f} s   {baseline / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark: targeted persona selection through the segment index.
+
+Run from backend/:
+
+    python -m benchmarks.segment_index_benchmark [--personas 100000]
+
+Compares resolving a query with the bitmap index against scanning every
+manifest entry, and reports the one-off cost of building the index.
+"""
+
+import argparse
+import random
+import time
+
+from app.services.segment_index import SegmentIndex, SegmentQuery, parse_expression
+
+_AGE_SEGMENTS = [(17, 25, "young_adult"), (26, 45, "adult"), (46, 60, "mature")]
+_SHOPPERS = ["occasional_shopper", "regular_shopper", "frequent_shopper"]
+_BUYERS = ["tops_buyer", "bottoms_buyer", "fullbody_buyer"]
+
+QUERIES = {
+    "one segment": SegmentQuery(segments=("frequent_shopper",)),
+    "AND NOT + age + club": SegmentQuery(
+        segments=("adult AND tops_buyer AND NOT bottoms_buyer",),
+        age_min=30,
+        age_max=40,
+        club_member_status=("ACTIVE",),
+    ),
+    "narrow (~0.5%)": SegmentQuery(
+        segments=("senior AND fullbody_buyer AND frequent_shopper",),
+        club_member_status=("PRE-CREATE",),
+    ),
+}
+
+
+def make_entries(n: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    entries = []
+    for _ in range(n):
+        age = rng.randint(17, 85)
+        band = next((s for lo, hi, s in _AGE_SEGMENTS if lo <= age <= hi), "senior")
+        entries.append(
+            {
+                "age": age,
+                "segments": [band, rng.choice(_SHOPPERS)]
+                + rng.sample(_BUYERS, rng.randint(1, 3)),
+                "club_member_status": rng.choices(
+                    ["ACTIVE", "PRE-CREATE"], weights=[12, 1]
+                )[0],
+            }
+        )
+    return entries
+
+
+def scan(entries: list[dict], query: SegmentQuery) -> list[int]:
+    """The index-free baseline: test every entry against the query."""
+
+    def matches(node: tuple, segments: set[str]) -> bool:
+        kind = node[0]
+        if kind == "seg":
+            return node[1] in segments
+        if kind == "not":
+            return not matches(node[1], segments)
+        if kind == "and":
+            return matches(node[1], segments) and matches(node[2], segments)
+        return matches(node[1], segments) or matches(node[2], segments)
+
+    trees = [parse_expression(e) for e in query.segments]
+    lo = query.age_min if query.age_min is not None else -1
+    hi = query.age_max if query.age_max is not None else 1 << 31
+    out = []
+    for i, entry in enumerate(entries):
+        segments = set(entry["segments"])
+        if trees and not any(matches(t, segments) for t in trees):
+            continue
+        if not lo <= entry["age"] <= hi:
+            continue
+        if (
+            query.club_member_status
+            and entry["club_member_status"] not in query.club_member_status
+        ):
+            continue
+        out.append(i)
+    return out
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--personas", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    entries = make_entries(args.personas)
+    start = time.perf_counter()
+    index = SegmentIndex(entries)
+    build = time.perf_counter() - start
+
+    print(f"{args.personas} personas (index built in {build * 1000:.0f} ms)")
+    print(f"  {'query':<22} {'matches':>8} {'index':>10} {'scan':>10}")
+    for name, query in QUERIES.items():
+        selected = index.select(query)
+        assert selected == scan(entries, query)
+        indexed = _best_of(args.repeat, lambda: index.select(query))
+        scanned = _best_of(3, lambda: scan(entries, query))
+        print(
+            f"  {name:<22} {len(selected):>8} {indexed * 1000:>7.3f} ms"
+            f" {scanned * 1000:>7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
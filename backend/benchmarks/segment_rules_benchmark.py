@@ -0,0 +1,109 @@
+"""Benchmark: re-segmenting a large customer base from declarative rules.
+
+Run from backend/:
+
+    python -m benchmarks.segment_rules_benchmark [--customers 100000]
+
+Builds a synthetic processed directory (manifest.json plus personas.pack
+with short texts) and times compiling the default rules, evaluating them
+over every customer, and a full in-place resegment_directory run.
+"""
+
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.persona_store import STORE_FILENAME, write_store
+from app.services.segment_rules import (
+    FeatureTable,
+    SegmentRules,
+    assign_segments,
+    resegment_directory,
+)
+
+_GROUPS = [
+    "Garment Upper body",
+    "Garment Lower body",
+    "Garment Full body",
+    "Underwear",
+    "Shoes",
+    "Accessories",
+]
+
+
+def make_manifest(n: int, seed: int = 0) -> dict[str, dict]:
+    rng = random.Random(seed)
+    manifest = {}
+    for i in range(n):
+        count = rng.randint(1, 60)
+        groups = rng.sample(_GROUPS, rng.randint(1, 4))
+        categories = dict.fromkeys(groups, 0)
+        for _ in range(count):
+            categories[rng.choice(groups)] += 1
+        manifest[f"{i:012x}"] = {
+            "persona_file": f"{i:012x}.txt",
+            "display_name": f"Customer {i}",
+            "age": rng.randint(17, 85),
+            "purchase_count": count,
+            "segments": [],
+            "club_member_status": rng.choices(
+                ["ACTIVE", "PRE-CREATE"], weights=[12, 1]
+            )[0],
+            "features": {
+                "total_spent": round(count * rng.uniform(0.01, 0.06), 4),
+                "online_share": round(rng.random(), 4),
+                "categories": {g: c for g, c in categories.items() if c},
+            },
+        }
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=100_000)
+    args = parser.parse_args()
+
+    manifest = make_manifest(args.customers)
+
+    start = time.perf_counter()
+    rules = SegmentRules.load()
+    compiled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = FeatureTable(list(manifest.values()))
+    tabled = time.perf_counter() - start
+    start = time.perf_counter()
+    rules.masks(table)
+    masked = time.perf_counter() - start
+    start = time.perf_counter()
+    counts = assign_segments(manifest, rules)
+    assigned = time.perf_counter() - start
+
+    print(f"{args.customers} customers, {len(rules.names)} rules")
+    print(f"  compile rules        {compiled * 1000:8.2f} ms")
+    print(f"  build feature table  {tabled * 1000:8.2f} ms")
+    print(f"  evaluate masks       {masked * 1000:8.2f} ms")
+    print(f"  assign segments      {assigned * 1000:8.2f} ms")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(Path(tmpdir, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2)
+        write_store(
+            Path(tmpdir, STORE_FILENAME),
+            (
+                (cid, f"Persona of {e['display_name']}.", e)
+                for cid, e in manifest.items()
+            ),
+        )
+        start = time.perf_counter()
+        resegment_directory(tmpdir, rules)
+        print(f"  resegment directory  {time.perf_counter() - start:8.2f} s")
+
+    print("  " + ", ".join(f"{n} {name}" for name, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Micro-benchmark: compiled sentiment matcher vs the original substring scan.
+
+Run from backend/:
+
+    python -m benchmarks.sentiment_benchmark [--responses 10000] [--repeat 5]
+"""
+
+import argparse
+import random
+import time
+
+from app.services.sentiment import (
+    NEGATIVE_PHRASES,
+    POSITIVE_PHRASES,
+    detect_sentiment,
+    detect_sentiment_batch,
+)
+
+_FILLER = (
+    "honestly the fit looks fine and the colours are nice enough for everyday "
+    "wear although I usually shop for basics and tend to keep things simple "
+    "when it comes to my wardrobe so this would depend on the price point"
+).split()
+
+
+def legacy_detect_sentiment(text: str) -> str:
+    """The original implementation: one substring scan per keyword."""
+    lower = text.lower()
+    pos_count = sum(1 for w in POSITIVE_PHRASES if w in lower)
+    neg_count = sum(1 for w in NEGATIVE_PHRASES if w in lower)
+    if pos_count > neg_count:
+        return "positive"
+    elif neg_count > pos_count:
+        return "negative"
+    return "neutral"
+
+
+def make_responses(n: int, seed: int = 0) -> list[str]:
+    """Synthetic agent answers of ~60-120 words with a few keywords mixed in."""
+    rng = random.Random(seed)
+    keywords = POSITIVE_PHRASES + NEGATIVE_PHRASES + ["not", "don't"]
+    responses = []
+    for _ in range(n):
+        words = rng.choices(_FILLER, k=rng.randint(60, 120))
+        for _ in range(rng.randint(0, 4)):
+            words.insert(rng.randrange(len(words)), rng.choice(keywords))
+        responses.append(" ".join(words).capitalize() + ".")
+    return responses
+
+
+def _best_of(repeat: int, fn, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--responses", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = make_responses(args.responses)
+    timings = {
+        "legacy (substring scans)": _best_of(
+            args.repeat, lambda: [legacy_detect_sentiment(t) for t in texts]
+        ),
+        "detect_sentiment (per text)": _best_of(
+            args.repeat, lambda: [detect_sentiment(t) for t in texts]
+        ),
+        "detect_sentiment_batch": _best_of(args.repeat, detect_sentiment_batch, texts),
+    }
+
+    baseline = timings["legacy (substring scans)"]
+    print(f"{args.responses} responses, best of {args.repeat}")
+    for name, seconds in timings.items():
+        print(f"  {name:<28} {seconds * 1000:8.1f} ms   {baseline / seconds:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
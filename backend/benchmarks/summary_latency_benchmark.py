@@ -0,0 +1,129 @@
+"""Benchmark: executive-summary latency as the crowd grows.
+
+Run from backend/:
+
+    python -m benchmarks.summary_latency_benchmark [--agents 200 1000 5000 20000]
+
+No API calls are made. An offline client sleeps for a modelled call time
+(time to first token growing with the prompt, then the model's output
+rate), scaled down by --time-scale so the run takes seconds. Reported times
+are the scaled-up API time plus the aggregator's own CPU time, measured in
+a separate run without sleeps. Each crowd is summarised once in a single
+call, as the original prompt did, and once with the map-reduce aggregator;
+--concurrency caps parallel calls per summary.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from app.models.schemas import AgentResponse
+from app.services.aggregator import AggregationBudget, InsightAggregator
+from app.services.rate_limiter import estimate_tokens
+from tests.fakes import FakeAnthropic, make_message
+
+CONTEXT_WINDOW = 200_000
+# Output tokens per second, and prompt tokens read per second before the
+# first token
+_OUTPUT_RATE = {"map-model": 60.0, "reduce-model": 25.0}
+_PREFILL_RATE = 20_000.0
+_WORDS = "fit price colour fabric quality style comfort value trend size".split()
+
+
+def make_responses(n: int, seed: int = 0) -> list[AgentResponse]:
+    rng = random.Random(seed)
+    segments = ["young_adult", "adult", "mature", "senior"]
+    return [
+        AgentResponse(
+            agent_id=f"a{i}",
+            profile_name=f"Customer {i}",
+            age=rng.randint(18, 80),
+            segment=rng.choice(segments),
+            response_text=" ".join(rng.choices(_WORDS, k=rng.randint(60, 110))),
+            sentiment=rng.choice(["positive", "neutral", "negative"]),
+            response_time_ms=1.0,
+        )
+        for i in range(n)
+    ]
+
+
+def _aggregator(
+    budget: AggregationBudget, concurrency: int, time_scale: float | None
+) -> InsightAggregator:
+    aggregator = InsightAggregator(
+        api_key="bench",
+        map_model="map-model",
+        reduce_model="reduce-model",
+        budget=budget,
+        max_concurrent=concurrency,
+    )
+    fake = FakeAnthropic()
+
+    async def create(**kwargs: object) -> object:
+        fake.calls.append(kwargs)
+        prompt = kwargs["messages"][0]["content"]
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = int(kwargs["max_tokens"] * 0.6)
+        seconds = 0.5 + input_tokens / _PREFILL_RATE
+        seconds += output_tokens / _OUTPUT_RATE[kwargs["model"]]
+        if time_scale is not None:
+            await asyncio.sleep(seconds / time_scale)
+        # Notes about as long as a real model's, so merges see real sizes
+        return make_message(
+            "- note " * (output_tokens // 2),
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+        )
+
+    fake.messages.create = create
+    aggregator.client = fake
+    return aggregator
+
+
+def _wall(aggregator: InsightAggregator, responses: list) -> float:
+    start = time.perf_counter()
+    asyncio.run(aggregator.generate_executive_summary(responses, "Linen shirts"))
+    return time.perf_counter() - start
+
+
+def _run(
+    budget: AggregationBudget, responses: list, concurrency: int, time_scale: float
+) -> tuple[float, int, int]:
+    """Modelled seconds, number of calls and the largest prompt in tokens."""
+    local = _wall(_aggregator(budget, concurrency, None), responses)
+    aggregator = _aggregator(budget, concurrency, time_scale)
+    elapsed = (_wall(aggregator, responses) - local) * time_scale + local
+    calls = aggregator.client.calls
+    largest = max(estimate_tokens(c["messages"][0]["content"]) for c in calls)
+    return elapsed, len(calls), largest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--agents", type=int, nargs="+", default=[200, 1000, 5000, 20000]
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--time-scale", type=float, default=200.0)
+    args = parser.parse_args()
+
+    single_call = AggregationBudget(direct_input_tokens=10**9)
+    for n in args.agents:
+        responses = make_responses(n)
+        single, _, prompt_tokens = _run(
+            single_call, responses, args.concurrency, args.time_scale
+        )
+        fits = "" if prompt_tokens <= CONTEXT_WINDOW else "  (exceeds context)"
+        staged, calls, largest = _run(
+            AggregationBudget(), responses, args.concurrency, args.time_scale
+        )
+        print(
+            f"{n:>6} agents  single call {single:6.1f}s "
+            f"{prompt_tokens:>9,} tokens{fits:<19}  map-reduce {staged:6.1f}s "
+            f"{calls:>4} calls, largest prompt {largest:,} tokens"
+        )
+
+
+if __name__ == "__main__":
+    main()
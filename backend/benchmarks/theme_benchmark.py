@@ -0,0 +1,88 @@
+"""Benchmark: local theme extraction as the crowd grows.
+
+Run from backend/:
+
+    python -m benchmarks.theme_benchmark [--agents 1000 5000 20000]
+
+Responses are stitched together from a pool of clauses about a dozen
+topics. For each crowd size, times feeding every response to a
+ThemeExtractor (the per-response cost paid while agents answer), then
+clustering them into themes and ranking each segment's distinctive phrases
+(the cost paid once the run is over).
+"""
+
+import argparse
+import random
+import time
+
+from app.models.schemas import AgentResponse
+from app.services.themes import ThemeExtractor
+
+_SEGMENTS = ["young_adult", "adult", "mature", "senior"]
+_TAGS = ["tops_buyer", "bottoms_buyer", "fullbody_buyer"]
+_CLAUSES = [
+    "the price is too high for what it is",
+    "I would wait for a sale before buying",
+    "the linen fabric looks breathable for summer",
+    "I worry the sizing runs small",
+    "the colours are lovely and muted",
+    "it would need to wash well without shrinking",
+    "the fit looks relaxed and comfortable",
+    "delivery and returns need to be free",
+    "the style feels a bit dated for me",
+    "sustainable materials matter to me",
+    "it would go with most of my wardrobe",
+    "the quality looks better than fast fashion",
+]
+
+
+def make_responses(n: int, seed: int = 0) -> list[tuple[AgentResponse, list[str]]]:
+    rng = random.Random(seed)
+    crowd = []
+    for i in range(n):
+        segment = rng.choice(_SEGMENTS)
+        text = ". ".join(c.capitalize() for c in rng.sample(_CLAUSES, 3)) + "."
+        response = AgentResponse(
+            agent_id=f"a{i}",
+            profile_name=f"Customer {i}",
+            age=rng.randint(18, 80),
+            segment=segment,
+            response_text=text,
+            sentiment=rng.choice(["positive", "neutral", "negative"]),
+            response_time_ms=1.0,
+        )
+        crowd.append((response, rng.sample(_TAGS, rng.randint(1, 2))))
+    return crowd
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--themes", type=int, default=6)
+    args = parser.parse_args()
+
+    for n in args.agents:
+        crowd = make_responses(n)
+        extractor = ThemeExtractor()
+        start = time.perf_counter()
+        for response, tags in crowd:
+            extractor.add(response, tags)
+        added = time.perf_counter() - start
+
+        start = time.perf_counter()
+        extractor.themes(args.themes)
+        themes = time.perf_counter() - start
+
+        start = time.perf_counter()
+        extractor.all_segment_themes()
+        segments = time.perf_counter() - start
+
+        print(
+            f"{n:>6} agents  add {added / n * 1e6:6.1f} us/response  "
+            f"themes {themes * 1000:8.1f} ms  "
+            f"segment themes {segments * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
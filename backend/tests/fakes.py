@@ -0,0 +1,300 @@
+"""Local stand-ins for the Anthropic API and fixture data for offline tests."""
+
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+from collections.abc import AsyncIterator, Callable
+from types import SimpleNamespace
+from typing import Any
+
+import anthropic
+from fastapi import Body, FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+from app.services.agent_runner import AgentRunner
+from app.services.persona_registry import PersonaRegistry
+
+try:
+    import httpx2 as httpx
+except ImportError:  # anthropic releases built on plain httpx
+    import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from convert_real_data import CSV_COLUMNS  # noqa: E402
+
+PROCESSED_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "processed")
+BATCH_SERVER_URL = "http://batches.test"
+DEFAULT_REPLY = "I love this, would definitely buy it!"
+
+
+def make_message(
+    text: str,
+    input_tokens: int = 100,
+    output_tokens: int = 50,
+    cache_creation_input_tokens: int = 0,
+    cache_read_input_tokens: int = 0,
+) -> SimpleNamespace:
+    return SimpleNamespace(
+        content=[SimpleNamespace(type="text", text=text)],
+        usage=SimpleNamespace(
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_creation_input_tokens=cache_creation_input_tokens,
+            cache_read_input_tokens=cache_read_input_tokens,
+        ),
+    )
+
+
+class BatchServer:
+    """The Message Batches endpoints, served locally over HTTP.
+
+    ``client()`` returns a real AsyncAnthropic wired to it, so submitting,
+    polling and reading results go through the SDK's requests and JSONL
+    decoding. Batches report ``in_progress`` for ``polls_until_ended``
+    retrieves, then ``ended``; each reply is built by ``respond``. Requests
+    whose custom_id is in ``errored_ids`` come back as errored, and status
+    codes queued in ``fail_next`` are returned, one per request, first.
+    """
+
+    def __init__(self, respond: Callable[[dict], SimpleNamespace] | None = None):
+        self.respond = respond or (lambda params: make_message(DEFAULT_REPLY))
+        self.polls_until_ended = 1
+        self.errored_ids: set[str] = set()
+        self.fail_next: list[int] = []
+        self.batches: dict[str, list[dict]] = {}
+        self.polls: dict[str, int] = {}
+        self.app = self._build_app()
+
+    def client(self) -> anthropic.AsyncAnthropic:
+        return anthropic.AsyncAnthropic(
+            api_key="test",
+            base_url=BATCH_SERVER_URL,
+            max_retries=0,
+            http_client=anthropic.DefaultAsyncHttpxClient(
+                transport=httpx.ASGITransport(app=self.app)
+            ),
+        )
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.middleware("http")
+        async def inject_failures(request: Request, call_next: Callable) -> Response:
+            if self.fail_next:
+                error = {"type": "api_error", "message": "Injected failure"}
+                return JSONResponse(
+                    {"type": "error", "error": error},
+                    status_code=self.fail_next.pop(0),
+                )
+            return await call_next(request)
+
+        @app.post("/v1/messages/batches")
+        async def create(body: dict = Body(...)) -> dict:
+            batch_id = f"msgbatch_{len(self.batches) + 1:04d}"
+            self.batches[batch_id] = list(body["requests"])
+            self.polls[batch_id] = 0
+            return self._batch(batch_id)
+
+        @app.get("/v1/messages/batches/{batch_id}")
+        async def retrieve(batch_id: str) -> dict:
+            self.polls[batch_id] += 1
+            return self._batch(batch_id)
+
+        @app.get("/v1/messages/batches/{batch_id}/results")
+        async def results(batch_id: str) -> Response:
+            lines = [json.dumps(self._result(r)) for r in self.batches[batch_id]]
+            return Response("\n".join(lines) + "\n", media_type="application/binary")
+
+        return app
+
+    def _batch(self, batch_id: str) -> dict:
+        requests = self.batches[batch_id]
+        ended = self.polls[batch_id] > self.polls_until_ended
+        errored = sum(r["custom_id"] in self.errored_ids for r in requests)
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else len(requests),
+                "succeeded": len(requests) - errored if ended else 0,
+                "errored": errored if ended else 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "created_at": "2025-01-01T00:00:00Z",
+            "expires_at": "2025-01-02T00:00:00Z",
+            "ended_at": "2025-01-01T00:10:00Z" if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": (
+                f"{BATCH_SERVER_URL}/v1/messages/batches/{batch_id}/results"
+                if ended
+                else None
+            ),
+        }
+
+    def _result(self, request: dict) -> dict:
+        custom_id = request["custom_id"]
+        if custom_id in self.errored_ids:
+            error = {"type": "api_error", "message": "Injected failure"}
+            return {
+                "custom_id": custom_id,
+                "result": {
+                    "type": "errored",
+                    "error": {"type": "error", "error": error},
+                },
+            }
+        params = request["params"]
+        message = self.respond(params)
+        return {
+            "custom_id": custom_id,
+            "result": {
+                "type": "succeeded",
+                "message": {
+                    "id": f"msg_{custom_id}",
+                    "type": "message",
+                    "role": "assistant",
+                    "model": params.get("model", "claude-test"),
+                    "content": [{"type": "text", "text": message.content[0].text}],
+                    "stop_reason": "end_turn",
+                    "stop_sequence": None,
+                    "usage": vars(message.usage),
+                },
+            },
+        }
+
+
+class FakeStream:
+    """Mimics AsyncMessageStream: yields the reply word by word."""
+
+    def __init__(self, client: "FakeAnthropic", request: dict) -> None:
+        self._client = client
+        self._request = request
+        self._message: SimpleNamespace | None = None
+
+    async def __aenter__(self) -> "FakeStream":
+        self._message = self._client.respond(self._request)
+        self.text_stream = self._words()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        return None
+
+    async def _words(self) -> AsyncIterator[str]:
+        words = self._message.content[0].text.split(" ")
+        for i, word in enumerate(words):
+            if self._client.delay:
+                await asyncio.sleep(self._client.delay / len(words))
+            yield word if i == 0 else " " + word
+
+    async def get_final_message(self) -> SimpleNamespace:
+        return self._message
+
+
+class FakeMessages:
+    def __init__(self, client: "FakeAnthropic") -> None:
+        self._client = client
+
+    async def create(self, **kwargs: object) -> SimpleNamespace:
+        self._client.calls.append(kwargs)
+        if self._client.delay:
+            await asyncio.sleep(self._client.delay)
+        return self._client.respond(kwargs)
+
+    def stream(self, **kwargs: object) -> FakeStream:
+        self._client.calls.append(kwargs)
+        return FakeStream(self._client, kwargs)
+
+
+class FakeAnthropic:
+    """Records every request and answers with a canned message.
+
+    ``respond`` may be replaced to customise the reply per request.
+    """
+
+    def __init__(self, text: str = DEFAULT_REPLY) -> None:
+        self.text = text
+        self.delay = 0.0
+        self.calls: list[dict] = []
+        self.messages = FakeMessages(self)
+
+    def respond(self, request: dict) -> SimpleNamespace:
+        return make_message(self.text)
+
+
+def make_runner(
+    processed_dir: str | None = PROCESSED_DIR,
+    text: str | None = None,
+    delay: float = 0.0,
+    respond: Callable[[dict], SimpleNamespace] | None = None,
+    **kwargs: Any,
+) -> tuple[AgentRunner, FakeAnthropic]:
+    """An AgentRunner answered by a FakeAnthropic.
+
+    Args:
+        processed_dir: Personas to load into its registry (None = no registry).
+        text: Canned reply (None = FakeAnthropic's default).
+        delay: Seconds each fake call takes.
+        respond: Replaces FakeAnthropic.respond to build replies per request.
+        **kwargs: Passed on to AgentRunner.
+    """
+    registry = None
+    if processed_dir is not None:
+        registry = PersonaRegistry(processed_dir)
+        registry.load()
+    fake = FakeAnthropic() if text is None else FakeAnthropic(text)
+    fake.delay = delay
+    if respond is not None:
+        fake.respond = respond
+    runner = AgentRunner(api_key="test", registry=registry, **kwargs)
+    runner.client = fake
+    return runner, fake
+
+
+GROUPS = ["Garment Upper body", "Garment Lower body", "Garment Full body", "Shoes"]
+COLOURS = ["Black", "White", "Dark Blue", "Beige", "Grey", "Red"]
+DEPARTMENTS = ["Jersey Basic", "Trousers", "Dresses", "Knitwear", "Shoes"]
+
+
+def write_fixture_csv(path: str, n_customers: int = 40, seed: int = 0) -> None:
+    """Synthetic transactions in the real CSV's layout, customers interleaved."""
+    rng = random.Random(seed)
+    rows = []
+    for c in range(n_customers):
+        cid = f"{c:064x}"
+        age = rng.randint(18, 70)
+        for _ in range(rng.randint(1, 30)):
+            rows.append(
+                {
+                    "customer_id": cid,
+                    "Summary": f"Customer {c} likes simple, practical clothes.",
+                    "age": f"{age}.0",
+                    "club_member_status": rng.choice(["ACTIVE", "PRE-CREATE", ""]),
+                    "prod_name": f"Item {rng.randint(1, 500)}",
+                    "product_type_name": rng.choice(["T-shirt", "Trousers", "Dress"]),
+                    "product_group_name": rng.choice(GROUPS),
+                    "colour_group_name": rng.choice(COLOURS),
+                    "perceived_colour_value_name": "Dark",
+                    "department_name": rng.choice(DEPARTMENTS),
+                    "index_name": "Ladieswear",
+                    "section_name": "Womens Everyday Basics",
+                    "garment_group_name": "Jersey Basic",
+                    "detail_desc": rng.choice(
+                        ["Soft cotton jersey.", 'Wide "relaxed" fit,\nlong sleeves.']
+                    ),
+                    "t_dat": f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/"
+                    f"{rng.choice([2018, 2019, 2020])}",
+                    "price": f"{rng.uniform(0.005, 0.1):.4f}",
+                    "sales_channel_id": rng.choice(["1", "2"]),
+                }
+            )
+    rng.shuffle(rows)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
@@ -0,0 +1,327 @@
+import asyncio
+
+import pytest
+
+from app.models.schemas import AgentResponse
+from app.services.aggregator import (
+    AggregationBudget,
+    AggregationScheduler,
+    InsightAggregator,
+    Notes,
+    chunk_responses,
+    format_response,
+    group_notes,
+    recommendation,
+    segment_sentiment,
+)
+from app.services.rate_limiter import estimate_tokens
+from tests.fakes import FakeAnthropic, make_message
+from tests.test_concurrency import FakeStatusError
+
+SEGMENTS = ["young_adult", "adult", "mature", "senior"]
+
+
+def _responses(n: int, words: int = 40) -> list[AgentResponse]:
+    return [
+        AgentResponse(
+            agent_id=f"a{i}",
+            profile_name=f"Customer {i}",
+            age=20 + i % 50,
+            segment=SEGMENTS[i % len(SEGMENTS)],
+            response_text=f"Answer {i}: " + "fine " * words,
+            sentiment=["positive", "neutral", "negative"][i % 3],
+            response_time_ms=1.0,
+        )
+        for i in range(n)
+    ]
+
+
+def _aggregator(budget: AggregationBudget | None = None):
+    aggregator = InsightAggregator(
+        api_key="test",
+        map_model="map-model",
+        reduce_model="reduce-model",
+        budget=budget,
+        retry_base_delay=0.0,
+    )
+    fake = FakeAnthropic()
+    fake.respond = lambda request: make_message(
+        f"notes from {request['model']}", output_tokens=20
+    )
+    aggregator.client = fake
+    return aggregator, fake
+
+
+def _prompt(call: dict) -> str:
+    return call["messages"][0]["content"]
+
+
+async def _until(condition) -> None:
+    for _ in range(500):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+
+def _kind(call: dict) -> str:
+    """Which aggregation prompt a call was made with."""
+    prompt = _prompt(call)
+    if prompt.startswith("Analyze how this specific customer segment"):
+        return "segment"
+    if "summarising one batch" in prompt:
+        return "map"
+    if "merging colleagues' notes" in prompt:
+        return "merge"
+    return "summary"
+
+
+class TestChunking:
+    def test_chunks_respect_budget_and_keep_segments_together(self) -> None:
+        responses = _responses(200)
+        chunks = [
+            [responses[i] for i in chunk] for chunk in chunk_responses(responses, 2_000)
+        ]
+        assert sorted(r.agent_id for c in chunks for r in c) == sorted(
+            r.agent_id for r in responses
+        )
+        for chunk in chunks:
+            cost = sum(estimate_tokens(format_response(r)) + 1 for r in chunk)
+            assert cost <= 2_000
+        # Each 50-response segment needs two chunks, never three
+        for segment in SEGMENTS:
+            assert sum(any(r.segment == segment for r in c) for c in chunks) == 2
+
+    def test_oversized_response_gets_own_chunk(self) -> None:
+        big = _responses(1, words=2_000)
+        big[0].segment = "senior"
+        responses = _responses(3, words=10) + big
+        chunks = chunk_responses(responses, 500)
+        assert chunks == [[0, 1, 2], [3]]
+
+    def test_group_notes_always_shrinks(self) -> None:
+        notes = [Notes("x" * 4_000, 10, ["adult"]) for _ in range(5)]
+        groups = group_notes(notes, 100)
+        assert [len(g) for g in groups] == [2, 2, 1]
+
+
+class TestExecutiveSummary:
+    def test_small_crowd_is_one_call(self) -> None:
+        aggregator, fake = _aggregator()
+        responses = _responses(10)
+        summary = asyncio.run(
+            aggregator.generate_executive_summary(responses, "Linen shirts")
+        )
+        assert summary == "notes from reduce-model"
+        assert len(fake.calls) == 1
+        prompt = _prompt(fake.calls[0])
+        assert "feedback from 10 real customers" in prompt
+        assert all(r.response_text.strip() in prompt for r in responses)
+
+    def test_large_crowd_maps_then_reduces(self) -> None:
+        budget = AggregationBudget(
+            direct_input_tokens=2_000, map_input_tokens=1_500, reduce_input_tokens=400
+        )
+        aggregator, fake = _aggregator(budget)
+        fake.respond = lambda request: make_message(
+            f"notes from {request['model']} " + "detail " * 150
+        )
+        responses = _responses(400)
+        summary = asyncio.run(
+            aggregator.generate_executive_summary(responses, "Linen shirts")
+        )
+        assert summary.startswith("notes from reduce-model")
+
+        maps = [c for c in fake.calls if c["model"] == "map-model"]
+        reduces = [c for c in fake.calls if c["model"] == "reduce-model"]
+        assert len(maps) == len(chunk_responses(responses, 1_500))
+        assert all(c["max_tokens"] == budget.map_output_tokens for c in maps)
+        # Every response is read by exactly one map call
+        for r in responses:
+            assert (
+                sum(f"{r.response_text.strip()}\n" in _prompt(c) + "\n" for c in maps)
+                == 1
+            )
+        # At least one merge level before the final summary
+        assert len(reduces) >= 2
+        final = _prompt(reduces[-1])
+        assert "MEASURED SENTIMENT:" in final
+        assert "(400 customers)" in final
+        assert reduces[-1]["max_tokens"] == budget.summary_output_tokens
+
+    def test_transient_errors_are_retried(self) -> None:
+        aggregator, fake = _aggregator()
+        failures = [FakeStatusError(529)]
+        respond = fake.respond
+
+        def flaky(request: dict) -> object:
+            if failures:
+                raise failures.pop()
+            return respond(request)
+
+        fake.respond = flaky
+        summary = asyncio.run(
+            aggregator.generate_executive_summary(_responses(3), "Tees")
+        )
+        assert summary == "notes from reduce-model"
+        assert len(fake.calls) == 2
+
+    def test_failed_map_call_fails_summary(self) -> None:
+        budget = AggregationBudget(direct_input_tokens=100, map_input_tokens=500)
+        aggregator, fake = _aggregator(budget)
+
+        def respond(request: dict) -> object:
+            raise ValueError("bad request")
+
+        fake.respond = respond
+        with pytest.raises(ValueError):
+            asyncio.run(aggregator.generate_executive_summary(_responses(50), "Tees"))
+
+
+class TestAggregateAll:
+    def test_results(self) -> None:
+        aggregator, _ = _aggregator()
+        responses = _responses(9)
+        responses[0].status = "error"
+        results = asyncio.run(aggregator.aggregate_all(responses, "Tees"))
+        assert results.executive_summary == "notes from reduce-model"
+        assert results.total_agents == 9
+        assert results.response_rate == pytest.approx(8 / 9, abs=1e-4)
+        assert results.sentiment_breakdown.sample_size == 8
+        # A summary and one analysis per segment; themes need no call
+        assert results.key_themes
+        assert len(aggregator.client.calls) == 1 + len(SEGMENTS)
+        assert [s.segment_name for s in results.segments] == SEGMENTS[1:] + SEGMENTS[:1]
+        # young_adult's failed agent is left out of its analysis
+        assert results.segments[-1].count == 2
+        assert not results.draft
+
+    def test_no_responses_needs_no_calls(self) -> None:
+        aggregator, fake = _aggregator()
+        results = asyncio.run(aggregator.aggregate_all([], "Tees"))
+        assert results.executive_summary == ""
+        assert fake.calls == []
+
+
+class TestSegmentAnalysis:
+    def test_sentiment_and_recommendation(self) -> None:
+        responses = _responses(4)
+        assert segment_sentiment(responses[:1]) == "positive"
+        assert segment_sentiment(responses[:3]) == "mixed"
+        analysis = '1. Mixed\n2. Fit\n3. "Nice"\n4. **Recommendation**: Lead with fit.'
+        assert recommendation(analysis) == "Lead with fit."
+        assert recommendation("No numbered points") == ""
+
+    def test_prompt_is_capped_but_count_is_not(self) -> None:
+        aggregator, fake = _aggregator(AggregationBudget(reduce_input_tokens=200))
+        responses = _responses(20)
+        segment = asyncio.run(
+            aggregator.analyze_segment("adult", responses, "Tees", ["quote"])
+        )
+        assert segment.count == 20
+        assert segment.key_quotes == ["quote"]
+        assert "adult (20 customers)" in _prompt(fake.calls[0])
+        assert _prompt(fake.calls[0]).count("Answer ") < 20
+
+
+class TestScheduler:
+    def test_segment_starts_when_its_agents_are_in(self) -> None:
+        aggregator, fake = _aggregator()
+        responses = _responses(8)
+
+        async def run() -> None:
+            scheduler = AggregationScheduler(
+                aggregator, "Tees", {s: 2 for s in SEGMENTS}
+            )
+            # Both young_adult responses first, then one of each other segment
+            for response in [responses[0], responses[4], *responses[1:4]]:
+                scheduler.add(response)
+            await _until(lambda: fake.calls)
+            assert [_kind(c) for c in fake.calls] == ["segment"]
+            assert "young_adult (2 customers)" in _prompt(fake.calls[0])
+            for response in responses[5:]:
+                scheduler.add(response)
+            results = await scheduler.finish()
+            assert len(results.segments) == len(SEGMENTS)
+
+        asyncio.run(run())
+        assert sorted(_kind(c) for c in fake.calls) == ["segment"] * 4 + ["summary"]
+
+    def test_large_crowd_is_mapped_during_the_run(self) -> None:
+        budget = AggregationBudget(
+            direct_input_tokens=2_000, map_input_tokens=1_000, reduce_input_tokens=10**6
+        )
+        aggregator, fake = _aggregator(budget)
+        responses = _responses(200)
+
+        async def run() -> None:
+            scheduler = AggregationScheduler(
+                aggregator, "Tees", {s: 50 for s in SEGMENTS}
+            )
+            for response in responses[:-1]:
+                scheduler.add(response)
+            await asyncio.sleep(0)
+            mapped = sum(_kind(c) == "map" for c in fake.calls)
+            assert mapped > 0
+            scheduler.add(responses[-1])
+            results = await scheduler.finish()
+            assert results.executive_summary == "notes from reduce-model"
+            # Only the last segment's tail was left to map
+            assert sum(_kind(c) == "map" for c in fake.calls) == mapped + 1
+
+        asyncio.run(run())
+        mapped = [_prompt(c) for c in fake.calls if _kind(c) == "map"]
+        assert sum(p.count("\n[") + 1 for p in mapped) >= 200
+
+    def test_draft_then_refresh(self) -> None:
+        aggregator, fake = _aggregator()
+        responses = _responses(10)
+        drafts = []
+
+        async def on_draft(results) -> None:
+            drafts.append(results)
+
+        async def run():
+            scheduler = AggregationScheduler(
+                aggregator, "Tees", {"": 10}, draft_at=0.5, on_draft=on_draft
+            )
+            for response in responses[:5]:
+                scheduler.add(response)
+            await _until(lambda: drafts)
+            for response in responses[5:]:
+                scheduler.add(response)
+            return await scheduler.finish()
+
+        results = asyncio.run(run())
+        assert len(drafts) == 1 and drafts[0].draft
+        assert drafts[0].total_agents == 5
+        assert not results.draft and results.total_agents == 10
+        assert [_kind(c) for c in fake.calls].count("summary") == 2
+
+    def test_draft_covering_every_response_is_reused(self) -> None:
+        aggregator, fake = _aggregator()
+        responses = _responses(4)
+
+        async def run():
+            scheduler = AggregationScheduler(aggregator, "Tees", {"": 4}, draft_at=1.0)
+            for response in responses:
+                scheduler.add(response)
+            await _until(lambda: scheduler.draft is not None)
+            return await scheduler.finish()
+
+        results = asyncio.run(run())
+        assert results.executive_summary == "notes from reduce-model"
+        assert [_kind(c) for c in fake.calls].count("summary") == 1
+
+    def test_cancel_stops_work_in_flight(self) -> None:
+        aggregator, _ = _aggregator()
+
+        async def run() -> None:
+            scheduler = AggregationScheduler(aggregator, "Tees", {"adult": 1})
+            scheduler.add(_responses(2)[1])
+            task = scheduler._segments["adult"]
+            scheduler.cancel()
+            await asyncio.sleep(0)
+            assert task.cancelled()
+
+        asyncio.run(run())
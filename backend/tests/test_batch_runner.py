@@ -0,0 +1,213 @@
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+
+import anthropic
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.agent_runner import AgentRunner
+from app.services.batch_runner import (
+    MAX_BATCH_BYTES,
+    BatchRunner,
+    request_bytes,
+    split_requests,
+)
+from tests.fakes import BatchServer, make_message, make_runner
+
+PRODUCTS = ["Oversized 90s graphic tees at €24.99", "Recycled denim jackets at €59"]
+
+
+def _reply(params: dict) -> object:
+    if "tees" in str(params):
+        return make_message("I love it, would definitely buy!")
+    return make_message("Not for me.")
+
+
+def _batch_runner(server: BatchServer, tmpdir: str) -> AgentRunner:
+    """An AgentRunner whose batches go to ``server``."""
+    runner, _ = make_runner(
+        batch_state_dir=tmpdir, batch_poll_interval=0.001, retry_base_delay=0.001
+    )
+    runner.client = server.client()
+    return runner
+
+
+class TestBatchRunner:
+    def test_submit_persists_state(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            server = BatchServer()
+            batch_runner = BatchRunner(server.client(), state_dir=tmpdir)
+            batch_id = asyncio.run(
+                batch_runner.submit(
+                    [{"custom_id": "a", "params": {}}], metadata={"k": "v"}
+                )
+            )
+            state = json.loads(Path(tmpdir, f"{batch_id}.json").read_text())
+            assert state["metadata"] == {"k": "v"}
+            assert state["completed"] is False
+            assert server.batches[batch_id] == [{"custom_id": "a", "params": {}}]
+            assert [s["batch_id"] for s in batch_runner.pending()] == [batch_id]
+
+            batch_runner.mark_completed(batch_id)
+            assert batch_runner.pending() == []
+
+    def test_wait_polls_until_ended(self) -> None:
+        server = BatchServer()
+        server.polls_until_ended = 3
+        client = server.client()
+        batch_runner = BatchRunner(client, state_dir="unused", poll_interval=0.001)
+
+        async def main() -> None:
+            batch = await client.messages.batches.create(requests=[])
+            await batch_runner.wait(batch.id)
+
+        asyncio.run(main())
+        assert server.polls["msgbatch_0001"] == 4
+
+    def test_transient_errors_do_not_end_the_wait(self) -> None:
+        server = BatchServer()
+        server.polls_until_ended = 2
+        client = server.client()
+        batch_runner = BatchRunner(
+            client, state_dir="unused", poll_interval=0.001, retry_base_delay=0.001
+        )
+
+        async def main() -> None:
+            batch = await client.messages.batches.create(requests=[])
+            server.fail_next = [529, 503]
+            await batch_runner.wait(batch.id)
+            server.fail_next = [400]
+            with pytest.raises(anthropic.BadRequestError):
+                await batch_runner.wait(batch.id)
+
+        asyncio.run(main())
+        assert not server.fail_next
+
+    def test_split_by_bytes_before_count(self) -> None:
+        # About 5 KB of persona prompt per request, like a real crowd
+        requests = [
+            {"custom_id": f"a{i:03d}", "params": {"system": "x" * 5_000}}
+            for i in range(100)
+        ]
+        max_bytes = 20 * request_bytes(requests[0]) + 10
+        batches = split_requests(requests, max_requests=1_000, max_bytes=max_bytes)
+        assert [len(b) for b in batches] == [20] * 5
+        assert [r for b in batches for r in b] == requests
+        assert all(sum(map(request_bytes, b)) <= max_bytes for b in batches)
+        # The count limit still applies to small requests
+        small = [{"custom_id": str(i), "params": {}} for i in range(5)]
+        assert [len(b) for b in split_requests(small, max_requests=2)] == [2, 2, 1]
+
+    def test_submit_rejects_oversized_batch(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            server = BatchServer()
+            batch_runner = BatchRunner(server.client(), state_dir=tmpdir)
+            huge = [{"custom_id": "a", "params": {"system": "x" * MAX_BATCH_BYTES}}]
+            with pytest.raises(ValueError, match="bytes"):
+                asyncio.run(batch_runner.submit(huge, metadata={}))
+            assert server.batches == {}
+
+
+class TestRunBatch:
+    def test_results_per_product_and_callback(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            server = BatchServer(respond=_reply)
+            runner = _batch_runner(server, tmpdir)
+            received: list = []
+
+            async def on_done(response: object) -> None:
+                received.append(response)
+
+            results = asyncio.run(
+                runner.run_batch(PRODUCTS, max_agents=4, callback=on_done)
+            )
+
+            assert len(server.batches) == 1
+            assert set(results) == set(PRODUCTS)
+            assert all(len(r) == 4 for r in results.values())
+            assert len(received) == 8
+            assert {r.sentiment for r in results[PRODUCTS[0]]} == {"positive"}
+            assert results[PRODUCTS[0]][0].profile_name == "Alex"
+            assert results[PRODUCTS[0]][0].input_tokens == 100
+            assert runner.batch_runner.pending() == []
+
+    def test_errored_requests_become_error_responses(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            server = BatchServer(respond=_reply)
+            server.errored_ids = {"p0-a1"}
+            runner = _batch_runner(server, tmpdir)
+            results = asyncio.run(runner.run_batch(PRODUCTS[:1], max_agents=3))
+            texts = [r.response_text for r in results[PRODUCTS[0]]]
+            assert texts[1] == "[Error: batch_errored]"
+            assert not texts[0].startswith("[Error:")
+
+    def test_resume_after_restart(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            server = BatchServer(respond=_reply)
+            runner = _batch_runner(server, tmpdir)
+
+            async def submit_then_crash() -> None:
+                task = asyncio.create_task(runner.run_batch(PRODUCTS, max_agents=2))
+                while not runner.batch_runner.pending():
+                    await asyncio.sleep(0.001)
+                task.cancel()
+
+            asyncio.run(submit_then_crash())
+            assert len(runner.batch_runner.pending()) == 1
+
+            # A fresh runner (new process) picks the batch up from disk
+            restarted = _batch_runner(server, tmpdir)
+            server.fail_next = [529]  # the first poll after the restart
+            results = asyncio.run(restarted.resume_batches())
+            assert set(results) == set(PRODUCTS)
+            assert all(len(r) == 2 for r in results.values())
+            assert restarted.batch_runner.pending() == []
+            assert len(server.batches) == 1
+            assert not server.fail_next
+
+
+class TestBatchEndpoint:
+    def _poll(self, client: TestClient, job_id: str) -> dict:
+        for _ in range(500):
+            job = client.get(f"/api/batch/{job_id}").json()
+            if job["status"] != "running":
+                return job
+        raise AssertionError("batch job did not finish")
+
+    def test_start_and_resume(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir, TestClient(app) as client:
+            runner = app.state.agent_runner
+            server = BatchServer()
+            runner.client = server.client()
+            runner.batch_state_dir = tmpdir
+            runner.batch_poll_interval = 0.001
+
+            job_id = client.post(
+                "/api/batch",
+                json={
+                    "product_descriptions": PRODUCTS,
+                    "target_segments": ["young_adult"],
+                },
+            ).json()["job_id"]
+            job = self._poll(client, job_id)
+            assert job["status"] == "complete"
+            assert set(job["results"]) == set(PRODUCTS)
+            assert len(server.batches) == 1
+            assert all(
+                r["segment"] == "young_adult"
+                for responses in job["results"].values()
+                for r in responses
+            )
+
+            # Nothing is left over to resume
+            job_id = client.post("/api/batch/resume").json()["job_id"]
+            assert self._poll(client, job_id)["results"] == {}
+
+    def test_rejects_empty_and_unknown(self) -> None:
+        with TestClient(app) as client:
+            response = client.post("/api/batch", json={"product_descriptions": []})
+            assert response.status_code == 400
+            assert client.get("/api/batch/nope").status_code == 404
@@ -0,0 +1,140 @@
+import asyncio
+
+from app.models.schemas import AgentResponse
+from app.services.aggregator import AggregationBudget, AggregationScheduler
+from app.services.compaction import (
+    Quote,
+    collapse,
+    compact,
+    quote_line,
+    quote_responses,
+    quote_tokens,
+    select,
+    trim,
+)
+from tests.test_aggregator import _aggregator, _kind, _prompt
+
+LINEN = "I love the breathable linen fabric, perfect for summer holidays abroad."
+PRICE = "Far too expensive for a basic shirt, I would wait for the sales."
+
+
+def _response(
+    i: int,
+    text: str,
+    segment: str = "adult",
+    sentiment: str = "positive",
+    status: str = "ok",
+) -> AgentResponse:
+    return AgentResponse(
+        agent_id=f"a{i}",
+        profile_name=f"Customer {i}",
+        age=30,
+        segment=segment,
+        response_text=text,
+        sentiment=sentiment,
+        response_time_ms=1.0,
+        status=status,
+    )
+
+
+def _varied(i: int, segment: str = "adult", sentiment: str = "positive"):
+    """A response sharing no three words in a row with any other."""
+    words = " ".join(f"w{i}x{j}" for j in range(12))
+    return _response(i, f"Customer {i} says {words}.", segment, sentiment)
+
+
+class TestTrim:
+    def test_filler_openers_are_cut(self) -> None:
+        assert trim("Honestly, well... I love it.") == "I love it."
+        assert trim("To be honest   the  fit\nlooks off") == "The fit looks off"
+        # Nothing left but filler: keep it as it was
+        assert trim("Okay.") == "Okay."
+        assert trim("Solid value") == "Solid value"
+
+
+class TestCollapse:
+    def test_near_duplicates_fold_into_one_quote(self) -> None:
+        responses = [
+            _response(0, LINEN),
+            _response(1, "Honestly, " + LINEN.replace(".", "!")),
+            _response(2, LINEN.replace(" abroad", "")),
+            _response(3, PRICE, sentiment="negative"),
+            _response(4, "[Error: timed out]", status="timed_out"),
+        ]
+        quotes = compact(responses)
+        assert [q.count for q in quotes] == [3, 1]
+        assert quotes[0].text == LINEN
+        assert quote_line(quotes[0]).startswith("[adult, 30, positive, said by 3]")
+        assert all("Error" not in quote_line(q) for q in quotes)
+
+    def test_segments_and_sentiments_stay_apart(self) -> None:
+        responses = [
+            _response(0, LINEN),
+            _response(1, LINEN, segment="senior"),
+            _response(2, LINEN, sentiment="neutral"),
+        ]
+        assert [q.count for q in compact(responses)] == [1, 1, 1]
+
+    def test_distinct_responses_are_kept(self) -> None:
+        responses = [_varied(i) for i in range(50)]
+        assert len(compact(responses)) == 50
+
+    def test_folding_again_adds_counts(self) -> None:
+        first = collapse(quote_responses([_response(i, LINEN) for i in range(3)]))
+        again = collapse(first + quote_responses([_response(3, LINEN)]))
+        assert [q.count for q in again] == [4]
+
+
+class TestSelect:
+    def test_fits_budget_and_keeps_minority_views(self) -> None:
+        quotes = [
+            Quote(r, r.response_text)
+            for r in [_varied(i) for i in range(60)]
+            + [_varied(60 + i, sentiment="negative") for i in range(3)]
+            + [_varied(70 + i, segment="senior") for i in range(5)]
+        ]
+        budget = sum(quote_tokens(q) for q in quotes) // 4
+        kept = select(quotes, budget)
+        assert sum(quote_tokens(q) for q in kept) <= budget
+        assert kept == sorted(kept, key=quotes.index)
+        assert any(q.response.sentiment == "negative" for q in kept)
+        assert any(q.response.segment == "senior" for q in kept)
+
+    def test_everything_fits(self) -> None:
+        quotes = quote_responses([_varied(i) for i in range(5)])
+        assert select(quotes, 10**6) == quotes
+
+
+class TestAggregationInputs:
+    def test_summary_reads_collapsed_responses_without_errors(self) -> None:
+        aggregator, fake = _aggregator()
+        responses = [_response(i, LINEN) for i in range(6)]
+        responses.append(_response(6, "[Error: rate limited]", status="error"))
+        asyncio.run(aggregator.generate_executive_summary(responses, "Linen"))
+        prompt = _prompt(fake.calls[0])
+        assert prompt.count(LINEN) == 1
+        assert "said by 6" in prompt
+        assert "Error" not in prompt
+
+    def test_input_budget_caps_map_prompts(self) -> None:
+        budget = AggregationBudget(
+            input_tokens=3_000, direct_input_tokens=1_000, map_input_tokens=1_000
+        )
+        aggregator, fake = _aggregator(budget)
+        responses = [_varied(i, ["adult", "senior"][i % 2]) for i in range(400)]
+
+        async def run() -> None:
+            scheduler = AggregationScheduler(
+                aggregator, "Tees", {"adult": 200, "senior": 200}
+            )
+            for response in responses:
+                scheduler.add(response)
+            await scheduler.finish()
+
+        asyncio.run(run())
+        maps = [_prompt(c) for c in fake.calls if _kind(c) == "map"]
+        read = sum(p.count("Customer ") for p in maps)
+        assert 0 < read < len(responses)
+        # The notes still speak for every customer
+        final = [_prompt(c) for c in fake.calls if _kind(c) == "summary"][-1]
+        assert "(400 customers)" in final
@@ -0,0 +1,191 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.concurrency import (
+    AdaptiveLimiter,
+    LatencyTracker,
+    backoff_delay,
+    is_overload_error,
+    is_retryable_error,
+    retry_after_seconds,
+)
+from tests.fakes import make_message, make_runner
+
+
+class FakeStatusError(Exception):
+    """Mimics anthropic.APIStatusError's status_code and response headers."""
+
+    def __init__(self, status_code: int, headers: dict | None = None) -> None:
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class TestErrorClassification:
+    def test_overload_codes(self) -> None:
+        assert is_overload_error(FakeStatusError(429))
+        assert is_overload_error(FakeStatusError(529))
+        assert not is_overload_error(FakeStatusError(400))
+
+    def test_retryable_codes(self) -> None:
+        assert is_retryable_error(FakeStatusError(500))
+        assert is_retryable_error(FakeStatusError(429))
+        assert not is_retryable_error(FakeStatusError(400))
+        assert not is_retryable_error(ValueError("bad"))
+
+    def test_retry_after_headers(self) -> None:
+        assert retry_after_seconds(FakeStatusError(429, {"retry-after": "3"})) == 3.0
+        assert (
+            retry_after_seconds(FakeStatusError(429, {"retry-after-ms": "250"})) == 0.25
+        )
+        assert retry_after_seconds(FakeStatusError(429)) is None
+
+    def test_backoff_respects_cap_and_retry_after(self) -> None:
+        for attempt in range(1, 10):
+            assert 0 <= backoff_delay(attempt, base=1.0, cap=4.0) <= 4.0
+        assert backoff_delay(1, base=0.01, retry_after=2.0) == 2.0
+
+
+class TestAdaptiveLimiter:
+    def test_slow_start_grows_per_success(self) -> None:
+        limiter = AdaptiveLimiter(initial_limit=4, max_limit=100)
+        for _ in range(10):
+            limiter.on_success(1000)
+        assert limiter.limit == 14
+
+    def test_overload_shrinks_and_ends_slow_start(self) -> None:
+        limiter = AdaptiveLimiter(initial_limit=20, max_limit=100)
+        limiter.on_overload()
+        assert limiter.limit == 14
+        # Additive increase from here: 14 successes add roughly one slot
+        for _ in range(14):
+            limiter.on_success(1000)
+        assert limiter.limit in (14, 15)
+
+    def test_decrease_has_cooldown(self) -> None:
+        limiter = AdaptiveLimiter(initial_limit=20, max_limit=100)
+        limiter.on_success(60_000)
+        limiter.on_overload()
+        limiter.on_overload()
+        limiter.on_overload()
+        assert limiter.limit == 14
+
+    def test_latency_inflation_shrinks(self) -> None:
+        limiter = AdaptiveLimiter(initial_limit=20, max_limit=100)
+        for _ in range(5):
+            limiter.on_success(100)
+        before = limiter.limit
+        for _ in range(5):
+            limiter.on_success(10_000)
+        assert limiter.limit < before
+
+    def test_never_exceeds_bounds(self) -> None:
+        limiter = AdaptiveLimiter(initial_limit=5, min_limit=2, max_limit=8)
+        for _ in range(50):
+            limiter.on_success(100)
+        assert limiter.limit == 8
+        for _ in range(50):
+            limiter._last_decrease = 0.0
+            limiter.on_overload()
+        assert limiter.limit == 2
+
+    def test_caps_in_flight(self) -> None:
+        limiter = AdaptiveLimiter(initial_limit=3, max_limit=3)
+        peak = 0
+
+        async def work() -> None:
+            nonlocal peak
+            async with limiter:
+                peak = max(peak, limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def main() -> None:
+            await asyncio.gather(*(work() for _ in range(12)))
+
+        asyncio.run(main())
+        assert peak == 3
+        assert limiter.in_flight == 0
+
+    def test_cancelled_waiter_releases_its_turn(self) -> None:
+        limiter = AdaptiveLimiter(initial_limit=1, max_limit=1)
+
+        async def main() -> None:
+            await limiter.acquire()
+            waiter = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            limiter.release()
+            await asyncio.wait_for(limiter.acquire(), timeout=1)
+            limiter.release()
+
+        asyncio.run(main())
+
+
+def _failing(failures: list[Exception]):
+    """A respond for FakeAnthropic raising each of ``failures``, then answering."""
+
+    def respond(request: dict) -> SimpleNamespace:
+        if failures:
+            raise failures.pop(0)
+        return make_message("I love it")
+
+    return respond
+
+
+class TestRunnerRetries:
+    def test_retries_rate_limit_then_succeeds(self) -> None:
+        failures = [
+            FakeStatusError(429, {"retry-after": "0"}),
+            FakeStatusError(529, {"retry-after": "0"}),
+        ]
+        runner, fake = make_runner(
+            None, respond=_failing(failures), max_retries=3, retry_base_delay=0.01
+        )
+        result = asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        assert result.response_text == "I love it"
+        assert result.attempts == 3
+        assert result.attempt_errors == ["FakeStatusError", "FakeStatusError"]
+        assert len(fake.calls) == 3
+
+    def test_gives_up_after_max_retries(self) -> None:
+        failures = [FakeStatusError(429, {"retry-after": "0"}) for _ in range(10)]
+        runner, fake = make_runner(
+            None, respond=_failing(failures), max_retries=3, retry_base_delay=0.01
+        )
+        result = asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        assert result.response_text == "[Error: FakeStatusError]"
+        assert result.attempts == 4
+        assert len(fake.calls) == 4
+
+    def test_non_retryable_fails_fast(self) -> None:
+        runner, fake = make_runner(
+            None,
+            respond=_failing([FakeStatusError(400)]),
+            max_retries=3,
+            retry_base_delay=0.01,
+        )
+        result = asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        assert result.response_text.startswith("[Error:")
+        assert result.attempts == 1
+        assert len(fake.calls) == 1
+
+
+class TestLatencyTracker:
+    def test_no_percentile_until_enough_samples(self) -> None:
+        tracker = LatencyTracker(min_samples=5)
+        for ms in (10, 20, 30, 40):
+            tracker.record(ms)
+        assert tracker.percentile(0.95) is None
+        tracker.record(50)
+        assert tracker.percentile(0.95) == 50
+
+    def test_window_drops_old_samples(self) -> None:
+        tracker = LatencyTracker(window=10, min_samples=1)
+        for ms in range(100):
+            tracker.record(float(ms))
+        assert tracker.percentile(0.0) == 90.0
+        assert tracker.percentile(0.5) == 95.0
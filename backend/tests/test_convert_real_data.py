@@ -0,0 +1,285 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+from app.services.persona_registry import PersonaRegistry
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from convert_real_data import (  # noqa: E402
+    CSV_COLUMNS,
+    PurchaseAggregate,
+    build_purchase_summary,
+    convert_all,
+    csv_chunks,
+    date_key,
+    load_and_group_data,
+    load_columnar,
+)
+
+from tests.fakes import write_fixture_csv  # noqa: E402
+
+
+def _personas_by_customer(output_dir: str, manifest: dict) -> dict:
+    personas = {}
+    for cid, entry in manifest.items():
+        with open(entry["persona_file"], encoding="utf-8") as f:
+            personas[cid] = f.read()
+    return personas
+
+
+def _purchase(name: str, day: str) -> dict:
+    return {
+        "product_name": name,
+        "product_type": "T-shirt",
+        "product_group": "Garment Upper body",
+        "color": "Black",
+        "department": "Jersey Basic",
+        "date": day,
+        "price": 0.02,
+        "channel": "Online",
+    }
+
+
+@pytest.fixture
+def fixture_csv():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "transactions.csv")
+        write_fixture_csv(path)
+        yield path
+
+
+class TestPurchaseAggregate:
+    def test_summary_matches_full_sort(self, fixture_csv: str) -> None:
+        for data in load_and_group_data(fixture_csv).values():
+            purchases = data["purchases"]
+            expected = sorted(
+                purchases, key=lambda x: date_key(x["date"]), reverse=True
+            )
+            aggregate = PurchaseAggregate.from_purchases(purchases)
+            assert aggregate.recent() == expected[:5]
+            assert aggregate.count == len(purchases)
+            assert build_purchase_summary(purchases) == build_purchase_summary(
+                aggregate
+            )
+
+    def test_dates_compare_as_dates_not_strings(self) -> None:
+        purchases = [
+            _purchase("Tee", "31/05/2019"),
+            _purchase("Jeans", "03/07/2019"),
+            _purchase("Dress", "15/06/2019"),
+        ]
+        summary = build_purchase_summary(purchases)
+        assert "from 31/05/2019 to 03/07/2019" in summary
+        recent = PurchaseAggregate.from_purchases(purchases).recent()
+        assert [p["product_name"] for p in recent] == ["Jeans", "Dress", "Tee"]
+
+    def test_empty(self) -> None:
+        assert build_purchase_summary([]) == "No purchase history available."
+
+
+class TestStreamingConversion:
+    def test_streaming_matches_in_memory(
+        self, fixture_csv: str, capsys: pytest.CaptureFixture
+    ) -> None:
+        with tempfile.TemporaryDirectory() as out_a, tempfile.TemporaryDirectory() as out_b:
+            in_memory = convert_all(fixture_csv, out_a)
+            # Tiny partitions force many spill files
+            streamed = convert_all(
+                fixture_csv, out_b, streaming=True, partition_mb=0.002
+            )
+
+            assert set(streamed) == set(in_memory)
+            for cid, entry in in_memory.items():
+                other = streamed[cid]
+                for key in ("age", "purchase_count", "segments", "club_member_status"):
+                    assert other[key] == entry[key]
+            assert _personas_by_customer(out_b, streamed) == _personas_by_customer(
+                out_a, in_memory
+            )
+            with open(os.path.join(out_b, "manifest.json")) as f:
+                assert json.load(f) == streamed
+
+
+class TestCsvChunks:
+    @pytest.mark.parametrize("n_chunks", [1, 2, 7, 50])
+    def test_chunks_split_on_record_boundaries(
+        self, fixture_csv: str, n_chunks: int
+    ) -> None:
+        with open(fixture_csv, encoding="utf-8", newline="") as f:
+            expected = list(csv.reader(f))[1:]
+
+        rows = []
+        with open(fixture_csv, "rb") as f:
+            data = f.read()
+        chunks = csv_chunks(fixture_csv, n_chunks)
+        assert 1 <= len(chunks) <= n_chunks
+        for start, end in chunks:
+            text = data[start:end].decode("utf-8")
+            rows.extend(csv.reader(text.splitlines(keepends=True)))
+        assert rows == expected
+
+
+class TestParallelConversion:
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_parallel_matches_sequential(
+        self, fixture_csv: str, streaming: bool, capsys: pytest.CaptureFixture
+    ) -> None:
+        with tempfile.TemporaryDirectory() as out_a, tempfile.TemporaryDirectory() as out_b:
+            options = {"streaming": streaming, "partition_mb": 0.002}
+            sequential = convert_all(fixture_csv, out_a, **options)
+            parallel = convert_all(fixture_csv, out_b, workers=3, **options)
+
+            # Same customers, order, names and files, relative to each output
+            assert list(parallel) == list(sequential)
+            for cid, entry in sequential.items():
+                other = dict(parallel[cid])
+                assert os.path.dirname(other.pop("persona_file")) == out_b
+                assert other == {k: v for k, v in entry.items() if k != "persona_file"}
+                assert os.path.basename(parallel[cid]["persona_file"]) == (
+                    os.path.basename(entry["persona_file"])
+                )
+            assert _personas_by_customer(out_b, parallel) == _personas_by_customer(
+                out_a, sequential
+            )
+            # No provisional files left behind
+            assert sorted(os.listdir(out_b)) == sorted(os.listdir(out_a))
+
+
+class TestColumnarConversion:
+    def test_aggregates_match_row_fold(self, fixture_csv: str) -> None:
+        rows = load_and_group_data(fixture_csv)
+        columnar = load_columnar(fixture_csv)
+
+        assert list(columnar) == list(rows)
+        for cid, data in rows.items():
+            other = columnar[cid]
+            for key in ("summary", "age", "club_member_status"):
+                assert other[key] == data[key]
+            assert build_purchase_summary(other["aggregate"]) == (
+                build_purchase_summary(data["purchases"])
+            )
+
+    @pytest.mark.parametrize(
+        "options",
+        [{}, {"streaming": True}, {"workers": 3}, {"workers": 3, "streaming": True}],
+    )
+    def test_columnar_matches_row_conversion(
+        self, fixture_csv: str, options: dict, capsys: pytest.CaptureFixture
+    ) -> None:
+        with tempfile.TemporaryDirectory() as out_a, tempfile.TemporaryDirectory() as out_b:
+            options = {"partition_mb": 0.002, **options}
+            rows = convert_all(fixture_csv, out_a, **options)
+            columnar = convert_all(fixture_csv, out_b, columnar=True, **options)
+
+            assert list(columnar) == list(rows)
+            for cid, entry in rows.items():
+                other = dict(columnar[cid])
+                other.pop("persona_file")
+                assert other == {k: v for k, v in entry.items() if k != "persona_file"}
+            assert _personas_by_customer(out_b, columnar) == _personas_by_customer(
+                out_a, rows
+            )
+
+
+def _edit_fixture(path: str) -> tuple[str, str, str]:
+    """Give one customer a new purchase, drop another, add a third.
+
+    Returns the (changed, removed, added) customer ids.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    changed, removed = rows[0]["customer_id"], rows[1]["customer_id"]
+    added = "f" * 64
+    if changed == removed:
+        removed = next(r["customer_id"] for r in rows if r["customer_id"] != changed)
+    rows = [r for r in rows if r["customer_id"] != removed]
+    rows.append(dict(rows[0], prod_name="Brand new item", t_dat="01/01/2021"))
+    rows.insert(3, dict(rows[0], customer_id=added, Summary="A new customer."))
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return changed, removed, added
+
+
+class TestIncrementalConversion:
+    def test_first_incremental_run_is_a_full_build(
+        self, fixture_csv: str, capsys: pytest.CaptureFixture
+    ) -> None:
+        with tempfile.TemporaryDirectory() as out_a, tempfile.TemporaryDirectory() as out_b:
+            full = convert_all(fixture_csv, out_a)
+            incremental = convert_all(fixture_csv, out_b, incremental=True)
+            assert list(incremental) == list(full)
+            for cid, entry in full.items():
+                other = dict(incremental[cid])
+                assert os.path.basename(other.pop("persona_file")) == (
+                    os.path.basename(entry["persona_file"])
+                )
+                assert other == {k: v for k, v in entry.items() if k != "persona_file"}
+
+    @pytest.mark.parametrize(
+        "options",
+        [{}, {"columnar": True}, {"streaming": True}, {"workers": 3}],
+    )
+    def test_only_changed_customers_are_rewritten(
+        self, fixture_csv: str, options: dict, capsys: pytest.CaptureFixture
+    ) -> None:
+        options = {"partition_mb": 0.002, **options}
+        with tempfile.TemporaryDirectory() as out:
+            before = convert_all(fixture_csv, out, **options)
+            for entry in before.values():
+                os.utime(entry["persona_file"], (0, 0))
+            changed, removed, added = _edit_fixture(fixture_csv)
+            capsys.readouterr()
+
+            after = convert_all(fixture_csv, out, incremental=True, **options)
+
+            assert set(after) == set(before) - {removed} | {added}
+            assert "1 added, 1 changed, 1 removed" in capsys.readouterr().out
+            for cid, entry in after.items():
+                rewritten = os.path.getmtime(entry["persona_file"]) != 0
+                assert rewritten == (cid in (changed, added))
+                if cid != added:
+                    # Existing personas keep their name and file
+                    assert entry["persona_file"] == before[cid]["persona_file"]
+                    assert entry["display_name"] == before[cid]["display_name"]
+            assert after[changed]["input_hash"] != before[changed]["input_hash"]
+            assert after[changed]["purchase_count"] == (
+                before[changed]["purchase_count"] + 1
+            )
+            assert after[added]["index"] == len(before)
+            assert not os.path.exists(before[removed]["persona_file"])
+            with open(os.path.join(out, "manifest.json")) as f:
+                assert json.load(f) == after
+            assert sorted(os.listdir(out)) == sorted(
+                [os.path.basename(e["persona_file"]) for e in after.values()]
+                + ["manifest.json"]
+            )
+
+            # Same prompts as a full rebuild of the edited input
+            with tempfile.TemporaryDirectory() as fresh:
+                rebuilt = convert_all(fixture_csv, fresh, **options)
+                for cid, entry in rebuilt.items():
+                    assert after[cid]["prompt_hash"] == entry["prompt_hash"]
+                    assert after[cid]["input_hash"] == entry["input_hash"]
+
+
+class TestPackedOutput:
+    def test_pack_holds_manifest_and_personas(
+        self, fixture_csv: str, capsys: pytest.CaptureFixture
+    ) -> None:
+        with tempfile.TemporaryDirectory() as out:
+            manifest = convert_all(fixture_csv, out, pack=True)
+            registry = PersonaRegistry(out)
+            registry.load()
+
+            assert registry.packed
+            assert [p.profile_id for p in registry.all()] == list(manifest)
+            assert {p.profile_id: p.text for p in registry.all()} == (
+                _personas_by_customer(out, manifest)
+            )
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers import test as test_router
+from app.services.agent_runner import AgentRunner
+from tests.fakes import FakeAnthropic, make_message, make_runner
+from tests.test_concurrency import FakeStatusError
+
+
+class TestTimeouts:
+    def test_slow_agents_are_marked_timed_out(self) -> None:
+        runner, _ = make_runner(delay=5.0)
+        start = time.monotonic()
+        results = asyncio.run(
+            runner.run_all_agents("Graphic tees", max_agents=3, agent_timeout=0.05)
+        )
+        assert time.monotonic() - start < 2
+        assert [r.status for r in results] == ["timed_out"] * 3
+        assert all(r.response_text == "[Error: timed_out]" for r in results)
+
+    def test_deadline_skips_unstarted_agents(self) -> None:
+        runner, fake = make_runner(delay=5.0, max_concurrent=2, initial_concurrent=2)
+        results = asyncio.run(
+            runner.run_all_agents("Graphic tees", max_agents=10, deadline=0.1)
+        )
+        assert len(results) == 10
+        assert all(r.status == "timed_out" for r in results)
+        # Only the agents admitted before the deadline reached the API
+        assert len(fake.calls) <= 2
+
+    def test_fast_agents_finish_within_deadline(self) -> None:
+        runner, _ = make_runner()
+        results = asyncio.run(
+            runner.run_all_agents(
+                "Graphic tees", max_agents=3, deadline=10, agent_timeout=5
+            )
+        )
+        assert [r.status for r in results] == ["ok"] * 3
+
+
+class TestHedging:
+    def _hedge_runner(self) -> tuple[AgentRunner, list[float]]:
+        runner, fake = make_runner()
+        for _ in range(runner.latency_tracker.min_samples):
+            runner.latency_tracker.record(20.0)
+        started: list[float] = []
+
+        async def create(**kwargs: object) -> object:
+            started.append(time.monotonic())
+            # The first request hangs; any duplicate answers at once
+            if len(started) == 1:
+                await asyncio.sleep(5)
+            return make_message("Love it, would buy")
+
+        fake.messages.create = create
+        return runner, started
+
+    def test_duplicate_wins_over_slow_request(self) -> None:
+        runner, started = self._hedge_runner()
+        start = time.monotonic()
+        results = asyncio.run(
+            runner.run_all_agents("Graphic tees", max_agents=1, hedge=True)
+        )
+        assert time.monotonic() - start < 2
+        assert len(started) == 2
+        assert results[0].status == "ok"
+        assert results[0].hedged is True
+        assert results[0].response_text == "Love it, would buy"
+
+    def test_queueing_for_a_slot_does_not_trigger_hedges(self) -> None:
+        runner, fake = make_runner(delay=0.03, max_concurrent=40, initial_concurrent=4)
+        for _ in range(runner.latency_tracker.min_samples):
+            runner.latency_tracker.record(80.0)
+        results = asyncio.run(
+            runner.run_all_agents("Graphic tees", max_agents=40, hedge=True)
+        )
+        # Agents wait far longer than p95 for a slot, but no call is slow
+        assert not any(r.hedged for r in results)
+        assert len(fake.calls) == 40
+
+    def test_hedge_errors_are_kept_apart(self) -> None:
+        runner, fake = make_runner()
+        runner.retry_base_delay = 0.0
+        for _ in range(runner.latency_tracker.min_samples):
+            runner.latency_tracker.record(20.0)
+        calls: list[int] = []
+
+        async def create(**kwargs: object) -> object:
+            calls.append(len(calls))
+            if len(calls) == 1:
+                await asyncio.sleep(0.2)
+                return make_message("Primary answer")
+            raise FakeStatusError(529)
+
+        fake.messages.create = create
+        results = asyncio.run(
+            runner.run_all_agents("Graphic tees", max_agents=1, hedge=True)
+        )
+        assert results[0].response_text == "Primary answer"
+        assert results[0].hedged is True
+        assert results[0].attempt_errors
+        assert all(e.startswith("hedge:") for e in results[0].attempt_errors)
+
+    def test_no_hedge_without_latency_history(self) -> None:
+        runner, fake = make_runner()
+        results = asyncio.run(
+            runner.run_all_agents("Graphic tees", max_agents=2, hedge=True)
+        )
+        assert len(fake.calls) == 2
+        assert not any(r.hedged for r in results)
+
+
+class TestCancelEndpoint:
+    def test_cancel_running_test(self) -> None:
+        with TestClient(app) as client:
+            runner = app.state.agent_runner
+            fake = FakeAnthropic()
+            fake.delay = 30.0
+            runner.client = fake
+            runner.streaming = False
+            runner.response_cache = None
+
+            test_id = client.post(
+                "/api/test", json={"product_description": "Graphic tees"}
+            ).json()["test_id"]
+            response = client.post(f"/api/test/{test_id}/cancel")
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "cancelled"
+
+    def test_cancel_with_a_full_unread_queue(self) -> None:
+        with TestClient(app) as client:
+            runner = app.state.agent_runner
+            fake = FakeAnthropic()
+
+            async def create(**kwargs: object) -> object:
+                fake.calls.append(kwargs)
+                # Enough quick answers to fill the queue, then agents hang
+                if len(fake.calls) > 20:
+                    await asyncio.sleep(30)
+                return make_message("Love it, would buy")
+
+            fake.messages.create = create
+            runner.client = fake
+            runner.streaming = False
+            runner.response_cache = None
+
+            with patch.object(test_router, "STREAM_BUFFER_EVENTS", 4):
+                test_id = client.post(
+                    "/api/test", json={"product_description": "Graphic tees"}
+                ).json()["test_id"]
+            queue = test_router._queues[test_id]
+            for _ in range(200):
+                if queue.full():
+                    break
+                time.sleep(0.01)
+            assert queue.full()
+            response = client.post(f"/api/test/{test_id}/cancel")
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "cancelled"
+        # The end of the run still got into the full queue
+        events = [queue.get_nowait() for _ in range(queue.qsize())]
+        assert events[-1] is test_router._DONE
+
+    def test_cancel_unknown_test_is_404(self) -> None:
+        with TestClient(app) as client:
+            assert client.post("/api/test/nope/cancel").status_code == 404
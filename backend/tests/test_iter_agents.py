@@ -0,0 +1,72 @@
+import asyncio
+
+from app.models.schemas import AgentResponse
+from tests.fakes import make_message, make_runner
+
+
+class TestIterAgents:
+    def test_yields_every_agent_once(self) -> None:
+        runner, _ = make_runner()
+
+        async def main() -> list[AgentResponse]:
+            return [r async for r in runner.iter_agents("Graphic tees", max_agents=20)]
+
+        results = asyncio.run(main())
+        assert len(results) == 20
+        assert len({r.agent_id for r in results}) == 20
+
+    def test_completion_order(self) -> None:
+        runner, fake = make_runner()
+        slow_ids = {p.profile_id for p in runner.registry.all()[:2]}
+
+        async def create(**kwargs: object) -> object:
+            fake.calls.append(kwargs)
+            system = str(kwargs["system"])
+            slow = any(
+                runner.registry.get(pid).text[:200] in system for pid in slow_ids
+            )
+            await asyncio.sleep(0.05 if slow else 0)
+            return make_message("I love it")
+
+        fake.messages.create = create
+
+        async def main() -> list[str]:
+            return [r.agent_id async for r in runner.iter_agents("Tees", max_agents=6)]
+
+        order = asyncio.run(main())
+        assert set(order[-2:]) == slow_ids
+
+    def test_slow_consumer_applies_backpressure(self) -> None:
+        runner, fake = make_runner(delay=0.001, max_concurrent=4, initial_concurrent=4)
+
+        async def main() -> int:
+            agents = runner.iter_agents("Tees", max_agents=50, buffer_size=2)
+            await agents.__anext__()
+            await asyncio.sleep(0.2)
+            started = len(fake.calls)
+            await agents.aclose()
+            return started
+
+        # 1 consumed + 2 buffered + 4 workers blocked holding a finished result
+        assert asyncio.run(main()) <= 8
+
+    def test_break_cancels_running_agents(self) -> None:
+        runner, fake = make_runner(delay=0.05, max_concurrent=4, initial_concurrent=4)
+
+        async def main() -> None:
+            async for _ in runner.iter_agents("Tees", max_agents=50, buffer_size=1):
+                break
+
+        asyncio.run(asyncio.wait_for(main(), timeout=5))
+        assert runner.limiter.in_flight == 0
+        assert len(fake.calls) <= 8
+
+
+class TestRunAllAgentsOrder:
+    def test_results_in_manifest_order(self) -> None:
+        runner, fake = make_runner()
+        fake.respond = lambda request: make_message("Not for me")
+
+        responses = asyncio.run(runner.run_all_agents("Tees", max_agents=10))
+        expected = [p.profile_id for p in runner.registry.all()[:10]]
+        assert [r.agent_id for r in responses] == expected
@@ -0,0 +1,126 @@
+import asyncio
+import itertools
+import random
+
+import pytest
+
+from app.models.schemas import AgentResponse
+from app.services.live_aggregator import LatencyHistogram, LiveAggregator
+from app.services.sampling import (
+    SamplingPlan,
+    segment_breakdown,
+    sentiment_breakdown,
+)
+from tests.fakes import make_message, make_runner
+
+ANSWERS = [
+    "I love this, would definitely buy it!",
+    "It's okay I guess.",
+    "Overpriced and poor quality, disappointing.",
+]
+
+
+def _response(segment: str, sentiment: str, status: str = "ok", ms: float = 100):
+    return AgentResponse(
+        agent_id="x",
+        profile_name="X",
+        age=30,
+        segment=segment,
+        response_text="",
+        sentiment=sentiment,
+        response_time_ms=ms,
+        status=status,
+    )
+
+
+def _mixed_answers():
+    """A respond for FakeAnthropic cycling through mostly positive ANSWERS."""
+    answers = itertools.cycle([0, 0, 1, 2, 0])
+    return lambda request: make_message(ANSWERS[next(answers)])
+
+
+class TestLatencyHistogram:
+    def test_percentiles_within_resolution(self) -> None:
+        rng = random.Random(0)
+        samples = [rng.lognormvariate(7, 0.6) for _ in range(5_000)]
+        histogram = LatencyHistogram(resolution=0.02)
+        for ms in samples:
+            histogram.record(ms)
+        ordered = sorted(samples)
+        for q in (0.5, 0.9, 0.99):
+            exact = ordered[int(q * len(ordered)) - 1]
+            assert histogram.percentile(q) == pytest.approx(exact, rel=0.03)
+        assert histogram.summary().max_ms == round(max(samples), 1)
+
+    def test_empty(self) -> None:
+        assert LatencyHistogram().summary().p50_ms is None
+
+
+class TestLiveAggregator:
+    def test_counts_errors_and_timeouts(self) -> None:
+        live = LiveAggregator()
+        live.expect({"": 4})
+        live.add(_response("adult", "positive"))
+        live.add(_response("adult", "neutral", status="error"))
+        live.add(_response("senior", "neutral", status="timed_out", ms=60_000))
+        snapshot = live.snapshot()
+        assert (snapshot.completed, snapshot.expected) == (3, 4)
+        assert (snapshot.errors, snapshot.timed_out) == (1, 1)
+        assert snapshot.sentiment_breakdown.positive == 1
+        # Only answered agents count toward latency
+        assert snapshot.latency.max_ms == 100
+        assert not snapshot.final
+
+    def test_partial_run_extrapolates_segments(self) -> None:
+        live = LiveAggregator()
+        live.expect({"": 100})
+        for _ in range(3):
+            live.add(_response("adult", "positive"))
+        live.add(_response("senior", "negative"))
+        segments = live.snapshot().segment_breakdown
+        assert list(segments) == ["adult", "senior"]
+        assert segments["adult"].population == 75
+        assert segments["senior"].negative_pct == 100.0
+        overall = live.snapshot().sentiment_breakdown
+        assert overall.positive_pct == 75.0
+        low, high = overall.positive_interval
+        assert low < 75.0 < high
+
+    def test_due_after_interval(self) -> None:
+        live = LiveAggregator(interval_seconds=3600)
+        assert live.due()
+        live.snapshot()
+        assert not live.due()
+
+
+class TestLiveRun:
+    def test_final_snapshot_matches_full_pass(self) -> None:
+        runner, _ = make_runner(respond=_mixed_answers())
+        live = LiveAggregator()
+        seen = []
+
+        async def callback(response: AgentResponse) -> None:
+            seen.append(live.completed)
+
+        responses = asyncio.run(
+            runner.run_all_agents("Tees", callback=callback, live=live)
+        )
+        # Tallies are updated before the callback sees each response
+        assert seen == list(range(1, len(responses) + 1))
+        snapshot = live.snapshot(final=True)
+        assert snapshot.completed == snapshot.expected == len(responses)
+        assert snapshot.sentiment_breakdown == sentiment_breakdown(responses)
+        assert snapshot.segment_breakdown == segment_breakdown(responses)
+
+    def test_sampled_run_is_weighted_like_full_pass(self) -> None:
+        runner, _ = make_runner(respond=_mixed_answers())
+        live = LiveAggregator()
+        responses = asyncio.run(
+            runner.run_all_agents(
+                "Tees", sampling=SamplingPlan(ci_width=0.3), live=live
+            )
+        )
+        snapshot = live.snapshot(final=True)
+        assert snapshot.completed == len(responses) < snapshot.expected
+        assert snapshot.sentiment_breakdown == sentiment_breakdown(responses)
+        assert snapshot.segment_breakdown == segment_breakdown(responses)
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.aggregator import AggregationScheduler
+from app.services.persona_clusters import (
+    CLUSTERS_FILENAME,
+    PersonaClusters,
+    cluster_directory,
+    cluster_personas,
+    cluster_sums,
+    kmeans,
+    load_clusters,
+    tfidf_matrix,
+)
+from app.services.persona_registry import PersonaRegistry
+from app.services.persona_store import Persona
+from app.services.sampling import SamplingPlan, sentiment_breakdown
+from tests.fakes import make_runner
+from tests.test_aggregator import _aggregator, _until
+
+PROCESSED_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "processed")
+
+
+class TestClustering:
+    def test_kmeans_separates_blobs(self) -> None:
+        rng = np.random.default_rng(0)
+        centers = np.array([[0, 0], [10, 0], [0, 10]], dtype=np.float32)
+        X = np.vstack([c + rng.normal(size=(30, 2)) for c in centers])
+        labels, dist = kmeans(X.astype(np.float32), 3)
+        assert [len(set(labels[i : i + 30])) for i in (0, 30, 60)] == [1, 1, 1]
+        assert len(set(labels.tolist())) == 3
+        assert (dist >= 0).all()
+
+    def test_cluster_sums_match_add_at(self) -> None:
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(50, 4)).astype(np.float32)
+        labels = rng.integers(0, 5, 50)
+        labels[labels == 2] = 0  # cluster 2 is empty
+        expected = np.zeros((6, 4), dtype=np.float32)
+        np.add.at(expected, labels, X)
+        assert np.allclose(cluster_sums(X, labels, 6), expected, atol=1e-5)
+
+    def test_tfidf_rows(self) -> None:
+        texts = ["cotton shirts and linen", "linen shirts", "wool coats", "wool"]
+        matrix = tfidf_matrix(texts)
+        # Terms in a single document ("cotton", "coats") are dropped
+        assert matrix.shape == (4, 3)
+        assert np.allclose(np.linalg.norm(matrix, axis=1), 1)
+
+    def test_every_persona_in_one_cluster(self) -> None:
+        registry = PersonaRegistry(PROCESSED_DIR)
+        registry.load()
+        clusters = cluster_personas(registry.all(), 25)
+        ids = [pid for members in clusters.members for pid in members]
+        assert sorted(ids) == sorted(p.profile_id for p in registry.all())
+        assert len(clusters.members) <= 25
+        # Clusters group like with like: most share their age band
+        pure = sum(
+            len({registry.get(pid).entry["segments"][0] for pid in members}) == 1
+            for members in clusters.members
+        )
+        assert pure > len(clusters.members) / 2
+
+    def test_round_trip(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shutil.copytree(PROCESSED_DIR, tmpdir, dirs_exist_ok=True)
+            path = cluster_directory(tmpdir, 10)
+            assert path == Path(tmpdir, CLUSTERS_FILENAME)
+            clusters = load_clusters(tmpdir)
+            assert len(clusters.sizes) == 10
+            assert sum(clusters.sizes) == 198
+        assert load_clusters(tmpdir) is None
+
+
+class TestRepresentatives:
+    def test_picks_typical_members_and_strata(self) -> None:
+        clusters = PersonaClusters([["a", "b", "c"], ["d", "e"]])
+        personas = [Persona(pid, "", {}) for pid in "abcdeX"]
+        chosen, strata = clusters.representatives(personas, per_cluster=2)
+        assert [p.profile_id for p in chosen] == ["a", "b", "d", "e", "X"]
+        assert strata["c"] == "cluster-0" and strata["e"] == "cluster-1"
+        assert strata["X"] == "persona-X"
+
+    def test_only_selected_personas_count(self) -> None:
+        clusters = PersonaClusters([["a", "b", "c"], ["d", "e"]])
+        personas = [Persona(pid, "", {}) for pid in "ce"]
+        chosen, strata = clusters.representatives(personas)
+        assert [p.profile_id for p in chosen] == ["c", "e"]
+        assert strata == {"c": "cluster-0", "e": "cluster-1"}
+
+
+class TestPreviewRun:
+    def test_runs_representatives_weighted_by_cluster_size(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shutil.copytree(PROCESSED_DIR, tmpdir, dirs_exist_ok=True)
+            cluster_directory(tmpdir, 12)
+            sizes = load_clusters(tmpdir).sizes
+            runner, fake = make_runner(tmpdir)
+
+            responses = asyncio.run(runner.run_all_agents("Tees", representatives=1))
+
+        assert len(responses) == len(fake.calls) == 12
+        assert sorted(r.sample_weight for r in responses) == sorted(sizes)
+        breakdown = sentiment_breakdown(responses)
+        assert breakdown.population == 198
+        assert breakdown.positive_pct == 100.0
+
+    def test_endpoint_rejects_bad_previews(self) -> None:
+        with TestClient(app) as client:
+            details = []
+            for representatives in (0, 1):
+                response = client.post(
+                    "/api/test",
+                    json={
+                        "product_description": "Tees",
+                        "representatives": representatives,
+                    },
+                )
+                assert response.status_code == 400
+                details.append(response.json()["detail"])
+        assert "at least 1" in details[0]
+        # The bundled data has no clustering
+        assert CLUSTERS_FILENAME in details[1]
+
+    def test_preview_draft_counts_dispatched_agents(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shutil.copytree(PROCESSED_DIR, tmpdir, dirs_exist_ok=True)
+            cluster_directory(tmpdir, 12)
+            runner, _ = make_runner(tmpdir)
+            aggregator, _ = _aggregator()
+            drafts: list = []
+
+            async def on_draft(results) -> None:
+                drafts.append(results)
+
+            async def run():
+                scheduler = AggregationScheduler(
+                    aggregator, "Tees", {}, draft_at=0.5, on_draft=on_draft
+                )
+                responses = runner.iter_agents(
+                    "Tees",
+                    representatives=1,
+                    on_dispatch=lambda dispatched: scheduler.expect(
+                        {"": len(dispatched)}
+                    ),
+                )
+                async for response in responses:
+                    scheduler.add(response)
+                    if len(scheduler.responses) == 6:
+                        await _until(lambda: drafts)
+                return await scheduler.finish()
+
+            results = asyncio.run(run())
+
+        # Half of the 12 representatives, not of the 198 personas they stand for
+        assert [d.total_agents for d in drafts] == [6]
+        assert results.total_agents == 12
+
+    def test_requires_clusters(self) -> None:
+        runner, _ = make_runner()
+        with pytest.raises(ValueError, match=CLUSTERS_FILENAME):
+            asyncio.run(runner.run_all_agents("Tees", representatives=1))
+        with pytest.raises(ValueError):
+            asyncio.run(
+                runner.run_all_agents(
+                    "Tees", representatives=1, sampling=SamplingPlan()
+                )
+            )
@@ -0,0 +1,149 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from app.services.persona_registry import PersonaRegistry
+from app.services.persona_store import pack_directory
+
+PROCESSED_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "processed")
+
+
+def _write_fixture(tmpdir: str, personas: dict[str, str]) -> None:
+    manifest = {}
+    for pid, text in personas.items():
+        filename = f"{pid}.txt"
+        Path(tmpdir, filename).write_text(text)
+        manifest[pid] = {"persona_file": filename, "display_name": pid, "age": 30}
+    Path(tmpdir, "manifest.json").write_text(json.dumps(manifest))
+
+
+def _touch_later(path: Path) -> None:
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+class TestPersonaRegistry:
+    def test_loads_real_processed_dir(self) -> None:
+        registry = PersonaRegistry(PROCESSED_DIR)
+        registry.load()
+
+        with open(os.path.join(PROCESSED_DIR, "manifest.json")) as f:
+            manifest = json.load(f)
+        assert len(registry) == len(manifest)
+
+        first_id = next(iter(manifest))
+        persona = registry.get(first_id)
+        assert persona is not None
+        assert persona.entry == manifest[first_id]
+        assert len(persona.text) > 100
+
+    def test_preserves_manifest_order(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write_fixture(tmpdir, {"c": "third", "a": "first", "b": "second"})
+            registry = PersonaRegistry(tmpdir)
+            registry.load()
+            assert [p.profile_id for p in registry.all()] == ["c", "a", "b"]
+            assert "a" in registry
+            assert registry.get("missing") is None
+
+    def test_no_reload_when_unchanged(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write_fixture(tmpdir, {"a": "alpha"})
+            registry = PersonaRegistry(tmpdir)
+            registry.load()
+            assert registry.reload_if_changed(force=True) is False
+
+    def test_reloads_changed_persona_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write_fixture(tmpdir, {"a": "alpha", "b": "beta"})
+            registry = PersonaRegistry(tmpdir)
+            registry.load()
+
+            path = Path(tmpdir, "a.txt")
+            path.write_text("alpha v2")
+            _touch_later(path)
+
+            assert registry.reload_if_changed(force=True) is True
+            assert registry.get("a").text == "alpha v2"
+            assert registry.get("b").text == "beta"
+
+    def test_reloads_changed_manifest(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write_fixture(tmpdir, {"a": "alpha"})
+            registry = PersonaRegistry(tmpdir)
+            registry.load()
+
+            _write_fixture(tmpdir, {"a": "alpha", "new": "fresh persona"})
+            _touch_later(Path(tmpdir, "manifest.json"))
+
+            assert registry.reload_if_changed(force=True) is True
+            assert len(registry) == 2
+            assert registry.get("new").text == "fresh persona"
+
+    def test_check_is_throttled(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write_fixture(tmpdir, {"a": "alpha"})
+            registry = PersonaRegistry(tmpdir, check_interval=3600)
+            registry.load()
+
+            path = Path(tmpdir, "a.txt")
+            path.write_text("alpha v2")
+            _touch_later(path)
+
+            assert registry.reload_if_changed() is False
+            assert registry.get("a").text == "alpha"
+
+    def test_missing_manifest_raises(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            registry = PersonaRegistry(tmpdir)
+            with pytest.raises(FileNotFoundError):
+                registry.load()
+
+
+class TestPackedRegistry:
+    def test_serves_packed_store_like_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write_fixture(tmpdir, {"c": "third", "a": "first", "b": "second"})
+            loose = PersonaRegistry(tmpdir)
+            loose.load()
+
+            pack_directory(tmpdir)
+            packed = PersonaRegistry(tmpdir)
+            packed.load()
+
+            assert packed.packed and not loose.packed
+            assert packed.all() == loose.all()
+            assert packed.all(limit=2) == loose.all()[:2]
+            assert packed.get("a") == loose.get("a")
+            assert "b" in packed and packed.get("missing") is None
+
+    def test_reloads_replaced_store(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write_fixture(tmpdir, {"a": "alpha"})
+            pack_directory(tmpdir)
+            registry = PersonaRegistry(tmpdir)
+            registry.load()
+            assert registry.reload_if_changed(force=True) is False
+
+            _write_fixture(tmpdir, {"a": "alpha v2", "b": "beta"})
+            pack_directory(tmpdir)
+            _touch_later(registry.store_path)
+
+            assert registry.reload_if_changed(force=True) is True
+            assert registry.get("a").text == "alpha v2"
+            assert len(registry) == 2
+
+    def test_newer_manifest_wins_over_stale_store(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _write_fixture(tmpdir, {"a": "alpha"})
+            pack_directory(tmpdir)
+            _write_fixture(tmpdir, {"a": "alpha v2"})
+            _touch_later(Path(tmpdir, "manifest.json"))
+
+            registry = PersonaRegistry(tmpdir)
+            registry.load()
+            assert not registry.packed
+            assert registry.get("a").text == "alpha v2"
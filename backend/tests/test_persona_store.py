@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from app.services.persona_store import (
+    STORE_FILENAME,
+    Persona,
+    PersonaStore,
+    pack_directory,
+    write_store,
+)
+
+PROCESSED_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "processed")
+
+PERSONAS = [
+    ("c", "Third persona — café ☕", {"age": 41, "segments": ["mature", "tops_buyer"]}),
+    ("a", "First persona", {"age": 22, "segments": ["young_adult", "tops_buyer"]}),
+    ("b", "", {"age": 67, "segments": []}),
+]
+
+
+class TestPersonaStore:
+    def test_round_trip_in_order(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir, STORE_FILENAME)
+            assert write_store(path, PERSONAS) == 3
+
+            with PersonaStore(path) as store:
+                assert len(store) == 3
+                assert store.ids == ["c", "a", "b"]
+                assert list(store) == [Persona(*p) for p in PERSONAS]
+                assert store[-1].profile_id == "b"
+                assert [p.profile_id for p in store[1:]] == ["a", "b"]
+                with pytest.raises(IndexError):
+                    store[3]
+
+    def test_lookup_by_id_and_segment(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir, STORE_FILENAME)
+            write_store(path, PERSONAS)
+
+            with PersonaStore(path) as store:
+                assert "a" in store and "missing" not in store
+                assert store.get("a") == Persona(*PERSONAS[1])
+                assert store.get("missing") is None
+                assert store.position("b") == 2
+                assert store.segment("tops_buyer") == [0, 1]
+                assert store.segment("unknown") == []
+
+                view = store.raw_text(0)
+                assert bytes(view).decode("utf-8") == PERSONAS[0][1]
+                view.release()
+
+    def test_empty_store(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir, STORE_FILENAME)
+            write_store(path, [])
+            with PersonaStore(path) as store:
+                assert len(store) == 0
+                assert store[:] == []
+
+    def test_rejects_other_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir, STORE_FILENAME)
+            path.write_bytes(b"not a persona store, just some bytes" * 4)
+            with pytest.raises(ValueError):
+                PersonaStore(path)
+
+    def test_pack_real_processed_dir(self) -> None:
+        with open(os.path.join(PROCESSED_DIR, "manifest.json")) as f:
+            manifest = json.load(f)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = pack_directory(PROCESSED_DIR, Path(tmpdir, STORE_FILENAME))
+            with PersonaStore(path) as store:
+                assert store.ids == list(manifest)
+                for persona in store:
+                    assert persona.entry == manifest[persona.profile_id]
+                    filename = Path(persona.entry["persona_file"]).name
+                    expected = Path(PROCESSED_DIR, filename).read_text()
+                    assert persona.text == expected
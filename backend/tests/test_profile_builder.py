@@ -1,12 +1,16 @@
 import json
 import os
+import shutil
 import tempfile
+from pathlib import Path
 
 from app.models.profile import CustomerProfile
 from app.services.profile_builder import (
     build_all_personas,
     generate_persona_prompt,
+    iter_profiles,
     load_raw_profiles,
+    parse_profile,
 )
 
 PROFILES_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "profiles")
@@ -31,6 +35,33 @@ class TestLoadRawProfiles:
             assert p.gender
             assert p.location
 
+    def test_loading_modes_agree(self) -> None:
+        expected = [p.model_dump() for p in load_raw_profiles(PROFILES_DIR)]
+        for io_workers in (1, 4):
+            streamed = iter_profiles(PROFILES_DIR, io_workers=io_workers)
+            assert not isinstance(streamed, list)
+            assert [p.model_dump() for p in streamed] == expected
+
+        # Same result as the dict-based construction it replaces
+        for path in sorted(Path(PROFILES_DIR).glob("customer_*.json")):
+            raw = path.read_bytes()
+            assert parse_profile(raw) == CustomerProfile(**json.loads(raw))
+
+    def test_parse_normalizes_style(self) -> None:
+        raw = json.dumps(
+            {
+                "customer_id": "c1",
+                "name": "Kim",
+                "age": 30,
+                "gender": "female",
+                "location": "Oslo, Norway",
+                "preferences": {"style": "minimalist"},
+            }
+        ).encode()
+        profile = parse_profile(raw)
+        assert profile.preferences.style == ["minimalist"]
+        assert profile.purchase_history == []
+
 
 class TestGeneratePersonaPrompt:
     def test_persona_word_count_in_range(self) -> None:
@@ -143,3 +174,55 @@ class TestBuildAllPersonas:
                     f"Manifest entry for {cid} missing keys: "
                     f"{required_keys - info.keys()}"
                 )
+
+    def test_parallel_build_matches_serial(self) -> None:
+        with (
+            tempfile.TemporaryDirectory() as serial_dir,
+            tempfile.TemporaryDirectory() as parallel_dir,
+        ):
+            serial = build_all_personas(PROFILES_DIR, serial_dir)
+            parallel = build_all_personas(PROFILES_DIR, parallel_dir, workers=2)
+
+            assert list(parallel) == list(serial)
+            assert parallel == serial
+            for info in serial.values():
+                with open(os.path.join(serial_dir, info["persona_file"])) as f:
+                    expected = f.read()
+                with open(os.path.join(parallel_dir, info["persona_file"])) as f:
+                    assert f.read() == expected
+
+    def test_incremental_build_only_rewrites_changed_profiles(self) -> None:
+        with (
+            tempfile.TemporaryDirectory() as profiles_dir,
+            tempfile.TemporaryDirectory() as output_dir,
+        ):
+            for name in os.listdir(PROFILES_DIR):
+                shutil.copy(os.path.join(PROFILES_DIR, name), profiles_dir)
+            before = build_all_personas(profiles_dir, output_dir)
+            for info in before.values():
+                os.utime(os.path.join(output_dir, info["persona_file"]), (0, 0))
+
+            paths = sorted(Path(profiles_dir).glob("customer_*.json"))
+            edited = json.loads(paths[0].read_text())
+            edited["location"] = "Reykjavik, Iceland"
+            paths[0].write_text(json.dumps(edited))
+            removed = json.loads(paths[1].read_text())["customer_id"]
+            paths[1].unlink()
+
+            after = build_all_personas(profiles_dir, output_dir, incremental=True)
+
+            assert set(after) == set(before) - {removed}
+            assert not os.path.exists(
+                os.path.join(output_dir, before[removed]["persona_file"])
+            )
+            for cid, info in after.items():
+                persona_path = os.path.join(output_dir, info["persona_file"])
+                rewritten = os.path.getmtime(persona_path) != 0
+                assert rewritten == (cid == edited["customer_id"])
+            assert after[edited["customer_id"]]["location"] == "Reykjavik, Iceland"
+            assert (
+                after[edited["customer_id"]]["prompt_hash"]
+                != before[edited["customer_id"]]["prompt_hash"]
+            )
+            with open(os.path.join(output_dir, "manifest.json")) as f:
+                assert json.load(f) == after
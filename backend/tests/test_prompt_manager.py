@@ -0,0 +1,97 @@
+import asyncio
+import os
+
+from app.services.persona_registry import PersonaRegistry
+from app.services.prompt_manager import (
+    CACHE_MIN_TOKENS,
+    format_agent_prompt,
+    format_agent_system_blocks,
+    split_agent_prompt,
+)
+from app.services.rate_limiter import estimate_tokens
+from tests.fakes import make_message, make_runner
+
+PROCESSED_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "processed")
+
+
+def _first_persona() -> str:
+    registry = PersonaRegistry(PROCESSED_DIR)
+    registry.load()
+    return registry.all()[0].text
+
+
+class TestSplitAgentPrompt:
+    def test_pregenerated_persona_splits_at_instructions(self) -> None:
+        persona = _first_persona()
+        instructions, description = split_agent_prompt(persona)
+        assert instructions.startswith("INSTRUCTIONS FOR RESPONDING:")
+        assert "INSTRUCTIONS FOR RESPONDING:" not in description
+        assert not description.endswith("---")
+        assert "described below" in instructions
+
+    def test_raw_persona_uses_template_instructions(self) -> None:
+        instructions, description = split_agent_prompt("You are Bob, 30.")
+        assert instructions.startswith("IMPORTANT INSTRUCTIONS:")
+        assert description == "You are Bob, 30."
+
+    def test_instructions_shared_across_personas(self) -> None:
+        registry = PersonaRegistry(PROCESSED_DIR)
+        registry.load()
+        prefixes = {split_agent_prompt(p.text)[0] for p in registry.all()}
+        assert len(prefixes) == 1
+
+
+class TestFormatAgentSystemBlocks:
+    def test_layout_instructions_then_persona(self) -> None:
+        blocks = format_agent_system_blocks("You are Bob, 30.", min_cache_tokens=0)
+        assert len(blocks) == 2
+        assert blocks[0]["text"].startswith("IMPORTANT INSTRUCTIONS:")
+        assert "You are Bob, 30." in blocks[1]["text"]
+        assert all(block["type"] == "text" for block in blocks)
+        # One breakpoint, after the persona
+        assert "cache_control" not in blocks[0]
+        assert blocks[1]["cache_control"] == {"type": "ephemeral"}
+
+    def test_no_breakpoint_below_the_cache_minimum(self) -> None:
+        short = format_agent_system_blocks("You are Bob, 30.")
+        assert not any("cache_control" in block for block in short)
+        long = format_agent_system_blocks("You are Bob, 30. " + "Loves denim. " * 400)
+        assert long[1]["cache_control"] == {"type": "ephemeral"}
+        assert estimate_tokens(long) >= CACHE_MIN_TOKENS
+
+    def test_blocks_keep_all_persona_content(self) -> None:
+        persona = _first_persona()
+        flat = format_agent_prompt(persona)
+        blocks = format_agent_system_blocks(persona)
+        _, description = split_agent_prompt(persona)
+        assert description in flat
+        assert description in blocks[1]["text"]
+
+
+def _cached_reply(request: dict) -> object:
+    return make_message(
+        "Looks great, I'd buy it.",
+        input_tokens=12,
+        output_tokens=40,
+        cache_creation_input_tokens=900,
+        cache_read_input_tokens=300,
+    )
+
+
+class TestRunnerPromptCaching:
+    def test_cached_mode_sends_blocks_and_records_usage(self) -> None:
+        runner, fake = make_runner(None, respond=_cached_reply, prompt_caching=True)
+        result = asyncio.run(
+            runner.run_single_agent("p1", "You are Bob, 30.", "A new jacket")
+        )
+        assert isinstance(fake.calls[0]["system"], list)
+        assert "A new jacket" in fake.calls[0]["messages"][0]["content"]
+        assert result.input_tokens == 12
+        assert result.output_tokens == 40
+        assert result.cache_creation_input_tokens == 900
+        assert result.cache_read_input_tokens == 300
+
+    def test_default_mode_sends_plain_system_string(self) -> None:
+        runner, fake = make_runner(None, respond=_cached_reply, prompt_caching=False)
+        asyncio.run(runner.run_single_agent("p1", "You are Bob, 30.", "A jacket"))
+        assert isinstance(fake.calls[0]["system"], str)
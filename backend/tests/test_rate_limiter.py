@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+from app.services.agent_runner import AgentRunner
+from app.services.rate_limiter import RateLimiter, TokenBucket, estimate_tokens
+from tests.fakes import FakeAnthropic, make_message
+
+
+class TestEstimateTokens:
+    def test_scales_with_length(self) -> None:
+        assert estimate_tokens("") == 1
+        assert 250 <= estimate_tokens("x" * 1000) <= 300
+
+    def test_sums_text_blocks(self) -> None:
+        blocks = [
+            {"type": "text", "text": "x" * 350},
+            {"type": "text", "text": "y" * 350},
+        ]
+        assert estimate_tokens(blocks) == 2 * estimate_tokens("x" * 350)
+
+
+class TestTokenBucket:
+    def test_starts_full_and_refills(self) -> None:
+        bucket = TokenBucket(per_minute=60)
+        assert bucket.wait_time(60) == 0
+        bucket.take(60)
+        assert bucket.wait_time(1) > 0.9
+        bucket.refill(bucket._updated + 1.0)
+        assert bucket.wait_time(1) == 0
+
+    def test_oversized_request_waits_for_full_bucket_only(self) -> None:
+        bucket = TokenBucket(per_minute=60)
+        bucket.take(60)
+        # Asking for more than the capacity must not deadlock
+        assert bucket.wait_time(1000) <= 60.0
+
+
+class TestRateLimiter:
+    def test_unlimited_by_default(self) -> None:
+        limiter = RateLimiter()
+        assert not limiter.enabled
+
+        async def main() -> None:
+            for _ in range(100):
+                await limiter.acquire(10_000, 300)
+
+        asyncio.run(main())
+
+    def test_rpm_throttles(self) -> None:
+        limiter = RateLimiter(requests_per_minute=600)  # 10/s refill, burst 600
+
+        async def main() -> float:
+            for _ in range(600):
+                await limiter.acquire(1, 1)
+            start = time.monotonic()
+            for _ in range(2):
+                await limiter.acquire(1, 1)
+            return time.monotonic() - start
+
+        assert asyncio.run(main()) >= 0.15
+
+    def test_input_tpm_throttles(self) -> None:
+        limiter = RateLimiter(input_tokens_per_minute=6000)  # 100 tokens/s
+
+        async def main() -> float:
+            await limiter.acquire(6000, 0)
+            start = time.monotonic()
+            await limiter.acquire(20, 0)
+            return time.monotonic() - start
+
+        assert asyncio.run(main()) >= 0.15
+
+    def test_reconcile_refunds_unused_output(self) -> None:
+        limiter = RateLimiter(output_tokens_per_minute=600)
+
+        async def main() -> float:
+            reservation = await limiter.acquire(0, 600)
+            limiter.reconcile(reservation, 0, 50)
+            start = time.monotonic()
+            await limiter.acquire(0, 500)
+            return time.monotonic() - start
+
+        assert asyncio.run(main()) < 0.1
+
+    def test_reconcile_charges_underestimates(self) -> None:
+        limiter = RateLimiter(input_tokens_per_minute=6000)
+
+        async def main() -> None:
+            reservation = await limiter.acquire(100, 0)
+            limiter.reconcile(reservation, 6000, 0)
+
+        asyncio.run(main())
+        assert limiter._input.level < 100
+
+
+class TestRunnerRateLimiting:
+    def test_shared_limiter_reconciles_usage(self) -> None:
+        limiter = RateLimiter(
+            requests_per_minute=1000,
+            input_tokens_per_minute=100_000,
+            output_tokens_per_minute=10_000,
+        )
+        runners = []
+        for _ in range(2):
+            fake = FakeAnthropic()
+            fake.respond = lambda request: make_message(
+                "I love it", input_tokens=50, output_tokens=20
+            )
+            runner = AgentRunner(api_key="test", rate_limiter=limiter)
+            runner.client = fake
+            runners.append(runner)
+
+        async def main() -> None:
+            await asyncio.gather(
+                *(r.run_single_agent("p", "You are Bob.", "A hat") for r in runners)
+            )
+
+        asyncio.run(main())
+        # Both runners drew from the same buckets, charged at actual usage
+        assert 10_000 - limiter._output.level < 45
+        assert 100_000 - limiter._input.level < 105
+        assert 1000 - limiter._requests.level < 2.1
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from app.services.response_cache import ResponseCache, make_cache_key
+from tests.fakes import make_runner
+
+VALUE = {"response_text": "I'd buy it", "input_tokens": 10, "output_tokens": 5}
+
+
+class TestMakeCacheKey:
+    def test_same_inputs_same_key(self) -> None:
+        a = make_cache_key("m", [{"type": "text", "text": "sys"}], "user", 300)
+        b = make_cache_key("m", [{"type": "text", "text": "sys"}], "user", 300)
+        assert a == b
+
+    def test_each_input_changes_key(self) -> None:
+        base = make_cache_key("m", "sys", "user", 300)
+        assert make_cache_key("other", "sys", "user", 300) != base
+        assert make_cache_key("m", "sys2", "user", 300) != base
+        assert make_cache_key("m", "sys", "user2", 300) != base
+        assert make_cache_key("m", "sys", "user", 301) != base
+
+
+class TestResponseCache:
+    def test_memory_roundtrip_and_counters(self) -> None:
+        cache = ResponseCache(path=None)
+        assert cache.get("k") is None
+        cache.put("k", VALUE)
+        assert cache.get("k") == VALUE
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_persists_across_instances(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "cache", "responses.sqlite3")
+            cache = ResponseCache(path)
+            cache.put("k", VALUE)
+            cache.close()
+
+            reopened = ResponseCache(path)
+            assert reopened.get("k") == VALUE
+            reopened.close()
+
+    def test_memory_layer_is_lru_bounded(self) -> None:
+        cache = ResponseCache(path=None, max_memory_entries=2)
+        cache.put("a", VALUE)
+        cache.put("b", VALUE)
+        cache.get("a")
+        cache.put("c", VALUE)
+        assert cache.get("b") is None
+        assert cache.get("a") == VALUE
+
+    def test_expired_entries_miss(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ResponseCache(os.path.join(tmpdir, "c.sqlite3"), ttl_seconds=0.01)
+            cache.put("k", VALUE)
+            time.sleep(0.02)
+            assert cache.get("k") is None
+            cache.close()
+
+    def test_prune_trims_to_max_entries(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "c.sqlite3")
+            cache = ResponseCache(path, max_memory_entries=1, max_entries=3)
+            for i in range(5):
+                cache.put(f"k{i}", VALUE)
+            cache.prune()
+            cache.close()
+
+            reopened = ResponseCache(path)
+            assert reopened.get("k0") is None
+            assert reopened.get("k4") == VALUE
+            reopened.close()
+
+
+class TestRunnerResponseCache:
+    def test_second_call_is_served_from_cache(self) -> None:
+        runner, fake = make_runner(None, response_cache=ResponseCache(path=None))
+        first = asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        second = asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        assert len(fake.calls) == 1
+        assert not first.cached
+        assert second.cached
+        assert second.response_text == first.response_text
+        assert second.sentiment == first.sentiment
+
+    def test_different_product_misses(self) -> None:
+        runner, fake = make_runner(None, response_cache=ResponseCache(path=None))
+        asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A scarf"))
+        assert len(fake.calls) == 2
+
+    def test_bypass_neither_reads_nor_writes(self) -> None:
+        runner, fake = make_runner(None, response_cache=ResponseCache(path=None))
+        asyncio.run(
+            runner.run_single_agent("p1", "You are Bob.", "A hat", bypass_cache=True)
+        )
+        asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        assert len(fake.calls) == 2
+
+    def test_refresh_overwrites_entry(self) -> None:
+        runner, fake = make_runner(None, response_cache=ResponseCache(path=None))
+        asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        fake.text = "Not for me, too boring."
+        refreshed = asyncio.run(
+            runner.run_single_agent("p1", "You are Bob.", "A hat", refresh_cache=True)
+        )
+        again = asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        assert len(fake.calls) == 2
+        assert not refreshed.cached
+        assert again.cached
+        assert again.response_text == "Not for me, too boring."
+
+    def test_errors_are_not_cached(self) -> None:
+        runner, fake = make_runner(None, response_cache=ResponseCache(path=None))
+
+        def boom(request: dict) -> None:
+            raise RuntimeError("upstream down")
+
+        fake.respond = boom
+        failed = asyncio.run(runner.run_single_agent("p1", "You are Bob.", "A hat"))
+        assert failed.response_text.startswith("[Error:")
+        assert runner.response_cache.stats()["memory_entries"] == 0
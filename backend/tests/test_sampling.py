@@ -0,0 +1,169 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from app.models.schemas import AgentResponse
+from app.services.persona_store import Persona
+from app.services.sampling import (
+    CLUSTER_STRATUM,
+    SamplingPlan,
+    StratifiedTally,
+    breakdown_error,
+    segment_breakdown,
+    sentiment_breakdown,
+    stratified_order,
+    stratum_of,
+    wilson_interval,
+)
+from tests.fakes import make_runner
+
+
+def _response(sentiment: str, stratum: str | None = None, weight: float = 1.0):
+    return AgentResponse(
+        agent_id="x",
+        profile_name="X",
+        age=30,
+        segment="adult",
+        response_text="",
+        sentiment=sentiment,
+        response_time_ms=0,
+        stratum=stratum,
+        sample_weight=weight,
+    )
+
+
+class TestStratifiedOrder:
+    def test_prefixes_are_proportional(self) -> None:
+        personas = [
+            Persona(str(i), "", {"age": 20 if i < 300 else 70}) for i in range(400)
+        ]
+        order = stratified_order(personas, seed=1)
+        assert sorted(p.profile_id for p in order) == sorted(
+            p.profile_id for p in personas
+        )
+        # Both strata come first, then three young adults per senior
+        assert {stratum_of(p.entry) for p in order[:2]} == {"young_adult", "senior"}
+        counts = Counter(stratum_of(p.entry) for p in order[:100])
+        assert counts["young_adult"] == pytest.approx(75, abs=2)
+
+    def test_stratum_of(self) -> None:
+        entry = {"age": 47, "segments": ["mature", "frequent_shopper", "tops_buyer"]}
+        assert stratum_of(entry) == "mature/frequent_shopper"
+        assert stratum_of({"age": 24}) == "young_adult"
+
+
+class TestEstimates:
+    def test_wilson_interval(self) -> None:
+        low, high = wilson_interval(0.5, 100, 1.96)
+        assert low == pytest.approx(0.404, abs=1e-3)
+        assert high == pytest.approx(0.596, abs=1e-3)
+        assert wilson_interval(0.0, 20, 1.96)[0] == 0.0
+
+    def test_undersampled_stratum_is_reweighted(self) -> None:
+        # 90% of the population is positive, but half the sample is negative
+        tally = StratifiedTally({"a": 900, "b": 100})
+        for _ in range(20):
+            tally.add("a", "positive")
+            tally.add("b", "negative")
+        share, low, high = tally.estimate("positive")
+        assert share == pytest.approx(0.9)
+        assert low < 0.9 < high
+
+    def test_agreeing_cluster_representatives_are_not_certain(self) -> None:
+        def tally(prefix: str) -> StratifiedTally:
+            strata = [f"{prefix}{c}" for c in range(10)]
+            tally = StratifiedTally(dict.fromkeys(strata, 20))
+            for c, stratum in enumerate(strata):
+                for _ in range(2):
+                    tally.add(stratum, "positive" if c < 6 else "negative")
+            return tally
+
+        share, low, high = tally(CLUSTER_STRATUM).estimate("positive")
+        _, plain_low, plain_high = tally("band-").estimate("positive")
+        # Two typical members that agree say nothing of their cluster's
+        # spread: the clusters' spread sets the interval instead
+        assert share == pytest.approx(0.6)
+        assert high - low > plain_high - plain_low
+        assert low < 0.4 and high > 0.8
+
+    def test_census_has_no_uncertainty(self) -> None:
+        tally = StratifiedTally({"a": 3})
+        for label in ("positive", "positive", "negative"):
+            tally.add("a", label)
+        assert tally.estimate("positive") == pytest.approx((2 / 3, 2 / 3, 2 / 3))
+
+    def test_breakdown_uses_sample_weights(self) -> None:
+        responses = [_response("positive", "a", 45.0) for _ in range(2)]
+        responses += [_response("negative", "b", 5.0) for _ in range(2)]
+        breakdown = sentiment_breakdown(responses)
+        assert (breakdown.positive, breakdown.negative) == (2, 2)
+        assert breakdown.positive_pct == 90.0
+        assert breakdown.population == 100
+        assert breakdown.sample_size == 4
+        low, high = breakdown.positive_interval
+        assert low < 90.0 < high
+
+    def test_full_run_breakdown(self) -> None:
+        responses = [_response("positive"), _response("neutral")]
+        breakdown = sentiment_breakdown(responses)
+        assert breakdown.positive_pct == 50.0
+        assert breakdown.positive_interval == (50.0, 50.0)
+
+
+class TestSampledRun:
+    def test_stops_early_on_clear_cut_product(self) -> None:
+        runner, fake = make_runner(
+            text="I love it, would definitely buy!", max_concurrent=4
+        )
+        total = len(runner.registry)
+        plan = SamplingPlan(ci_width=0.1)
+
+        responses = asyncio.run(runner.run_all_agents("Tees", sampling=plan))
+        assert plan.min_samples <= len(responses) < total / 3
+        # Nothing is launched after stopping beyond what was in flight
+        assert len(fake.calls) <= len(responses) + 4
+        assert sum(r.sample_weight for r in responses) == pytest.approx(total)
+        assert all(r.stratum for r in responses)
+
+        breakdown = sentiment_breakdown(responses)
+        assert breakdown.positive_pct == 100.0
+        low, high = breakdown.positive_interval
+        assert high - low <= 10.0
+
+    def test_iterating_a_sample_weights_it_at_the_end(self) -> None:
+        runner, _ = make_runner(
+            text="I love it, would definitely buy!", max_concurrent=4
+        )
+
+        async def main() -> list[AgentResponse]:
+            plan = SamplingPlan(ci_width=0.1)
+            return [r async for r in runner.iter_agents("Tees", sampling=plan)]
+
+        responses = asyncio.run(main())
+        assert len(responses) < len(runner.registry)
+        total = sum(r.sample_weight for r in responses)
+        assert total == pytest.approx(len(runner.registry))
+
+    def test_max_agents_caps_the_sample(self) -> None:
+        runner, fake = make_runner(text="It's okay I guess.", max_concurrent=4)
+        plan = SamplingPlan(ci_width=0.01)
+        responses = asyncio.run(
+            runner.run_all_agents("Tees", max_agents=12, sampling=plan)
+        )
+        assert len(responses) == len(fake.calls) == 12
+        assert sum(r.sample_weight for r in responses) <= len(runner.registry)
+
+
+class TestSegmentBreakdown:
+    def test_per_segment_and_error(self) -> None:
+        responses = [_response("positive", "a", 3.0), _response("negative", "b", 1.0)]
+        responses[1].segment = "senior"
+        segments = segment_breakdown(responses)
+        assert list(segments) == ["adult", "senior"]
+        assert segments["adult"].positive_pct == 100.0
+        assert segments["adult"].population == 3
+
+        overall = sentiment_breakdown(responses)
+        assert overall.positive_pct == 75.0
+        assert breakdown_error(overall, segments["adult"]) == 25.0
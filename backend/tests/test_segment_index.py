@@ -0,0 +1,166 @@
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.persona_registry import PersonaRegistry
+from app.services.persona_store import STORE_FILENAME, pack_directory
+from app.services.segment_index import (
+    SegmentIndex,
+    SegmentQuery,
+    bitmap_positions,
+    parse_expression,
+)
+from tests.fakes import make_runner
+
+PROCESSED_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "processed")
+
+ENTRIES = [
+    {
+        "age": 22,
+        "segments": ["young_adult", "tops_buyer"],
+        "club_member_status": "ACTIVE",
+    },
+    {
+        "age": 35,
+        "segments": ["adult", "tops_buyer", "bottoms_buyer"],
+        "club_member_status": "ACTIVE",
+    },
+    {
+        "age": 58,
+        "segments": ["mature", "bottoms_buyer"],
+        "club_member_status": "PRE-CREATE",
+    },
+    {"age": 71, "segments": ["senior"], "club_member_status": "ACTIVE"},
+    {
+        "age": 24,
+        "segments": ["young_adult", "fullbody_buyer"],
+        "club_member_status": "ACTIVE",
+    },
+]
+
+
+def _brute_force(entries: list[dict], predicate) -> list[int]:
+    return [i for i, e in enumerate(entries) if predicate(set(e["segments"]), e)]
+
+
+class TestParseExpression:
+    def test_precedence(self) -> None:
+        assert parse_expression("a OR b AND NOT c") == (
+            "or",
+            ("seg", "a"),
+            ("and", ("seg", "b"), ("not", ("seg", "c"))),
+        )
+        assert parse_expression("(a or b) and c") == (
+            "and",
+            ("or", ("seg", "a"), ("seg", "b")),
+            ("seg", "c"),
+        )
+
+    @pytest.mark.parametrize("bad", ["", "a AND", "(a OR b", "a b", "NOT", "a )"])
+    def test_rejects_malformed(self, bad: str) -> None:
+        with pytest.raises(ValueError):
+            parse_expression(bad)
+
+
+class TestSegmentIndex:
+    def test_boolean_queries_match_brute_force(self) -> None:
+        index = SegmentIndex(ENTRIES)
+        n = len(index)
+        cases = {
+            "tops_buyer": lambda s, e: "tops_buyer" in s,
+            "young_adult AND NOT tops_buyer": lambda s, e: "young_adult" in s
+            and "tops_buyer" not in s,
+            "senior OR (bottoms_buyer AND NOT adult)": lambda s, e: "senior" in s
+            or ("bottoms_buyer" in s and "adult" not in s),
+            "NOT NOT mature": lambda s, e: "mature" in s,
+        }
+        for expression, predicate in cases.items():
+            got = bitmap_positions(index.expression(expression), n)
+            assert got == _brute_force(ENTRIES, predicate), expression
+
+    def test_query_combines_segments_age_and_club(self) -> None:
+        index = SegmentIndex(ENTRIES)
+        query = SegmentQuery(
+            segments=("tops_buyer", "bottoms_buyer"),
+            age_min=30,
+            club_member_status=("ACTIVE",),
+        )
+        assert index.select(query) == [1]
+        assert index.select(SegmentQuery(age_min=20, age_max=24)) == [0, 4]
+        assert index.select(SegmentQuery(club_member_status=("PRE-CREATE",))) == [2]
+        assert index.select(SegmentQuery()) == [0, 1, 2, 3, 4]
+        assert index.select(SegmentQuery(age_min=90)) == []
+
+    def test_unknown_segment(self) -> None:
+        with pytest.raises(ValueError, match="no_such_segment"):
+            SegmentIndex(ENTRIES).expression("adult OR no_such_segment")
+
+    def test_counts(self) -> None:
+        index = SegmentIndex(ENTRIES)
+        assert index.count("young_adult") == 2
+        assert index.count("missing") == 0
+        assert "fullbody_buyer" in index.segments
+
+
+class TestRegistrySelect:
+    def test_loose_and_packed_agree(self) -> None:
+        loose = PersonaRegistry(PROCESSED_DIR)
+        loose.load()
+        query = SegmentQuery(segments=("senior AND NOT tops_buyer",), age_max=80)
+        expected = [
+            p.profile_id
+            for p in loose.all()
+            if "senior" in p.entry["segments"]
+            and "tops_buyer" not in p.entry["segments"]
+            and p.entry["age"] <= 80
+        ]
+        assert expected
+        assert [p.profile_id for p in loose.select(query)] == expected
+        assert [p.profile_id for p in loose.select(query, limit=1)] == expected[:1]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pack_directory(PROCESSED_DIR, Path(tmpdir, STORE_FILENAME))
+            packed = PersonaRegistry(tmpdir)
+            packed.load()
+            assert packed.packed
+            selected = packed.select(query)
+            assert [p.profile_id for p in selected] == expected
+            assert selected[0] == loose.get(expected[0])
+
+
+class TestTargetedRuns:
+    def test_runs_only_matching_personas(self) -> None:
+        runner, fake = make_runner()
+        query = SegmentQuery(segments=("young_adult",), club_member_status=("ACTIVE",))
+        expected = {
+            pid
+            for pid, e in ((p.profile_id, p.entry) for p in runner.registry.all())
+            if "young_adult" in e["segments"] and e["club_member_status"] == "ACTIVE"
+        }
+
+        responses = asyncio.run(runner.run_all_agents("Graphic tees", query=query))
+        assert {r.agent_id for r in responses} == expected
+        assert len(fake.calls) == len(expected)
+
+    def test_runs_a_resolved_subset(self) -> None:
+        runner, fake = make_runner()
+        personas = asyncio.run(
+            runner.select_agents(query=SegmentQuery(segments=("senior",)), max_agents=3)
+        )
+        responses = asyncio.run(runner.run_all_agents("Tees", personas=personas))
+        assert [r.agent_id for r in responses] == [p.profile_id for p in personas]
+        assert len(fake.calls) == 3
+
+    def test_endpoint_rejects_unknown_segment(self) -> None:
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/test",
+                json={"product_description": "Tees", "target_segments": ["elves"]},
+            )
+        assert response.status_code == 400
+        assert "elves" in response.json()["detail"]
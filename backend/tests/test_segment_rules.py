@@ -0,0 +1,192 @@
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from app.services.persona_registry import PersonaRegistry
+from app.services.segment_rules import (
+    FeatureTable,
+    SegmentRules,
+    assign_segments,
+    resegment_directory,
+)
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from convert_real_data import convert_all  # noqa: E402
+
+from tests.fakes import write_fixture_csv  # noqa: E402
+
+PROCESSED_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "processed")
+
+
+def _entry(age: int, count: int, spent: float, categories: dict, **extra) -> dict:
+    return {
+        "age": age,
+        "purchase_count": count,
+        "club_member_status": extra.pop("club", "ACTIVE"),
+        "features": {
+            "total_spent": spent,
+            "online_share": extra.pop("online", 0.5),
+            "categories": categories,
+        },
+        **extra,
+    }
+
+
+ENTRIES = [
+    _entry(22, 4, 0.1, {"Garment Upper body": 3, "Shoes": 1}, online=1.0),
+    _entry(38, 30, 1.5, {"Garment Lower body": 20, "Garment Upper body": 10}),
+    _entry(61, 8, 0.4, {"Garment Full body": 8}, club="PRE-CREATE", online=0.0),
+]
+
+
+def _segment(where: dict) -> list[int]:
+    masks = SegmentRules([{"name": "s", "where": where}]).masks(FeatureTable(ENTRIES))
+    return masks["s"].nonzero()[0].tolist()
+
+
+class TestRules:
+    def test_comparisons(self) -> None:
+        assert _segment({"age": {"gte": 25, "lt": 40}}) == [1]
+        assert _segment({"purchase_count": {"gt": 5}, "age": {"gt": 50}}) == [2]
+        assert _segment({"total_spent": {"gte": 0.4}}) == [1, 2]
+        assert _segment({"avg_price": {"eq": 0.05}}) == [1, 2]
+        assert _segment({"online_share": {"gt": 0.9}}) == [0]
+
+    def test_membership(self) -> None:
+        assert _segment({"club_member_status": {"in": ["PRE-CREATE"]}}) == [2]
+        assert _segment({"club_member_status": {"not_in": ["PRE-CREATE"]}}) == [0, 1]
+
+    def test_categories(self) -> None:
+        assert _segment({"category_count": {"match": "Upper", "gt": 0}}) == [0, 1]
+        assert _segment({"category_count": {"groups": ["Shoes"], "gte": 1}}) == [0]
+        # Two thirds of customer 1's purchases are bottoms
+        assert _segment({"category_share": {"match": "Lower", "gt": 0.6}}) == [1]
+        assert _segment({"category_share": {"match": "Nope", "gt": 0}}) == []
+
+    def test_composition(self) -> None:
+        assert _segment({"any": [{"age": {"lt": 25}}, {"age": {"gt": 60}}]}) == [0, 2]
+        assert _segment({"not": {"age": {"lt": 25}}}) == [1, 2]
+        assert _segment(
+            {"all": [{"age": {"lt": 40}}, {"not": {"purchase_count": {"lt": 10}}}]}
+        ) == [1]
+
+    def test_segments_listed_in_rule_order(self) -> None:
+        rules = SegmentRules(
+            [
+                {"name": "spender", "where": {"total_spent": {"gte": 1}}},
+                {"name": "adult", "where": {"age": {"gte": 25}}},
+            ]
+        )
+        assert rules.evaluate(FeatureTable(ENTRIES)) == [
+            [],
+            ["spender", "adult"],
+            ["adult"],
+        ]
+
+    @pytest.mark.parametrize(
+        "rule",
+        [
+            {"name": "x", "where": {"height": {"gt": 1}}},
+            {"name": "x", "where": {"age": {"about": 30}}},
+            {"name": "x", "where": {"age": {"gt": "thirty"}}},
+            {"name": "x", "where": {"age": {}}},
+            {"name": "x", "where": {"category_count": {"gt": 0}}},
+            {"name": "x", "where": {"club_member_status": {"is": "ACTIVE"}}},
+            {"name": "x", "where": {"any": []}},
+            {"name": "x", "where": {}},
+            {"where": {"age": {"gt": 1}}},
+        ],
+    )
+    def test_invalid_rules_fail_to_compile(self, rule: dict) -> None:
+        with pytest.raises(ValueError):
+            SegmentRules([rule])
+
+    def test_duplicate_names(self) -> None:
+        rule = {"name": "x", "where": {"age": {"gt": 1}}}
+        with pytest.raises(ValueError, match="duplicate"):
+            SegmentRules([rule, rule])
+
+    def test_feature_rules_need_recorded_features(self) -> None:
+        with open(os.path.join(PROCESSED_DIR, "manifest.json")) as f:
+            manifest = json.load(f)
+        # Age, purchase count and club status are in every entry...
+        age_only = SegmentRules([{"name": "young", "where": {"age": {"lt": 25}}}])
+        assert assign_segments(manifest, age_only)["young"] > 0
+        # ...spend and categories only in entries built with features
+        with pytest.raises(ValueError, match="features"):
+            SegmentRules.load().masks(FeatureTable(list(manifest.values())))
+
+
+class TestResegment:
+    def test_default_rules_match_legacy_inference(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_path = os.path.join(tmpdir, "data.csv")
+            write_fixture_csv(csv_path)
+            manifest = convert_all(csv_path, os.path.join(tmpdir, "out"))
+
+        for entry in manifest.values():
+            age, count = entry["age"], entry["purchase_count"]
+            groups = entry["features"]["categories"]
+            expected = [
+                (
+                    "young_adult"
+                    if age < 25
+                    else "adult" if age < 40 else "mature" if age < 55 else "senior"
+                ),
+                (
+                    "frequent_shopper"
+                    if count > 20
+                    else "regular_shopper" if count > 5 else "occasional_shopper"
+                ),
+            ]
+            for marker, segment in (
+                ("Upper", "tops_buyer"),
+                ("Lower", "bottoms_buyer"),
+                ("Full", "fullbody_buyer"),
+            ):
+                if any(marker in group for group in groups):
+                    expected.append(segment)
+            assert entry["segments"] == expected
+
+    def test_rewrites_manifest_and_store_only(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_path = os.path.join(tmpdir, "data.csv")
+            out = os.path.join(tmpdir, "out")
+            write_fixture_csv(csv_path)
+            convert_all(csv_path, out, pack=True)
+            texts = {p.name: p.read_bytes() for p in Path(out).glob("*.txt")}
+            stamps = {p.name: p.stat().st_mtime_ns for p in Path(out).glob("*.txt")}
+
+            rules = SegmentRules(
+                [
+                    {"name": "big_basket", "where": {"purchase_count": {"gte": 5}}},
+                    {"name": "online_first", "where": {"online_share": {"gt": 0.5}}},
+                ]
+            )
+            counts = resegment_directory(out, rules)
+
+            with open(os.path.join(out, "manifest.json")) as f:
+                manifest = json.load(f)
+            registry = PersonaRegistry(out)
+            registry.load()
+            assert registry.packed
+            for cid, entry in manifest.items():
+                expected = []
+                if entry["purchase_count"] >= 5:
+                    expected.append("big_basket")
+                if entry["features"]["online_share"] > 0.5:
+                    expected.append("online_first")
+                assert entry["segments"] == expected
+                assert registry.get(cid).entry == entry
+            assert counts["big_basket"] == sum(
+                e["purchase_count"] >= 5 for e in manifest.values()
+            )
+            assert {p.name: p.read_bytes() for p in Path(out).glob("*.txt")} == texts
+            assert {
+                p.name: p.stat().st_mtime_ns for p in Path(out).glob("*.txt")
+            } == stamps
@@ -0,0 +1,89 @@
+import pytest
+
+from app.services.sentiment import (
+    detect_sentiment,
+    detect_sentiment_batch,
+    score_sentiment,
+)
+
+
+class TestWordBoundaries:
+    def test_keywords_inside_words_do_not_match(self) -> None:
+        assert detect_sentiment("So passionate about my wardrobe") == "neutral"
+        assert detect_sentiment("A bit cheaper-looking but fine") == "neutral"
+        assert detect_sentiment("My eyes lit up at the lovely print") == "neutral"
+
+    def test_punctuation_and_line_breaks_delimit_words(self) -> None:
+        assert detect_sentiment("(love) it") == "positive"
+        assert detect_sentiment("Hmm.\nUgly, sorry") == "negative"
+
+    def test_longest_phrase_counts_once(self) -> None:
+        scores = score_sentiment("I wouldn't buy it")
+        assert (scores.positive, scores.negative) == (0.0, 0.5)
+
+    def test_curly_apostrophes(self) -> None:
+        assert detect_sentiment("I can’t wait to wear it") == "positive"
+        assert detect_sentiment("I don’t like the print") == "negative"
+
+
+class TestNegation:
+    def test_negated_positive_is_negative(self) -> None:
+        assert detect_sentiment("It's not great") == "negative"
+        assert detect_sentiment("I don't really want it") == "negative"
+
+    def test_negated_negative_is_positive(self) -> None:
+        assert detect_sentiment("At that price it's not overpriced") == "positive"
+
+    def test_negation_window_is_limited(self) -> None:
+        assert detect_sentiment("Not what I expected from the brand, love") == (
+            "positive"
+        )
+        assert (
+            detect_sentiment("Never seen a shop do it this well and I love it")
+            == "positive"
+        )
+
+    def test_negation_stops_at_clause_break(self) -> None:
+        assert detect_sentiment("Not sure. Love the colours") == "positive"
+        assert detect_sentiment("I don't know but I love it") == "positive"
+
+    def test_negated_phrases_are_not_flipped_again(self) -> None:
+        assert detect_sentiment("I'm not interested") == "negative"
+
+
+class TestBatch:
+    def test_matches_single_text_scoring_in_order(self) -> None:
+        texts = ["Love it!", "", "Not for me, too boring", "I could see it working"]
+        results = detect_sentiment_batch(texts)
+        assert [r.label for r in results] == [
+            "positive",
+            "neutral",
+            "negative",
+            "neutral",
+        ]
+        assert results == [score_sentiment(t) for t in texts]
+
+    def test_scores_are_a_distribution(self) -> None:
+        for scores in detect_sentiment_batch(
+            ["Love it, amazing", "Hate it", "meh", "love it but hate the price"]
+        ):
+            total = scores.positive + scores.negative + scores.neutral
+            assert total == pytest.approx(1.0, abs=0.002)
+            assert 0 < scores.confidence <= 1
+
+    def test_confidence_grows_with_agreeing_hits(self) -> None:
+        one, three = detect_sentiment_batch(["Love it", "Love it, amazing, would buy"])
+        assert one.label == three.label == "positive"
+        assert three.confidence > one.confidence
+
+    def test_negation_stops_at_the_end_of_a_text(self) -> None:
+        texts = ["I would never", "love it", "", "Not", "great"]
+        assert detect_sentiment_batch(texts) == [score_sentiment(t) for t in texts]
+        assert detect_sentiment_batch(texts)[1].label == "positive"
+
+    def test_texts_holding_the_separator(self) -> None:
+        texts = ["Love it \x1e not", "great", "hate \x1e\x1e"]
+        assert detect_sentiment_batch(texts) == [score_sentiment(t) for t in texts]
+
+    def test_empty_batch(self) -> None:
+        assert detect_sentiment_batch([]) == []
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.schemas import AgentChunk, AgentResponse
+from app.routers import test as test_router
+from app.services.aggregator import InsightAggregator
+from app.services.concurrency import AdaptiveLimiter
+from tests.fakes import FakeAnthropic, make_runner
+
+ANSWER = "Honestly I love the vintage look and would definitely buy one or two"
+
+
+class TestStreamingRunner:
+    def test_chunks_then_final_response(self) -> None:
+        runner, _ = make_runner(text=ANSWER, streaming=True, stream_chunk_ms=0)
+        events: list = []
+
+        async def on_event(event: object) -> None:
+            events.append(event)
+
+        asyncio.run(
+            runner.run_all_agents("Graphic tees", max_agents=1, callback=on_event)
+        )
+
+        chunks = [e for e in events if isinstance(e, AgentChunk)]
+        finals = [e for e in events if isinstance(e, AgentResponse)]
+        assert len(finals) == 1
+        assert events[-1] is finals[0]
+        assert len(chunks) > 1
+        assert "".join(c.text for c in chunks) == ANSWER
+        assert finals[0].time_to_first_token_ms is not None
+        assert finals[0].time_to_first_token_ms <= finals[0].response_time_ms
+
+    def test_chunks_are_debounced(self) -> None:
+        runner, _ = make_runner(text=ANSWER, streaming=True, stream_chunk_ms=60_000)
+        chunks: list = []
+
+        async def on_event(event: object) -> None:
+            if isinstance(event, AgentChunk):
+                chunks.append(event)
+
+        asyncio.run(
+            runner.run_all_agents("Graphic tees", max_agents=1, callback=on_event)
+        )
+        # First delta flushes immediately, the rest is held until the final flush
+        assert len(chunks) == 2
+        assert "".join(c.text for c in chunks) == ANSWER
+
+    def test_non_streaming_has_no_ttft(self) -> None:
+        runner, _ = make_runner(text=ANSWER, streaming=True, stream_chunk_ms=0)
+        runner.streaming = False
+        events: list = []
+
+        async def on_event(event: object) -> None:
+            events.append(event)
+
+        asyncio.run(
+            runner.run_all_agents("Graphic tees", max_agents=2, callback=on_event)
+        )
+        assert all(isinstance(e, AgentResponse) for e in events)
+        assert all(e.time_to_first_token_ms is None for e in events)
+
+
+class TestStreamEndpoint:
+    def test_sse_stream_emits_chunks_responses_and_completion(self) -> None:
+        with TestClient(app) as client:
+            runner = app.state.agent_runner
+            runner.client = FakeAnthropic(text=ANSWER)
+            runner.streaming = True
+            runner.stream_chunk_ms = 0
+            runner.response_cache = None
+            app.state.aggregator.client = FakeAnthropic(text="## Summary")
+
+            # Room for every event sent before the stream is opened, which
+            # would otherwise be dropped
+            with patch.object(test_router, "STREAM_BUFFER_EVENTS", 10_000):
+                test_id = client.post(
+                    "/api/test", json={"product_description": "Graphic tees"}
+                ).json()["test_id"]
+            assert client.get(f"/api/test/{test_id}/results").status_code == 404
+
+            events: list[tuple[str, str]] = []
+            event_name = ""
+            with client.stream("GET", f"/api/test/{test_id}/stream") as response:
+                for line in response.iter_lines():
+                    if line.startswith("event:"):
+                        event_name = line.split(":", 1)[1].strip()
+                    elif line.startswith("data:"):
+                        events.append((event_name, line.split(":", 1)[1].strip()))
+            results = client.get(f"/api/test/{test_id}/results").json()
+            live = client.get(f"/api/test/{test_id}/live").json()
+
+        names = [name for name, _ in events]
+        # Drafts are off by default
+        assert "insights_draft" not in names
+        assert "agent_chunk" in names
+        assert names[-3:] == [
+            "agents_complete",
+            "aggregation_started",
+            "insights_ready",
+        ]
+        completed = json.loads(events[-3][1])
+        assert completed["status"] == "complete"
+        assert completed["total"] == names.count("agent_response")
+        assert json.loads(events[-1][1]) == {"test_id": test_id}
+        # Live tallies arrive during the run; the last is final and complete
+        assert names.index("live_stats") < names.index("agents_complete")
+        assert names[-4] == "live_stats"
+        final = json.loads(events[-4][1])
+        assert final["final"] and final["completed"] == completed["total"]
+        assert final["sentiment_breakdown"] == results["sentiment_breakdown"]
+        assert live == final
+        assert results["executive_summary"] == "## Summary"
+        assert results["total_agents"] == completed["total"]
+        assert not results["draft"]
+        assert results["segments"]
+
+    def test_slow_client_holds_back_the_run(self) -> None:
+        runner, fake = make_runner(text=ANSWER)
+        runner.limiter = AdaptiveLimiter(initial_limit=4, max_limit=4)
+        aggregator = InsightAggregator(api_key="test")
+        aggregator.client = FakeAnthropic(text="## Summary")
+        request = SimpleNamespace(
+            app=SimpleNamespace(
+                state=SimpleNamespace(
+                    agent_runner=runner,
+                    aggregator=aggregator,
+                    persona_registry=runner.registry,
+                )
+            )
+        )
+
+        async def main() -> tuple[int, list[dict]]:
+            started = await test_router.start_test(
+                test_router.TestRequest(product_description="Graphic tees"), request
+            )
+            stream = await test_router.stream_test(started["test_id"])
+            events = stream.body_iterator
+            first = [await events.__anext__()]
+            await asyncio.sleep(0.5)
+            # The client has stopped reading: only what fits in the queue, the
+            # runner's buffer and one finished agent per worker got out
+            held_back = len(fake.calls)
+            return held_back, first + [event async for event in events]
+
+        with patch.object(test_router, "STREAM_BUFFER_EVENTS", 8):
+            held_back, events = asyncio.run(main())
+
+        names = [event["event"] for event in events]
+        assert held_back <= 1 + 8 + 8 + 4
+        assert names.count("agent_response") == len(fake.calls) > held_back
+        assert names[-1] == "insights_ready"
+
+    def test_run_finishes_without_a_reader(self) -> None:
+        with TestClient(app) as client:
+            runner = app.state.agent_runner
+            fake = FakeAnthropic(text=ANSWER)
+            runner.client = fake
+            runner.streaming = False
+            runner.response_cache = None
+            app.state.aggregator.client = FakeAnthropic(text="## Summary")
+
+            with patch.object(test_router, "STREAM_BUFFER_EVENTS", 8):
+                test_id = client.post(
+                    "/api/test", json={"product_description": "Graphic tees"}
+                ).json()["test_id"]
+                # Only polled: the stream is never opened
+                for _ in range(200):
+                    results = client.get(f"/api/test/{test_id}/results")
+                    if results.status_code == 200:
+                        break
+                    time.sleep(0.05)
+
+        assert results.status_code == 200
+        assert results.json()["total_agents"] == len(fake.calls) == 198
+
+    def test_unknown_test_is_404(self) -> None:
+        with TestClient(app) as client:
+            assert client.get("/api/test/nope/stream").status_code == 404
@@ -0,0 +1,128 @@
+import asyncio
+
+from app.models.schemas import AgentResponse
+from app.services.aggregator import InsightAggregator
+from app.services.themes import ThemeExtractor, describe, phrases
+from tests.fakes import FakeAnthropic, make_message
+
+PRICE = [
+    "The price is too high for linen, I'd wait for a sale.",
+    "Way too expensive. The price would put me off.",
+]
+FABRIC = [
+    "Love the breathable linen fabric for summer holidays.",
+    "Breathable linen fabric is perfect in hot weather.",
+]
+SIZING = [
+    "Worried about the sizing, linen shirts always run small.",
+    "The sizing looks off and I'd need to try it on in store.",
+]
+
+
+def _response(i: int, text: str, segment: str = "adult", sentiment="neutral"):
+    return AgentResponse(
+        agent_id=f"a{i}",
+        profile_name=f"Customer {i}",
+        age=30,
+        segment=segment,
+        response_text=text,
+        sentiment=sentiment,
+        response_time_ms=1.0,
+    )
+
+
+def _crowd() -> ThemeExtractor:
+    """30 responses: 12 on price, 10 on fabric, 8 seniors on sizing."""
+    extractor = ThemeExtractor()
+    texts = [PRICE[i % 2] for i in range(12)] + [FABRIC[i % 2] for i in range(10)]
+    for i, text in enumerate(texts):
+        sentiment = "negative" if text in PRICE else "positive"
+        extractor.add(_response(i, text, sentiment=sentiment), ["tops_buyer"])
+    for i in range(8):
+        extractor.add(_response(30 + i, SIZING[i % 2], "senior"), ["tops_buyer"])
+    return extractor
+
+
+class TestPhrases:
+    def test_phrases_skip_stopword_edges_and_clauses(self) -> None:
+        found = phrases("Great value for money, but the fit is tight.")
+        assert found["value for money"] == 1
+        assert found["great value"] == 1
+        assert "for money" not in found
+        # "money, but the fit" crosses a clause
+        assert not any("money" in p and "fit" in p for p in found)
+
+
+class TestThemes:
+    def test_clusters_labelled_by_their_phrases(self) -> None:
+        themes = _crowd().themes(3)
+        assert [t.count for t in themes] == [12, 10, 8]
+        assert [t.label for t in themes] == [
+            "price",
+            "breathable linen fabric",
+            "sizing",
+        ]
+        assert themes[0].negative == 12
+        assert themes[0].share_pct == 40.0
+        assert themes[0].quote in PRICE
+        assert "breathable" in describe(themes[1])
+
+    def test_failed_responses_ignored_and_empty_ok(self) -> None:
+        extractor = ThemeExtractor()
+        assert extractor.themes() == []
+        failed = _response(0, "[Error: overloaded]")
+        failed.status = "error"
+        extractor.add(failed)
+        assert len(extractor) == 0
+
+    def test_incremental_matches_batch(self) -> None:
+        extractor = _crowd()
+        early = extractor.themes(3)
+        extractor.add(_response(99, FABRIC[0]))
+        later = extractor.themes(3)
+        assert sum(t.count for t in later) == sum(t.count for t in early) + 1
+
+
+class TestSegmentThemes:
+    def test_contrastive_ranking(self) -> None:
+        extractor = _crowd()
+        senior = extractor.segment_themes("senior")
+        assert senior[0].label == "sizing"
+        assert senior[0].count == 8
+        # Seniors are the only ones to mention it
+        assert senior[0].lift is None
+        assert senior[0].quote in SIZING
+        adult = extractor.segment_themes("adult")
+        assert "sizing" not in [t.label for t in adult]
+
+    def test_tag_on_everyone_has_nothing_distinctive(self) -> None:
+        extractor = _crowd()
+        assert extractor.segment_themes("tops_buyer") == []
+        assert list(extractor.all_segment_themes()) == ["adult", "senior"]
+
+
+class TestKeyThemes:
+    def _aggregator(self, polish: bool, answer: str) -> InsightAggregator:
+        aggregator = InsightAggregator(api_key="test", polish_themes=polish)
+        fake = FakeAnthropic()
+        fake.respond = lambda request: make_message(answer)
+        aggregator.client = fake
+        return aggregator
+
+    def test_local_themes_without_polish(self) -> None:
+        aggregator = self._aggregator(False, "summary")
+        themes, lines = asyncio.run(aggregator.key_themes(_crowd(), "Shirts", 30))
+        assert lines == [describe(t) for t in themes]
+        assert len(aggregator.client.calls) == 0
+
+    def test_polish_rewords_top_themes(self) -> None:
+        aggregator = self._aggregator(True, "- Price puts 12 customers off\n- Fabric")
+        themes, lines = asyncio.run(aggregator.key_themes(_crowd(), "Shirts", 30))
+        assert lines == ["Price puts 12 customers off", "Fabric"]
+        prompt = aggregator.client.calls[0]["messages"][0]["content"]
+        assert "breathable linen fabric" in prompt
+
+    def test_unparseable_polish_falls_back(self) -> None:
+        aggregator = self._aggregator(True, "Sorry, I can't help.")
+        themes, lines = asyncio.run(aggregator.key_themes(_crowd(), "Shirts", 30))
+        assert lines == [describe(t) for t in themes]
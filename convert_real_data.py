@@ -8,22 +8,126 @@ by combining the lifestyle Summary with actual purchase history.
 Usage:
     python convert_real_data.py --input H_M_persona_data.csv --output backend/data/processed/
 
+    # Full-scale transaction files: bounded memory, spills to disk
+    python convert_real_data.py --input transactions.csv --streaming --partition-mb 256
+
+    # Vectorized aggregation (NumPy) instead of folding rows one at a time
+    python convert_real_data.py --input transactions.csv --columnar --workers 4
+
+    # Nightly refresh: only rewrite personas whose input rows changed
+    python convert_real_data.py --input transactions.csv --incremental
+
+    # Also pack everything into one memory-mapped personas.pack for the backend
+    python convert_real_data.py --input transactions.csv --pack
+
+    # Change segment definitions (backend/data/segments.json) without reconverting
+    python convert_real_data.py --output backend/data/processed/ --resegment
+
+    # Cluster near-duplicate personas for cheap preview runs
+    python convert_real_data.py --input transactions.csv --clusters 40
+
 Output:
     - One .txt persona file per customer in the output directory
     - manifest.json mapping customer_id → persona file path + demographics
+    - With --pack, personas.pack: all of the above in one file, which the
+      backend prefers; deploy just that file
+    - With --clusters K, clusters.json: K groups of similar personas, used
+      by the backend's preview runs
 """
 
 import csv
-import json
+import gc
+import hashlib
+import heapq
+import mmap
 import os
 import sys
+import tempfile
+import time
+import zlib
 from collections import defaultdict
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+
+# CSV columns the conversion reads; streaming mode spills only these
+CSV_COLUMNS = [
+    "customer_id", "Summary", "age", "club_member_status", "prod_name",
+    "product_type_name", "product_group_name", "colour_group_name",
+    "perceived_colour_value_name", "department_name", "index_name",
+    "section_name", "garment_group_name", "detail_desc", "t_dat", "price",
+    "sales_channel_id",
+]
+
+# The backend package, which owns the packed persona store format
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+# Number of recent purchases listed in a persona
+RECENT_PURCHASES = 5
+
+# Part of every input hash: bump it when the generated persona text changes
+# for the same input, so incremental runs regenerate every persona
+PERSONA_VERSION = 1
+
+
+def row_record(values) -> str:
+    """One row's CSV_COLUMNS values as a record for input hashing."""
+    return "\x1f".join(values) + "\x1e"
+
+
+def input_hasher():
+    """sha256 to feed a customer's row_records, in file order."""
+    return hashlib.sha256(f"persona-v{PERSONA_VERSION}\x1e".encode("utf-8"))
+
+
+def parse_purchase(row: dict) -> dict:
+    """One CSV row → purchase dict."""
+    return {
+        "product_name": row["prod_name"],
+        "product_type": row["product_type_name"],
+        "product_group": row["product_group_name"],
+        "color": row["colour_group_name"],
+        "perceived_color": row["perceived_colour_value_name"],
+        "department": row["department_name"],
+        "index_name": row["index_name"],
+        "section": row["section_name"],
+        "garment_group": row["garment_group_name"],
+        "detail_desc": row["detail_desc"],
+        "date": row["t_dat"],
+        "price": float(row["price"]) if row["price"] else 0,
+        "channel": "Online" if row.get("sales_channel_id") == "2" else "In-store",
+    }
+
+
+@lru_cache(maxsize=None)
+def parse_date(value: str) -> date | None:
+    """A t_dat string as a date (the export uses dd/mm/yyyy; ISO also works).
+
+    Dates must be compared as dates: the strings sort day-first, which
+    produced ranges like "from 03/07/2019 to 31/05/2019". There are only a
+    few hundred distinct days, so each string is parsed once.
+    """
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value.strip(), fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def date_key(value: str) -> int:
+    """Sortable day number for a t_dat string; -1 if missing or unparseable."""
+    parsed = parse_date(value) if value else None
+    return parsed.toordinal() if parsed else -1
 
 
 def load_and_group_data(csv_path: str) -> dict:
     """Load CSV and group rows by customer_id."""
     customers = defaultdict(lambda: {"summary": "", "age": 0, "purchases": []})
+    hashers = defaultdict(input_hasher)
     
     with open(csv_path, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
@@ -32,65 +136,427 @@ def load_and_group_data(csv_path: str) -> dict:
             customers[cid]["summary"] = row["Summary"]
             customers[cid]["age"] = int(float(row["age"])) if row["age"] else 0
             customers[cid]["club_member_status"] = row.get("club_member_status", "")
-            customers[cid]["purchases"].append({
-                "product_name": row["prod_name"],
-                "product_type": row["product_type_name"],
-                "product_group": row["product_group_name"],
-                "color": row["colour_group_name"],
-                "perceived_color": row["perceived_colour_value_name"],
-                "department": row["department_name"],
-                "index_name": row["index_name"],
-                "section": row["section_name"],
-                "garment_group": row["garment_group_name"],
-                "detail_desc": row["detail_desc"],
-                "date": row["t_dat"],
-                "price": float(row["price"]) if row["price"] else 0,
-                "channel": "Online" if row.get("sales_channel_id") == "2" else "In-store",
-            })
+            customers[cid]["purchases"].append(parse_purchase(row))
+            hashers[cid].update(row_record(row.get(col) or "" for col in CSV_COLUMNS).encode("utf-8"))
     
+    for cid, hasher in hashers.items():
+        customers[cid]["input_hash"] = hasher.hexdigest()
     return dict(customers)
 
 
-def build_purchase_summary(purchases: list) -> str:
-    """Create a natural-language shopping history from purchase rows."""
-    if not purchases:
+def partition_of(customer_id: str, n_partitions: int) -> int:
+    # crc32, not hash(): stable across processes and runs
+    return zlib.crc32(customer_id.encode("utf-8")) % n_partitions
+
+
+def _read_header(csv_path: str) -> tuple:
+    """The CSV header row and the byte offset where the data starts."""
+    with open(csv_path, "rb") as f:
+        line = f.readline()
+        return next(csv.reader([line.decode("utf-8")])), f.tell()
+
+
+def _count_quotes(mm: mmap.mmap, start: int, end: int) -> int:
+    step = 64 * 1024 * 1024
+    return sum(mm[i:min(i + step, end)].count(b'"') for i in range(start, end, step))
+
+
+def csv_chunks(csv_path: str, n_chunks: int) -> list:
+    """Split the CSV's data rows into ``n_chunks`` byte ranges on record boundaries.
+
+    A newline ends a record only outside quotes, i.e. after an even number
+    of quote characters (escaped quotes come in pairs), so quoted fields
+    spanning lines are never cut. Only quotes are counted, at C speed.
+    """
+    _, data_start = _read_header(csv_path)
+    size = os.path.getsize(csv_path)
+    if n_chunks <= 1 or size <= data_start:
+        return [(data_start, size)]
+    bounds = [data_start]
+    with open(csv_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos, quotes = data_start, 0
+        for i in range(1, n_chunks):
+            target = max(pos, data_start + (size - data_start) * i // n_chunks)
+            quotes += _count_quotes(mm, pos, target)
+            pos = target
+            while pos < size:
+                newline = mm.find(b"\n", pos)
+                end = size if newline == -1 else newline + 1
+                quotes += _count_quotes(mm, pos, end)
+                pos = end
+                if quotes % 2 == 0:
+                    break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _iter_lines(csv_path: str, start: int, end: int):
+    with open(csv_path, "rb") as f:
+        f.seek(start)
+        while start < end:
+            line = f.readline()
+            if not line:
+                break
+            start += len(line)
+            yield line.decode("utf-8")
+
+
+def partition_chunk(
+    csv_path: str,
+    start: int,
+    end: int,
+    spill_dir: str,
+    n_partitions: int,
+    chunk: int = 0,
+    track_first_seen: bool = False,
+) -> list | None:
+    """Spill the rows in one byte range into per-partition files.
+
+    Rows go to ``part_<partition>_<chunk>.csv`` by hash of customer_id, so
+    every row of a customer lands in the same partition. Only the columns in
+    CSV_COLUMNS are written. Returns the chunk's customer ids in first-seen
+    order if ``track_first_seen``.
+    """
+    header, _ = _read_header(csv_path)
+    # Plain reader + column picking: several times cheaper than DictReader
+    positions = [header.index(col) if col in header else None for col in CSV_COLUMNS]
+    cid_pos = header.index("customer_id")
+    seen = {} if track_first_seen else None
+    files = [
+        open(os.path.join(spill_dir, f"part_{p:05d}_{chunk:04d}.csv"), "w", encoding="utf-8", newline="")
+        for p in range(n_partitions)
+    ]
+    try:
+        writers = [csv.writer(f) for f in files]
+        for row in csv.reader(_iter_lines(csv_path, start, end)):
+            cid = row[cid_pos]
+            if seen is not None and cid not in seen:
+                seen[cid] = None
+            writers[partition_of(cid, n_partitions)].writerow(
+                [row[i] if i is not None else "" for i in positions]
+            )
+    finally:
+        for f in files:
+            f.close()
+    return list(seen) if seen is not None else None
+
+
+def partition_files(spill_dir: str, partition: int, n_chunks: int) -> list:
+    """A partition's spill files, in input order."""
+    return [os.path.join(spill_dir, f"part_{partition:05d}_{chunk:04d}.csv") for chunk in range(n_chunks)]
+
+
+def count_partitions(csv_path: str, partition_bytes: int, min_partitions: int = 1) -> int:
+    return max(min_partitions, -(-os.path.getsize(csv_path) // partition_bytes))
+
+
+def partition_csv(csv_path: str, spill_dir: str, partition_bytes: int) -> list:
+    """Split the CSV into partitions of about ``partition_bytes`` of input each.
+
+    Each partition can then be grouped in memory on its own. Returns one list
+    of spill files per partition.
+    """
+    n_partitions = count_partitions(csv_path, partition_bytes)
+    start, end = csv_chunks(csv_path, 1)[0]
+    partition_chunk(csv_path, start, end, spill_dir, n_partitions)
+    return [partition_files(spill_dir, p, 1) for p in range(n_partitions)]
+
+
+def group_partition(paths: list, columnar: bool = False) -> dict:
+    """Group a partition's spill files into customer_id → customer data with aggregates."""
+    if columnar:
+        with _gc_paused():
+            customers = aggregate_columns(read_columns(paths, header=CSV_COLUMNS))
+        for path in paths:
+            os.remove(path)
+        return customers
+    customers = {}
+    hashers = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for values in csv.reader(f):
+                row = dict(zip(CSV_COLUMNS, values))
+                data = customers.get(row["customer_id"])
+                if data is None:
+                    data = customers[row["customer_id"]] = {"aggregate": PurchaseAggregate()}
+                    hashers[row["customer_id"]] = input_hasher()
+                data["summary"] = row["Summary"]
+                data["age"] = int(float(row["age"])) if row["age"] else 0
+                data["club_member_status"] = row["club_member_status"]
+                data["aggregate"].add(parse_purchase(row))
+                hashers[row["customer_id"]].update(row_record(values).encode("utf-8"))
+        os.remove(path)
+    for cid, hasher in hashers.items():
+        customers[cid]["input_hash"] = hasher.hexdigest()
+    return customers
+
+
+def iter_customers_streaming(
+    csv_path: str,
+    partition_bytes: int = 256 * 1024 * 1024,
+    spill_dir: str | None = None,
+    columnar: bool = False,
+):
+    """Yield (customer_id, customer_data) for a CSV of any size.
+
+    Rows are partitioned to disk first, then each partition is grouped on its
+    own into PurchaseAggregates, so peak memory depends on ``partition_bytes``
+    rather than on the input size. Customers come out partition by
+    partition, first-seen order within each.
+    """
+    with tempfile.TemporaryDirectory(prefix="persona_spill_", dir=spill_dir) as tmpdir:
+        for paths in partition_csv(csv_path, tmpdir, partition_bytes):
+            yield from group_partition(paths, columnar).items()
+
+
+class PurchaseAggregate:
+    """Running totals over one customer's purchases.
+
+    Holds everything build_purchase_summary and infer_segments need, so
+    purchases can be folded in one row at a time and then discarded.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_spent = 0
+        self.categories = defaultdict(int)
+        self.colors = defaultdict(int)
+        self.departments = defaultdict(int)
+        self.channels = defaultdict(int)
+        self.first_date = None
+        self.last_date = None
+        self._first_key = self._last_key = -1
+        # Min-heap of (date key, -seq, purchase): the most recent purchases,
+        # earliest row first among equal dates (like a stable sort)
+        self._recent = []
+
+    @classmethod
+    def from_purchases(cls, purchases: list) -> "PurchaseAggregate":
+        aggregate = cls()
+        for p in purchases:
+            aggregate.add(p)
+        return aggregate
+
+    def add(self, p: dict):
+        self.categories[p["product_group"]] += 1
+        self.colors[p["color"]] += 1
+        self.departments[p["department"]] += 1
+        self.total_spent += p["price"]
+        self.channels[p["channel"]] += 1
+        key = date_key(p["date"])
+        if key >= 0:
+            if self.first_date is None or key < self._first_key:
+                self.first_date, self._first_key = p["date"], key
+            if self.last_date is None or key > self._last_key:
+                self.last_date, self._last_key = p["date"], key
+
+        item = (key, -self.count, p)
+        if len(self._recent) < RECENT_PURCHASES:
+            heapq.heappush(self._recent, item)
+        elif item[:2] > self._recent[0][:2]:
+            heapq.heapreplace(self._recent, item)
+        self.count += 1
+
+    def recent(self) -> list:
+        """Most recent purchases, newest first."""
+        return [p for *_, p in sorted(self._recent, key=lambda x: x[:2], reverse=True)]
+
+
+@contextmanager
+def _gc_paused():
+    """Suspend the cyclic garbage collector around a bulk build.
+
+    Building millions of small lists and dicts triggers collection after
+    collection that finds nothing to free (the containers are all live);
+    reference counting still frees everything as usual meanwhile.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _factorize(values) -> tuple:
+    """Integer codes in first-seen order, plus the distinct values."""
+    labels = list(dict.fromkeys(values))
+    index = {v: i for i, v in enumerate(labels)}
+    return np.fromiter(map(index.__getitem__, values), np.int64, len(values)), labels
+
+
+def _grouped_counts(owner: np.ndarray, codes: np.ndarray, labels: list, n_owners: int) -> list:
+    """Per owner, a {label: count} dict in first-seen order (like defaultdict counting)."""
+    k = max(len(labels), 1)
+    keys, first, counts = np.unique(owner * k + codes, return_index=True, return_counts=True)
+    order = np.lexsort((first, keys // k))
+    keys, counts = keys[order], counts[order]
+    bounds = np.searchsorted(keys // k, np.arange(n_owners + 1))
+    names = [labels[c] for c in (keys % k).tolist()]
+    counts = counts.tolist()
+    return [
+        dict(zip(names[a:b], counts[a:b]))
+        for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+    ]
+
+
+def aggregate_columns(columns: dict) -> dict:
+    """Group CSV columns into customer_id → customer data, all customers at once.
+
+    The columnar equivalent of folding every row into a PurchaseAggregate:
+    category, colour, department and channel counts, spend, date range and
+    the most recent purchases come from grouped NumPy operations over
+    integer-coded columns, with each distinct date string parsed once.
+    Customers are returned in first-seen order and summary, age and club
+    status come from their last row, as in load_and_group_data.
+    """
+    n = len(columns["customer_id"])
+    if n == 0:
+        return {}
+    cust, customer_ids = _factorize(columns["customer_id"])
+    n_cust = len(customer_ids)
+    rows = np.arange(n)
+
+    # Rows grouped by customer, file order within each
+    by_customer = np.argsort(cust, kind="stable")
+    counts = np.bincount(cust, minlength=n_cust)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    date_codes, date_strings = _factorize(columns["t_dat"])
+    keys = np.array([date_key(d) for d in date_strings], dtype=np.int64)[date_codes]
+    prices = np.array([float(p) if p else 0 for p in columns["price"]])
+    channels = ["Online" if c == "2" else "In-store" for c in columns["sales_channel_id"]]
+
+    spent = np.bincount(cust, weights=prices, minlength=n_cust)
+    grouped = {}
+    for name, column in (
+        ("categories", "product_group_name"),
+        ("colors", "colour_group_name"),
+        ("departments", "department_name"),
+    ):
+        codes, labels = _factorize(columns[column])
+        grouped[name] = _grouped_counts(cust, codes, labels, n_cust)
+    codes, labels = _factorize(channels)
+    grouped["channels"] = _grouped_counts(cust, codes, labels, n_cust)
+
+    # Date range over rows with a valid date (-1 marks missing)
+    sorted_keys = keys[by_customer]
+    first_keys = np.minimum.reduceat(np.where(sorted_keys >= 0, sorted_keys, np.iinfo(np.int64).max), starts)
+    last_keys = np.maximum.reduceat(sorted_keys, starts)
+    # First row carrying each customer's first/last day, for the original string
+    first_rows = _first_row_matching(cust, keys, first_keys, n)
+    last_rows = _first_row_matching(cust, keys, last_keys, n)
+
+    # Most recent purchases: newest day first, file order among equal days
+    newest = np.lexsort((rows, -keys, cust))
+    rank = np.arange(n) - starts[cust[newest]]
+    recent_rows = newest[rank < RECENT_PURCHASES]
+    recent = [[] for _ in range(n_cust)]
+    names, types, colors, days = (
+        columns[col] for col in ("prod_name", "product_type_name", "colour_group_name", "t_dat")
+    )
+    recent_rows = recent_rows.tolist()
+    for i, owner, key in zip(recent_rows, cust[recent_rows].tolist(), keys[recent_rows].tolist()):
+        # Only the fields a recent-purchase line shows
+        purchase = {"product_name": names[i], "product_type": types[i], "color": colors[i], "date": days[i]}
+        recent[owner].append((key, -i, purchase))
+
+    last_rows_of = by_customer[starts + counts - 1].tolist()
+    # Input hashes over each customer's rows in file order
+    records = list(map(row_record, zip(*(columns[col] for col in CSV_COLUMNS))))
+    records = [records[i] for i in by_customer.tolist()]
+    row_bounds = list(zip(starts.tolist(), (starts + counts).tolist()))
+    customers = {}
+    for c, cid in enumerate(customer_ids):
+        hasher = input_hasher()
+        hasher.update("".join(records[slice(*row_bounds[c])]).encode("utf-8"))
+        aggregate = PurchaseAggregate()
+        aggregate.count = int(counts[c])
+        aggregate.total_spent = float(spent[c])
+        for name in grouped:
+            setattr(aggregate, name, grouped[name][c])
+        if last_keys[c] >= 0:
+            aggregate.first_date = columns["t_dat"][first_rows[c]]
+            aggregate.last_date = columns["t_dat"][last_rows[c]]
+            aggregate._first_key, aggregate._last_key = int(first_keys[c]), int(last_keys[c])
+        aggregate._recent = recent[c]
+        last = last_rows_of[c]
+        customers[cid] = {
+            "summary": columns["Summary"][last],
+            "age": int(float(columns["age"][last])) if columns["age"][last] else 0,
+            "club_member_status": columns["club_member_status"][last],
+            "aggregate": aggregate,
+            "input_hash": hasher.hexdigest(),
+        }
+    return customers
+
+
+def _first_row_matching(cust: np.ndarray, keys: np.ndarray, targets: np.ndarray, n: int) -> list:
+    """Per customer, the first row whose key equals that customer's target."""
+    hits = np.flatnonzero(keys == targets[cust])
+    rows = np.full(len(targets), n, dtype=np.int64)
+    np.minimum.at(rows, cust[hits], hits)
+    return rows.tolist()
+
+
+def read_columns(paths: list, header: list | None = None) -> dict:
+    """Read CSV files into column lists (the first row is the header unless given)."""
+    rows = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows.extend(csv.reader(f))
+    if header is None:
+        header, rows = rows[0], rows[1:]
+    columns = dict(zip(header, map(list, zip(*rows)))) if rows else {col: [] for col in header}
+    return {col: columns.get(col, [""] * len(rows)) for col in CSV_COLUMNS}
+
+
+def load_columnar(csv_path: str) -> dict:
+    """Columnar equivalent of load_and_group_data; purchases are pre-aggregated."""
+    with _gc_paused():
+        return aggregate_columns(read_columns([csv_path]))
+
+
+def _aggregate_of(customer_data: dict) -> PurchaseAggregate:
+    if "aggregate" in customer_data:
+        return customer_data["aggregate"]
+    return PurchaseAggregate.from_purchases(customer_data["purchases"])
+
+
+def build_purchase_summary(purchases) -> str:
+    """Create a natural-language shopping history from purchase rows.
+
+    Accepts the purchase list or a PurchaseAggregate built from it.
+    """
+    if isinstance(purchases, PurchaseAggregate):
+        aggregate = purchases
+    else:
+        aggregate = PurchaseAggregate.from_purchases(purchases)
+    if not aggregate.count:
         return "No purchase history available."
     
-    # Count by category
-    categories = defaultdict(int)
-    colors = defaultdict(int)
-    departments = defaultdict(int)
-    total_spent = 0
-    channels = defaultdict(int)
-    dates = []
-    
-    for p in purchases:
-        categories[p["product_group"]] += 1
-        colors[p["color"]] += 1
-        departments[p["department"]] += 1
-        total_spent += p["price"]
-        channels[p["channel"]] += 1
-        if p["date"]:
-            dates.append(p["date"])
-    
     # Sort by frequency
-    top_categories = sorted(categories.items(), key=lambda x: -x[1])
-    top_colors = sorted(colors.items(), key=lambda x: -x[1])
-    top_departments = sorted(departments.items(), key=lambda x: -x[1])
+    top_categories = sorted(aggregate.categories.items(), key=lambda x: -x[1])
+    top_colors = sorted(aggregate.colors.items(), key=lambda x: -x[1])
+    top_departments = sorted(aggregate.departments.items(), key=lambda x: -x[1])
     
     # Date range
-    if dates:
-        dates_sorted = sorted(dates)
-        date_range = f"from {dates_sorted[0]} to {dates_sorted[-1]}"
+    if aggregate.first_date:
+        date_range = f"from {aggregate.first_date} to {aggregate.last_date}"
     else:
         date_range = "over an unknown period"
     
     # Primary channel
+    channels = aggregate.channels
     primary_channel = max(channels.items(), key=lambda x: x[1])[0] if channels else "Unknown"
     
     # Build narrative
     lines = []
-    lines.append(f"SHOPPING HISTORY AT H&M ({len(purchases)} items purchased {date_range}):")
+    lines.append(f"SHOPPING HISTORY AT H&M ({aggregate.count} items purchased {date_range}):")
     
     # Categories
     cat_parts = [f"{name} ({count})" for name, count in top_categories[:5]]
@@ -108,9 +574,8 @@ def build_purchase_summary(purchases: list) -> str:
     lines.append(f"- Shopping channel: primarily {primary_channel}")
     
     # Specific recent purchases (last 5)
-    recent = sorted(purchases, key=lambda x: x["date"] or "", reverse=True)[:5]
     lines.append("- Recent purchases:")
-    for p in recent:
+    for p in aggregate.recent():
         lines.append(f"  • {p['product_name']} ({p['color']}, {p['product_type']}) — {p['date']}")
     
     return "\n".join(lines)
@@ -119,7 +584,7 @@ def build_purchase_summary(purchases: list) -> str:
 def generate_persona_prompt(customer_data: dict) -> str:
     """Combine Summary + purchase history into a final persona prompt."""
     summary = customer_data["summary"].strip()
-    purchase_summary = build_purchase_summary(customer_data["purchases"])
+    purchase_summary = build_purchase_summary(_aggregate_of(customer_data))
     
     persona = f"""{summary}
 
@@ -151,91 +616,401 @@ def generate_short_name(customer_id: str, index: int) -> str:
     return names[index % len(names)]
 
 
-def infer_segments(customer_data: dict) -> list:
-    """Infer customer segments from their data."""
-    segments = []
-    purchases = customer_data["purchases"]
-    age = customer_data["age"]
-    
-    # Age-based
-    if age < 25:
-        segments.append("young_adult")
-    elif age < 40:
-        segments.append("adult")
-    elif age < 55:
-        segments.append("mature")
-    else:
-        segments.append("senior")
-    
-    # Purchase frequency
-    if len(purchases) > 20:
-        segments.append("frequent_shopper")
-    elif len(purchases) > 5:
-        segments.append("regular_shopper")
-    else:
-        segments.append("occasional_shopper")
+def customer_features(customer_data: dict) -> dict:
+    """What segment rules can test besides age, purchase count and club status."""
+    aggregate = _aggregate_of(customer_data)
+    online = aggregate.channels.get("Online", 0)
+    return {
+        "total_spent": round(aggregate.total_spent, 4),
+        "online_share": round(online / aggregate.count, 4) if aggregate.count else 0,
+        "categories": dict(sorted(aggregate.categories.items())),
+    }
+
+
+def _backend():
+    """Make the backend package (manifest, segment rules, packed store, clusters) importable."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+
+def segment_manifest(manifest: dict, segments_config: str | None = None) -> dict:
+    """Tag every manifest entry with its segments, all customers at once.
+
+    Segments are declared in backend/data/segments.json (or
+    ``segments_config``) and evaluated as vectorized predicates over the
+    entries' features; see backend/app/services/segment_rules.py.
+    Returns the number of customers in each segment.
+    """
+    _backend()
+    from app.services.segment_rules import SegmentRules, assign_segments
+    return assign_segments(manifest, SegmentRules.load(segments_config))
+
+
+def persona_filename(index: int, display_name: str) -> str:
+    return f"persona_{index:03d}_{display_name.lower()}.txt"
+
+
+def build_customer(index: int, customer_id: str, data: dict, output_dir: str, filename: str | None = None) -> dict:
+    """Generate and write one persona. Returns its manifest entry."""
+    if "aggregate" not in data:
+        data["aggregate"] = PurchaseAggregate.from_purchases(data["purchases"])
+    display_name = generate_short_name(customer_id, index)
+    persona_prompt = generate_persona_prompt(data)
     
-    # Category-based
-    categories = [p["product_group"] for p in purchases]
-    if any("Upper" in c for c in categories):
-        segments.append("tops_buyer")
-    if any("Lower" in c for c in categories):
-        segments.append("bottoms_buyer")
-    if any("Full" in c for c in categories):
-        segments.append("fullbody_buyer")
+    # Save persona file
+    filepath = os.path.join(output_dir, filename or persona_filename(index, display_name))
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write(persona_prompt)
     
-    return segments
+    return {
+        "persona_file": filepath,
+        "display_name": display_name,
+        "age": data["age"],
+        "purchase_count": data["aggregate"].count,
+        # Filled in for all customers at once by segment_manifest
+        "segments": [],
+        "club_member_status": data.get("club_member_status", ""),
+        "features": customer_features(data),
+        "index": index,
+        # Stable content hashes: of the customer's input rows, and of the
+        # prompt (what downstream response caches see)
+        "input_hash": data.get("input_hash"),
+        "prompt_hash": hashlib.sha256(persona_prompt.encode("utf-8")).hexdigest(),
+    }
+
+
+def _persona_path(output_dir: str, entry: dict) -> str:
+    # Entries store the path as given at build time; the file is in output_dir
+    return os.path.join(output_dir, os.path.basename(entry["persona_file"]))
+
+
+def reuse_entry(previous: dict | None, data: dict, output_dir: str) -> dict | None:
+    """The previous manifest entry if the customer's input is unchanged, else None."""
+    if previous is None or previous.get("input_hash") is None:
+        return None
+    # Entries from before features were recorded cannot be re-segmented
+    if "features" not in previous:
+        return None
+    if previous["input_hash"] != data.get("input_hash"):
+        return None
+    path = _persona_path(output_dir, previous)
+    if not os.path.exists(path):
+        return None
+    return dict(previous, persona_file=path)
+
+
+class PersonaIndexer:
+    """Hands out persona indexes (and so display names and filenames).
+
+    Customers in ``previous`` keep the index they had; everyone else is
+    numbered after the highest index in use, in the order asked. With no
+    previous manifest that is simply output order, as in a full build, and
+    in an incremental build existing personas never get renamed.
+    """
+
+    def __init__(self, previous: dict | None = None):
+        # Manifests from before indexes were recorded are in index order
+        self.known = {
+            cid: entry.get("index", position)
+            for position, (cid, entry) in enumerate((previous or {}).items())
+        }
+        self._next = max(self.known.values(), default=-1) + 1
 
+    def index(self, customer_id: str) -> int:
+        if customer_id not in self.known:
+            self.known[customer_id] = self._next
+            self._next += 1
+        return self.known[customer_id]
 
-def convert_all(csv_path: str, output_dir: str):
-    """Main conversion: CSV → persona files + manifest."""
+
+def _partition_chunk(task: tuple) -> list | None:
+    """Worker: spill one byte range of the CSV (map side of the shuffle)."""
+    return partition_chunk(*task)
+
+
+def _build_partition(task: tuple) -> list:
+    """Worker: group one partition and build its personas (reduce side).
+
+    Customers with an entry in ``index`` get their final index and filename.
+    Others (new customers in streaming mode) get provisional names that
+    convert_all renames once the partitions are merged in order. Unchanged
+    customers in ``previous`` keep their entry and file.
+    """
+    paths, part, output_dir, index, columnar, previous = task
+    fragment = []
+    for local, (cid, data) in enumerate(group_partition(paths, columnar).items()):
+        entry = reuse_entry(previous.get(cid), data, output_dir)
+        if entry is None and index is not None and cid in index:
+            entry = build_customer(index[cid], cid, data, output_dir)
+        elif entry is None:
+            entry = build_customer(local, cid, data, output_dir, filename=f".part{part:05d}_{local}.tmp")
+        fragment.append((cid, entry))
+    return fragment
+
+
+def _convert_parallel(
+    csv_path: str,
+    output_dir: str,
+    workers: int,
+    streaming: bool,
+    partition_bytes: int,
+    spill_dir: str | None,
+    columnar: bool = False,
+    previous: dict | None = None,
+) -> dict:
+    """Shard customers across a process pool; merge fragments in a fixed order.
+
+    A two-stage shuffle, both stages in the pool: workers first spill
+    record-aligned byte ranges of the CSV into per-customer-hash partitions,
+    then parse, aggregate, generate and write whole partitions and return
+    manifest fragments. The parent only finds chunk boundaries, merges
+    fragments and prints one progress line per partition. The result is
+    identical to the sequential run with the same options.
+
+    ``previous`` is the manifest to update incrementally, if any.
+    """
+    previous = previous or {}
+    indexer = PersonaIndexer(previous)
+    # Streaming order depends on the partitioning, so it must match the
+    # sequential run; first-seen order does not, so split finer for balance
+    min_partitions = 1 if streaming else workers * 4
+    n_partitions = count_partitions(csv_path, partition_bytes, min_partitions)
+    chunks = csv_chunks(csv_path, workers * 4)
+    merged = []
+    with (
+        ProcessPoolExecutor(max_workers=workers) as pool,
+        tempfile.TemporaryDirectory(prefix="persona_spill_", dir=spill_dir) as tmpdir,
+    ):
+        tasks = [
+            (csv_path, start, end, tmpdir, n_partitions, chunk, not streaming)
+            for chunk, (start, end) in enumerate(chunks)
+        ]
+        first_seen = None
+        if not streaming:
+            first_seen = {}
+            for seen in pool.map(_partition_chunk, tasks):
+                for cid in seen:
+                    first_seen.setdefault(cid, len(first_seen))
+            print(f"Found {len(first_seen)} unique customers")
+        else:
+            list(pool.map(_partition_chunk, tasks))
+
+        # Each worker only needs the indexes and previous entries of its own
+        # partition's customers
+        known = {cid: indexer.index(cid) for cid in first_seen} if first_seen is not None else indexer.known
+        indexes = [{} for _ in range(n_partitions)]
+        for cid, index in known.items():
+            indexes[partition_of(cid, n_partitions)][cid] = index
+        previous_parts = [{} for _ in range(n_partitions)]
+        for cid, entry in previous.items():
+            previous_parts[partition_of(cid, n_partitions)][cid] = entry
+        tasks = [
+            (
+                partition_files(tmpdir, part, len(chunks)),
+                part,
+                output_dir,
+                indexes[part],
+                columnar,
+                previous_parts[part],
+            )
+            for part in range(n_partitions)
+        ]
+        for done, fragment in enumerate(pool.map(_build_partition, tasks), 1):
+            merged.extend(fragment)
+            print(f"  [{done}/{len(tasks)} partitions] {len(merged)} personas done")
+
+    if first_seen is not None:
+        merged.sort(key=lambda item: first_seen[item[0]])
+        return dict(merged)
+
+    # Streaming: new customers are numbered in sequential streaming order
+    manifest = {}
+    for cid, entry in merged:
+        index = indexer.index(cid)
+        if entry["persona_file"].endswith(".tmp"):
+            entry["display_name"] = generate_short_name(cid, index)
+            entry["index"] = index
+            final_path = os.path.join(output_dir, persona_filename(index, entry["display_name"]))
+            os.replace(entry["persona_file"], final_path)
+            entry["persona_file"] = final_path
+        manifest[cid] = entry
+    return manifest
+
+
+def convert_all(
+    csv_path: str,
+    output_dir: str,
+    streaming: bool = False,
+    partition_mb: float = 256,
+    spill_dir: str | None = None,
+    workers: int = 1,
+    columnar: bool = False,
+    incremental: bool = False,
+    pack: bool = False,
+    clusters: int | None = None,
+    segments_config: str | None = None,
+):
+    """Main conversion: CSV → persona files + manifest.
+
+    With ``streaming``, purchases are never held in memory: the CSV is
+    partitioned to disk and folded into running aggregates partition by
+    partition (see iter_customers_streaming). Only the manifest grows with
+    the number of customers.
+
+    With ``workers`` > 1, persona generation runs in a process pool (see
+    _convert_parallel).
+
+    With ``columnar``, customers are aggregated in vectorized passes over
+    whole columns (see aggregate_columns) instead of row by row; combines
+    with both options above and writes identical output.
+
+    With ``incremental``, the manifest already in output_dir is updated
+    instead of rebuilt: customers whose input rows hash the same keep their
+    persona file untouched, changed ones are regenerated under their
+    existing filename, new ones are numbered after the existing personas,
+    and removed customers' files are deleted. The manifest is always
+    replaced atomically, and changes since the previous manifest are
+    printed.
+
+    With ``pack``, the result is also packed into a single personas.pack
+    store (see backend/app/services/persona_store.py).
+
+    Segments come from the rules in backend/data/segments.json (or
+    ``segments_config``), applied to every customer in one pass once all
+    personas are built; see resegment to change them later.
+
+    With ``clusters``, personas are grouped into that many clusters of
+    near-duplicates and clusters.json is written (see
+    backend/app/services/persona_clusters.py).
+    """
+    _backend()
+    from app.services.profile_builder import (
+        load_manifest,
+        manifest_changes,
+        write_manifest,
+    )
     os.makedirs(output_dir, exist_ok=True)
+    partition_bytes = int(partition_mb * 1024 * 1024)
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    previous = load_manifest(manifest_path)
+    kept = previous if incremental else {}
     
     print(f"Loading data from {csv_path}...")
-    customers = load_and_group_data(csv_path)
-    print(f"Found {len(customers)} unique customers")
-    
-    manifest = {}
-    
-    for idx, (customer_id, data) in enumerate(customers.items()):
-        display_name = generate_short_name(customer_id, idx)
-        persona_prompt = generate_persona_prompt(data)
-        segments = infer_segments(data)
-        
-        # Save persona file
-        filename = f"persona_{idx:03d}_{display_name.lower()}.txt"
-        filepath = os.path.join(output_dir, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(persona_prompt)
-        
-        # Add to manifest
-        manifest[customer_id] = {
-            "persona_file": filepath,
-            "display_name": display_name,
-            "age": data["age"],
-            "purchase_count": len(data["purchases"]),
-            "segments": segments,
-            "club_member_status": data.get("club_member_status", ""),
-        }
+    if workers > 1:
+        manifest = _convert_parallel(
+            csv_path, output_dir, workers, streaming, partition_bytes, spill_dir, columnar, kept
+        )
+    else:
+        if streaming:
+            customers = iter_customers_streaming(csv_path, partition_bytes, spill_dir, columnar)
+            total = "?"
+        else:
+            grouped = load_columnar(csv_path) if columnar else load_and_group_data(csv_path)
+            customers = grouped.items()
+            total = len(grouped)
+            print(f"Found {total} unique customers")
         
-        print(f"  [{idx+1}/{len(customers)}] {display_name} (age {data['age']}, {len(data['purchases'])} purchases, {len(persona_prompt)} chars)")
+        manifest = {}
+        indexer = PersonaIndexer(kept)
+        for n, (customer_id, data) in enumerate(customers):
+            index = indexer.index(customer_id)
+            entry = reuse_entry(kept.get(customer_id), data, output_dir)
+            if entry is None:
+                entry = build_customer(index, customer_id, data, output_dir)
+                print(
+                    f"  [{n+1}/{total}] {entry['display_name']} "
+                    f"(age {entry['age']}, {entry['purchase_count']} purchases)"
+                )
+            manifest[customer_id] = entry
     
-    # Save manifest
-    manifest_path = os.path.join(output_dir, "manifest.json")
-    with open(manifest_path, "w", encoding="utf-8") as f:
-        json.dump(manifest, f, indent=2)
+    counts = segment_manifest(manifest, segments_config)
+    print("Segments: " + ", ".join(f"{n} {name}" for name, n in counts.items()))
     
-    print(f"\nDone! {len(customers)} personas saved to {output_dir}")
+    # Save manifest, then drop personas no longer in it
+    write_manifest(manifest_path, manifest)
+    changes = manifest_changes(previous, manifest)
+    if incremental:
+        in_use = {os.path.basename(entry["persona_file"]) for entry in manifest.values()}
+        for cid in changes["removed"]:
+            path = _persona_path(output_dir, previous[cid])
+            if os.path.basename(path) not in in_use and os.path.exists(path):
+                os.remove(path)
+    
+    print(f"\nDone! {len(manifest)} personas saved to {output_dir}")
     print(f"Manifest saved to {manifest_path}")
+    if previous:
+        print("Changes: " + ", ".join(f"{len(ids)} {kind}" for kind, ids in changes.items()))
+    if pack:
+        _backend()
+        from app.services.persona_store import pack_directory
+        print(f"Packed store saved to {pack_directory(output_dir)}")
+    if clusters:
+        _backend()
+        from app.services.persona_clusters import cluster_directory
+        print(f"Clusters saved to {cluster_directory(output_dir, clusters)}")
     
     return manifest
 
 
+def resegment(output_dir: str, segments_config: str | None = None) -> dict:
+    """Re-apply the segment rules to an existing output directory.
+
+    Only manifest.json and personas.pack are rewritten; persona texts are
+    left alone, so changing a segment definition needs no reconversion.
+    """
+    _backend()
+    from app.services.segment_rules import SegmentRules, resegment_directory
+    start = time.perf_counter()
+    counts = resegment_directory(output_dir, SegmentRules.load(segments_config))
+    print(f"Re-segmented {output_dir} in {time.perf_counter() - start:.2f}s")
+    print("Segments: " + ", ".join(f"{n} {name}" for name, n in counts.items()))
+    return counts
+
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(description="Convert H&M data to persona prompts")
     parser.add_argument("--input", default="H_M_persona_data.csv", help="Path to CSV file")
     parser.add_argument("--output", default="backend/data/processed/", help="Output directory")
+    parser.add_argument(
+        "--streaming", action="store_true", help="Bounded-memory mode for CSVs too large to load at once"
+    )
+    parser.add_argument(
+        "--partition-mb", type=float, default=256, help="Input size per on-disk partition in streaming mode"
+    )
+    parser.add_argument("--spill-dir", default=None, help="Where streaming mode writes its temporary partitions")
+    parser.add_argument("--workers", type=int, default=1, help="Processes generating personas in parallel")
+    parser.add_argument("--columnar", action="store_true", help="Aggregate purchases with vectorized NumPy passes")
+    parser.add_argument(
+        "--incremental", action="store_true", help="Only regenerate personas whose input changed since the last run"
+    )
+    parser.add_argument(
+        "--pack", action="store_true", help="Also write personas.pack, a single memory-mapped store of all personas"
+    )
+    parser.add_argument(
+        "--clusters", type=int, default=None, help="Also group personas into this many clusters for preview runs"
+    )
+    parser.add_argument(
+        "--segments-config", default=None, help="Segment rules JSON (default: backend/data/segments.json)"
+    )
+    parser.add_argument(
+        "--resegment", action="store_true", help="Only re-apply the segment rules to the existing output"
+    )
     args = parser.parse_args()
     
-    convert_all(args.input, args.output)
\ No newline at end of file
+    if args.resegment:
+        resegment(args.output, args.segments_config)
+        sys.exit()
+    convert_all(
+        args.input,
+        args.output,
+        streaming=args.streaming,
+        partition_mb=args.partition_mb,
+        spill_dir=args.spill_dir,
+        workers=args.workers,
+        columnar=args.columnar,
+        incremental=args.incremental,
+        pack=args.pack,
+        clusters=args.clusters,
+        segments_config=args.segments_config,
+    )
\ No newline at end of file